@@ -0,0 +1,91 @@
+"""add typed columns to game_events (level_id/stars/metric из payload)
+
+Revision ID: a3e7c1f5d9b2
+Revises: f2d6b8e1a9c3
+Create Date: 2026-07-29
+
+Известные поля payload раскладываются в колонки при приёме телеметрии
+(app/services/game_telemetry.py: extract_fields), аналитика агрегирует по
+ним в SQL. Старые строки бэкфиллятся здесь пачками по id — без одного
+гигантского UPDATE на всю таблицу и без JSON-операторов конкретной СУБД
+(правила разбора — копия extract_fields на момент миграции).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "a3e7c1f5d9b2"
+down_revision = "f2d6b8e1a9c3"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 5000
+
+
+def _extract(payload) -> dict:
+    payload = payload if isinstance(payload, dict) else {}
+    level_id = payload.get("level_id")
+    stars = payload.get("stars")
+    metric = None
+    for key in ("moves", "ticks"):
+        value = payload.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            metric = float(value)
+            break
+    return {
+        "level_id": str(level_id) if level_id else None,
+        "stars": stars if isinstance(stars, int) and not isinstance(stars, bool) else None,
+        "metric": metric,
+    }
+
+
+def upgrade() -> None:
+    op.add_column("game_events", sa.Column("level_id", sa.String(), nullable=True))
+    op.add_column("game_events", sa.Column("stars", sa.Integer(), nullable=True))
+    op.add_column("game_events", sa.Column("metric", sa.Float(), nullable=True))
+
+    game_events = sa.table(
+        "game_events",
+        sa.column("id", sa.Integer),
+        sa.column("payload", sa.JSON),
+        sa.column("level_id", sa.String),
+        sa.column("stars", sa.Integer),
+        sa.column("metric", sa.Float),
+    )
+    update = (
+        game_events.update()
+        .where(game_events.c.id == sa.bindparam("event_id"))
+        .values(
+            level_id=sa.bindparam("level_id"),
+            stars=sa.bindparam("stars"),
+            metric=sa.bindparam("metric"),
+        )
+    )
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(game_events.c.id, game_events.c.payload)
+            .where(game_events.c.id > last_id, game_events.c.payload.isnot(None))
+            .order_by(game_events.c.id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            break
+        params = [{"event_id": event_id, **_extract(payload)} for event_id, payload in rows]
+        # Строки без известных полей не трогаем — колонки и так NULL.
+        params = [p for p in params if any(p[k] is not None for k in ("level_id", "stars", "metric"))]
+        if params:
+            bind.execute(update, params)
+        last_id = rows[-1][0]
+
+    # Индексы — после бэкфилла: обновлять их на каждой пачке дороже.
+    op.create_index("ix_game_events_event_type_level_id", "game_events", ["event_type", "level_id"])
+    op.create_index("ix_game_events_session_id_event_type", "game_events", ["session_id", "event_type"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_game_events_session_id_event_type", table_name="game_events")
+    op.drop_index("ix_game_events_event_type_level_id", table_name="game_events")
+    op.drop_column("game_events", "metric")
+    op.drop_column("game_events", "stars")
+    op.drop_column("game_events", "level_id")
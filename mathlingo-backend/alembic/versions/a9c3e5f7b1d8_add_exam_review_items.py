@@ -0,0 +1,46 @@
+"""add exam_review_items (SM-2 review queue)
+
+Revision ID: a9c3e5f7b1d8
+Revises: f3b9d1e7a5c2
+Create Date: 2026-08-12
+
+Очередь интервального повторения тренажёра: состояние SM-2 на пару
+(ученик, задание) и индекс (user_id, due_at), по которому
+exam_trainer.next_task берёт самое раннее повторение. Таблица создаётся
+пустой; состояние по уже записанным попыткам строит пересборка после
+миграции (идемпотентна):
+
+    python -m app.services.exam_review rebuild
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "a9c3e5f7b1d8"
+down_revision = "f3b9d1e7a5c2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "exam_review_items",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column(
+            "exam_task_id", sa.Integer(),
+            sa.ForeignKey("exam_tasks.id", ondelete="CASCADE"), nullable=False,
+        ),
+        sa.Column("repetitions", sa.Integer(), nullable=False),
+        sa.Column("interval_days", sa.Integer(), nullable=False),
+        sa.Column("ease_factor", sa.Float(), nullable=False),
+        sa.Column("lapses", sa.Integer(), nullable=False),
+        sa.Column("due_at", sa.DateTime(), nullable=False),
+        sa.Column("last_reviewed_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("user_id", "exam_task_id", name="uq_exam_review_items_user_task"),
+    )
+    op.create_index("ix_exam_review_items_user_id_due_at", "exam_review_items", ["user_id", "due_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_exam_review_items_user_id_due_at", table_name="exam_review_items")
+    op.drop_table("exam_review_items")
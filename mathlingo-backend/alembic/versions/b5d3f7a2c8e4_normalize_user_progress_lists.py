@@ -0,0 +1,178 @@
+"""normalize user_progress.completed_locations / unlocked_achievements
+
+Revision ID: b5d3f7a2c8e4
+Revises: a3e7c1f5d9b2
+Create Date: 2026-08-04
+
+JSON-строки user_progress.completed_locations и unlocked_achievements
+переезжают в таблицы user_completed_locations / user_achievements с
+уникальным индексом (user_id, ...): карта читает их запросом по индексу, а
+не json.loads на каждый запрос. Перенос — пачками по id user_progress;
+битый JSON и id уже удалённых локаций/достижений пропускаются (FK их бы
+всё равно не принял). Колонки удаляются после переноса.
+"""
+import json
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "b5d3f7a2c8e4"
+down_revision = "a3e7c1f5d9b2"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 5000
+
+# (колонка user_progress, таблица, колонка id в таблице, справочник, колонка времени)
+_LISTS = (
+    ("completed_locations", "user_completed_locations", "location_id", "map_locations", "completed_at"),
+    ("unlocked_achievements", "user_achievements", "achievement_id", "achievements", "unlocked_at"),
+)
+
+
+def _parse_ids(raw) -> list:
+    try:
+        values = json.loads(raw) if raw else []
+    except (TypeError, ValueError):
+        return []
+    if not isinstance(values, list):
+        return []
+    ids = []
+    for value in values:
+        if isinstance(value, int) and not isinstance(value, bool) and value not in ids:
+            ids.append(value)
+    return ids
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_completed_locations",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column(
+            "location_id", sa.Integer(),
+            sa.ForeignKey("map_locations.id", ondelete="CASCADE"), nullable=False,
+        ),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("user_id", "location_id", name="uq_user_completed_locations_user_location"),
+    )
+    op.create_table(
+        "user_achievements",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column(
+            "achievement_id", sa.Integer(),
+            sa.ForeignKey("achievements.id", ondelete="CASCADE"), nullable=False,
+        ),
+        sa.Column("unlocked_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("user_id", "achievement_id", name="uq_user_achievements_user_achievement"),
+    )
+
+    bind = op.get_bind()
+    now = datetime.utcnow()
+    user_progress = sa.table(
+        "user_progress",
+        sa.column("id", sa.Integer),
+        sa.column("user_id", sa.Integer),
+        sa.column("completed_locations", sa.String),
+        sa.column("unlocked_achievements", sa.String),
+    )
+    for source, table_name, id_column, reference, time_column in _LISTS:
+        target = sa.table(
+            table_name,
+            sa.column("user_id", sa.Integer),
+            sa.column(id_column, sa.Integer),
+            sa.column(time_column, sa.DateTime),
+        )
+        existing = set(bind.execute(sa.text(f"SELECT id FROM {reference}")).scalars())
+        last_id = 0
+        while True:
+            rows = bind.execute(
+                sa.select(user_progress.c.id, user_progress.c.user_id, user_progress.c[source])
+                .where(user_progress.c.id > last_id, user_progress.c.user_id.isnot(None))
+                .order_by(user_progress.c.id)
+                .limit(BACKFILL_BATCH)
+            ).all()
+            if not rows:
+                break
+            # user_id в user_progress не уникален — дубли строк одного
+            # ученика сливаются, а не ломают уникальный индекс.
+            seen = set()
+            params = []
+            for _, user_id, raw in rows:
+                for item_id in _parse_ids(raw):
+                    if item_id in existing and (user_id, item_id) not in seen:
+                        seen.add((user_id, item_id))
+                        params.append({"user_id": user_id, id_column: item_id, time_column: now})
+            if params:
+                already = set(bind.execute(
+                    sa.select(target.c.user_id, target.c[id_column])
+                    .where(target.c.user_id.in_({p["user_id"] for p in params}))
+                ).all())
+                params = [p for p in params if (p["user_id"], p[id_column]) not in already]
+            if params:
+                bind.execute(target.insert(), params)
+            last_id = rows[-1][0]
+
+    with op.batch_alter_table("user_progress") as batch_op:
+        batch_op.drop_column("unlocked_achievements")
+        batch_op.drop_column("completed_locations")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("user_progress") as batch_op:
+        batch_op.add_column(sa.Column("completed_locations", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("unlocked_achievements", sa.String(), nullable=True))
+
+    bind = op.get_bind()
+    user_progress = sa.table(
+        "user_progress",
+        sa.column("id", sa.Integer),
+        sa.column("user_id", sa.Integer),
+        sa.column("completed_locations", sa.String),
+        sa.column("unlocked_achievements", sa.String),
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(user_progress.c.id, user_progress.c.user_id)
+            .where(user_progress.c.id > last_id)
+            .order_by(user_progress.c.id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            break
+        user_ids = {user_id for _, user_id in rows if user_id is not None}
+        lists = {}
+        for source, table_name, id_column, _, _ in _LISTS:
+            by_user = {user_id: [] for user_id in user_ids}
+            for user_id, item_id in bind.execute(
+                sa.text(
+                    f"SELECT user_id, {id_column} FROM {table_name} "
+                    f"WHERE user_id IN :user_ids ORDER BY id"
+                ).bindparams(sa.bindparam("user_ids", expanding=True)),
+                {"user_ids": list(user_ids)},
+            ) if user_ids else ():
+                by_user[user_id].append(item_id)
+            lists[source] = by_user
+        bind.execute(
+            user_progress.update()
+            .where(user_progress.c.id == sa.bindparam("progress_id"))
+            .values(
+                completed_locations=sa.bindparam("completed"),
+                unlocked_achievements=sa.bindparam("achievements"),
+            ),
+            [
+                {
+                    "progress_id": progress_id,
+                    "completed": json.dumps(lists["completed_locations"].get(user_id, [])),
+                    "achievements": json.dumps(lists["unlocked_achievements"].get(user_id, [])),
+                }
+                for progress_id, user_id in rows
+            ],
+        )
+        last_id = rows[-1][0]
+
+    op.drop_table("user_achievements")
+    op.drop_table("user_completed_locations")
@@ -0,0 +1,27 @@
+"""add mastery_state.window_buffer (инкрементальный пересчёт mastery)
+
+Revision ID: c1a7e3f9b2d5
+Revises: b7c1e5a9d3f4
+Create Date: 2026-07-22
+
+Кольцевой буфер последних попыток окна прямо в строке mastery_state —
+новая попытка обновляет состояние одним read-modify-write, без
+перечитывания attempts. Бэкфилл не нужен: у существующих строк буфер
+NULL, и app/services/mastery.py заполняет его полным пересчётом при
+первой же новой попытке.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "c1a7e3f9b2d5"
+down_revision = "b7c1e5a9d3f4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("mastery_state", sa.Column("window_buffer", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("mastery_state", "window_buffer")
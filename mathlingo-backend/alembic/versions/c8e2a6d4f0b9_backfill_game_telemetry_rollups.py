@@ -0,0 +1,159 @@
+"""backfill game telemetry rollups from game_sessions / game_events
+
+Revision ID: c8e2a6d4f0b9
+Revises: a9c3e5f7b1d8
+Create Date: 2026-08-13
+
+f2d6b8e1a9c3 создала роллапы пустыми, и до ручного
+`python -m app.services.game_rollups rebuild` /admin/games/analytics
+показывал нули за всё, что было принято до неё. Здесь роллапы
+пересчитываются целиком (как rebuild) по типизированным колонкам
+game_events из a3e7c1f5d9b2: сессии — пачками по id, события — агрегатами
+по (сессия, уровень, тип). Правила — копия game_rollups.rebuild на момент
+миграции.
+"""
+from collections import Counter, defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "c8e2a6d4f0b9"
+down_revision = "a9c3e5f7b1d8"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 5000
+MASTERY_STARS = 3
+_COMPLETE = "level_complete"
+_ABANDON = "level_abandon"
+_FUNNEL_EVENTS = ("level_start", _COMPLETE, _ABANDON)
+
+_LEVEL_COLUMNS = ("starts", "completes", "abandons", "stars_count", "stars_sum",
+                  "stars_mastered", "metric_count", "metric_sum")
+_SESSION_COLUMNS = ("sessions_total", "sessions_open", "sessions_completed", "sessions_abandoned",
+                    "duration_count", "duration_sum_seconds")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    sessions = sa.table(
+        "game_sessions",
+        sa.column("id", sa.Integer),
+        sa.column("user_id", sa.Integer),
+        sa.column("game_id", sa.String),
+        sa.column("started_at", sa.DateTime),
+        sa.column("ended_at", sa.DateTime),
+    )
+    events = sa.table(
+        "game_events",
+        sa.column("id", sa.Integer),
+        sa.column("session_id", sa.Integer),
+        sa.column("event_type", sa.String),
+        sa.column("level_id", sa.String),
+        sa.column("stars", sa.Integer),
+        sa.column("metric", sa.Float),
+    )
+    level_stats = sa.table("game_level_daily_stats", *(
+        [sa.column("game_id"), sa.column("level_id"), sa.column("day")]
+        + [sa.column(c) for c in _LEVEL_COLUMNS]
+    ))
+    daily_stats = sa.table("game_daily_stats", *(
+        [sa.column("game_id"), sa.column("day")] + [sa.column(c) for c in _SESSION_COLUMNS]
+    ))
+    daily_players = sa.table(
+        "game_daily_players", sa.column("game_id"), sa.column("day"), sa.column("user_id"),
+    )
+
+    level_rows: dict[tuple, Counter] = defaultdict(Counter)
+    session_rows: dict[tuple, Counter] = defaultdict(Counter)
+    players = set()
+    level_key = sa.func.coalesce(events.c.level_id, "—")
+    last_id = 0
+    while True:
+        batch = bind.execute(
+            sa.select(sessions)
+            .where(sessions.c.id > last_id)
+            .order_by(sessions.c.id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not batch:
+            break
+        by_id = {}
+        for s in batch:
+            key = (s.game_id, s.started_at.date())
+            by_id[s.id] = key
+            session_rows[key]["sessions_total"] += 1
+            players.add((*key, s.user_id))
+            if s.ended_at is None:
+                session_rows[key]["sessions_open"] += 1
+            else:
+                session_rows[key]["duration_count"] += 1
+                session_rows[key]["duration_sum_seconds"] += (s.ended_at - s.started_at).total_seconds()
+
+        grouped = bind.execute(
+            sa.select(
+                events.c.session_id,
+                level_key,
+                events.c.event_type,
+                sa.func.count(events.c.id),
+                sa.func.count(events.c.stars),
+                sa.func.coalesce(sa.func.sum(events.c.stars), 0),
+                sa.func.coalesce(sa.func.sum(sa.case((events.c.stars >= MASTERY_STARS, 1), else_=0)), 0),
+                sa.func.count(events.c.metric),
+                sa.func.coalesce(sa.func.sum(events.c.metric), 0),
+            )
+            .where(
+                events.c.session_id >= batch[0].id,
+                events.c.session_id <= batch[-1].id,
+                events.c.event_type.in_(_FUNNEL_EVENTS),
+            )
+            .group_by(events.c.session_id, level_key, events.c.event_type)
+        ).all()
+        outcome_types = defaultdict(set)
+        for (session_id, level_id, event_type, count, stars_count, stars_sum,
+             mastered, metric_count, metric_sum) in grouped:
+            game_id, day = by_id[session_id]
+            row = level_rows[(game_id, level_id, day)]
+            outcome_types[session_id].add(event_type)
+            if event_type == "level_start":
+                row["starts"] += count
+            elif event_type == _COMPLETE:
+                row["completes"] += count
+                row["stars_count"] += stars_count
+                row["stars_sum"] += stars_sum
+                row["stars_mastered"] += mastered
+                row["metric_count"] += metric_count
+                row["metric_sum"] += metric_sum
+            else:
+                row["abandons"] += count
+        for session_id, types in outcome_types.items():
+            key = by_id[session_id]
+            completed = _COMPLETE in types
+            session_rows[key]["sessions_completed"] += int(completed)
+            session_rows[key]["sessions_abandoned"] += int(_ABANDON in types and not completed)
+        last_id = batch[-1].id
+
+    # Пересчёт целиком: строки, уже накопленные приёмом после f2d6b8e1a9c3,
+    # входят в сырые таблицы и посчитаны выше.
+    bind.execute(level_stats.delete())
+    bind.execute(daily_stats.delete())
+    bind.execute(daily_players.delete())
+    if level_rows:
+        bind.execute(level_stats.insert(), [
+            {**{c: 0 for c in _LEVEL_COLUMNS}, **counters, "game_id": game_id, "level_id": level_id, "day": day}
+            for (game_id, level_id, day), counters in level_rows.items()
+        ])
+    if session_rows:
+        bind.execute(daily_stats.insert(), [
+            {**{c: 0 for c in _SESSION_COLUMNS}, **counters, "game_id": game_id, "day": day}
+            for (game_id, day), counters in session_rows.items()
+        ])
+    if players:
+        bind.execute(daily_players.insert(), [
+            {"game_id": game_id, "day": day, "user_id": user_id} for game_id, day, user_id in players
+        ])
+
+
+def downgrade() -> None:
+    # Данные роллапов — производные; схему не трогаем, откатывать нечего.
+    pass
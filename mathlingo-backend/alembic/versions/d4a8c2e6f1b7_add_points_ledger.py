@@ -0,0 +1,71 @@
+"""add points_ledger, unique user_progress.user_id
+
+Revision ID: d4a8c2e6f1b7
+Revises: b5d3f7a2c8e4
+Create Date: 2026-08-06
+
+Очки начисляются атомарным UPDATE total_points = total_points + n и
+строкой в points_ledger (app/services/progress.py) вместо read-modify-write
+строки user_progress. Атомарный инкремент не спасает, если строк у ученика
+две, поэтому user_id становится уникальным. Дубли, которые могли остаться
+от гонки ленивого создания, сливаются в строку с меньшим id: очки
+суммируются, уровень — максимальный.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "d4a8c2e6f1b7"
+down_revision = "b5d3f7a2c8e4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    user_progress = sa.table(
+        "user_progress",
+        sa.column("id", sa.Integer),
+        sa.column("user_id", sa.Integer),
+        sa.column("current_level", sa.Integer),
+        sa.column("total_points", sa.Integer),
+    )
+    duplicates = bind.execute(
+        sa.select(
+            user_progress.c.user_id,
+            sa.func.min(user_progress.c.id),
+            sa.func.max(user_progress.c.current_level),
+            sa.func.sum(sa.func.coalesce(user_progress.c.total_points, 0)),
+        )
+        .where(user_progress.c.user_id.isnot(None))
+        .group_by(user_progress.c.user_id)
+        .having(sa.func.count() > 1)
+    ).all()
+    for user_id, keep_id, level, points in duplicates:
+        bind.execute(
+            user_progress.update()
+            .where(user_progress.c.id == keep_id)
+            .values(current_level=level, total_points=points)
+        )
+        bind.execute(
+            user_progress.delete()
+            .where(user_progress.c.user_id == user_id, user_progress.c.id != keep_id)
+        )
+
+    with op.batch_alter_table("user_progress") as batch_op:
+        batch_op.create_unique_constraint("uq_user_progress_user_id", ["user_id"])
+
+    op.create_table(
+        "points_ledger",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("points", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_points_ledger_user_id", "points_ledger", ["user_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_points_ledger_user_id", table_name="points_ledger")
+    op.drop_table("points_ledger")
+    with op.batch_alter_table("user_progress") as batch_op:
+        batch_op.drop_constraint("uq_user_progress_user_id", type_="unique")
@@ -0,0 +1,27 @@
+"""add attempts.ingest_id (очередь записи попыток)
+
+Revision ID: d8b2f6a1c4e7
+Revises: c1a7e3f9b2d5
+Create Date: 2026-07-23
+
+id записи Redis stream для попыток, пришедших через write-behind очередь
+(app/services/attempt_ingest.py). Уникальный индекс делает повторную
+обработку пачки после падения воркера идемпотентной.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "d8b2f6a1c4e7"
+down_revision = "c1a7e3f9b2d5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("attempts", sa.Column("ingest_id", sa.String(), nullable=True))
+    op.create_index("ix_attempts_ingest_id", "attempts", ["ingest_id"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_attempts_ingest_id", table_name="attempts")
+    op.drop_column("attempts", "ingest_id")
@@ -0,0 +1,36 @@
+"""add game_event_batches (идемпотентность батчей телеметрии)
+
+Revision ID: e4c9a2d7f1b3
+Revises: d8b2f6a1c4e7
+Create Date: 2026-07-24
+
+Клиентский batch_id батча POST /api/games/events: повторно присланный
+(ретрай офлайн-очереди) батч не записывает события второй раз.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "e4c9a2d7f1b3"
+down_revision = "d8b2f6a1c4e7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "game_event_batches",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("batch_id", sa.String(), nullable=False),
+        sa.Column(
+            "session_id", sa.Integer(),
+            sa.ForeignKey("game_sessions.id", ondelete="CASCADE"), nullable=False,
+        ),
+        sa.Column("accepted", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.UniqueConstraint("user_id", "batch_id", name="uq_game_event_batches_user_batch"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("game_event_batches")
@@ -0,0 +1,26 @@
+"""add user_game_progress.previous_best_stars
+
+Revision ID: e7f1a3c9d5b2
+Revises: d4a8c2e6f1b7
+Create Date: 2026-08-08
+
+Апсерт прогресса стал одним INSERT ... ON CONFLICT DO UPDATE RETURNING
+(app/services/game_progress.py); прежние звёзды для прироста лидерборда
+он сохраняет в этой колонке. Бэкфилл не нужен: NULL у существующих строк
+не читается, пока апсерт не обновит строку и не запишет значение.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "e7f1a3c9d5b2"
+down_revision = "d4a8c2e6f1b7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("user_game_progress", sa.Column("previous_best_stars", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("user_game_progress", "previous_best_stars")
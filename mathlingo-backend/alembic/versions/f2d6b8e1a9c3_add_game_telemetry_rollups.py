@@ -0,0 +1,64 @@
+"""add game telemetry rollups (дневные роллапы для /admin/games/analytics)
+
+Revision ID: f2d6b8e1a9c3
+Revises: e4c9a2d7f1b3
+Create Date: 2026-07-27
+
+Счётчики по (game_id, level_id, day) и (game_id, day) плюс игроки по дням —
+аналитика игр читает их вместо сырых game_events. Таблицы создаются
+пустыми; из уже накопленной телеметрии их заполняет c8e2a6d4f0b9 (то же,
+что `python -m app.services.game_rollups rebuild`).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "f2d6b8e1a9c3"
+down_revision = "e4c9a2d7f1b3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "game_level_daily_stats",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("game_id", sa.String(), nullable=False),
+        sa.Column("level_id", sa.String(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("starts", sa.Integer(), nullable=False),
+        sa.Column("completes", sa.Integer(), nullable=False),
+        sa.Column("abandons", sa.Integer(), nullable=False),
+        sa.Column("stars_count", sa.Integer(), nullable=False),
+        sa.Column("stars_sum", sa.Integer(), nullable=False),
+        sa.Column("stars_mastered", sa.Integer(), nullable=False),
+        sa.Column("metric_count", sa.Integer(), nullable=False),
+        sa.Column("metric_sum", sa.Float(), nullable=False),
+        sa.UniqueConstraint("game_id", "level_id", "day", name="uq_game_level_daily_stats_game_level_day"),
+    )
+    op.create_table(
+        "game_daily_stats",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("game_id", sa.String(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("sessions_total", sa.Integer(), nullable=False),
+        sa.Column("sessions_open", sa.Integer(), nullable=False),
+        sa.Column("sessions_completed", sa.Integer(), nullable=False),
+        sa.Column("sessions_abandoned", sa.Integer(), nullable=False),
+        sa.Column("duration_count", sa.Integer(), nullable=False),
+        sa.Column("duration_sum_seconds", sa.Float(), nullable=False),
+        sa.UniqueConstraint("game_id", "day", name="uq_game_daily_stats_game_day"),
+    )
+    op.create_table(
+        "game_daily_players",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("game_id", sa.String(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.UniqueConstraint("game_id", "day", "user_id", name="uq_game_daily_players_game_day_user"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("game_daily_players")
+    op.drop_table("game_daily_stats")
+    op.drop_table("game_level_daily_stats")
@@ -0,0 +1,32 @@
+"""add attempts (user_id, content_type, content_id, is_correct) and exam_tasks (difficulty, id) indexes
+
+Revision ID: f3b9d1e7a5c2
+Revises: e7f1a3c9d5b2
+Create Date: 2026-08-11
+
+exam_trainer.next_task выбирает задание анти-джойном к attempts
+(NOT EXISTS попытки ученика на задание) с LIMIT 1 вместо загрузки всего
+среза банка и всей истории ученика. Индекс attempts делает каждую проверку
+index-only, индекс exam_tasks по порядку подбора (difficulty, id) — даёт
+остановиться на первом подходящем задании без сортировки среза.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "f3b9d1e7a5c2"
+down_revision = "e7f1a3c9d5b2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_attempts_user_id_content_type_content_id_is_correct",
+        "attempts", ["user_id", "content_type", "content_id", "is_correct"],
+    )
+    op.create_index("ix_exam_tasks_difficulty_id", "exam_tasks", ["difficulty", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_exam_tasks_difficulty_id", table_name="exam_tasks")
+    op.drop_index("ix_attempts_user_id_content_type_content_id_is_correct", table_name="attempts")
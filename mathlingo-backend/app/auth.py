@@ -1,4 +1,7 @@
+import hashlib
+import hmac
 import os
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -12,6 +15,7 @@ from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.models import User, Admin
+from app.services import principal_cache
 
 # Загружаем переменные из .env
 load_dotenv()
@@ -55,6 +59,34 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return token
 
 
+# Ключ подписи CSRF выводится из SECRET_KEY, а не равен ему: подпись CSRF не
+# должна годиться ни для чего, что подписано SECRET_KEY напрямую (JWT).
+_CSRF_KEY = hashlib.sha256(b"mathlingo-csrf:" + SECRET_KEY.encode()).digest()
+
+
+def _csrf_signature(auth_token: str, expires: int) -> str:
+    message = f"{hashlib.sha256(auth_token.encode()).hexdigest()}:{expires}".encode()
+    return hmac.new(_CSRF_KEY, message, hashlib.sha256).hexdigest()
+
+
+def create_csrf_token(auth_token: str, ttl_seconds: int) -> str:
+    """
+    Stateless CSRF-токен (CSRF_MODE=hmac): "<истечение>.<HMAC>", привязан к
+    auth-токену. Проверяется на любом worker'е без общего хранилища — ключ
+    выводится из SECRET_KEY, одинакового у всех.
+    """
+    expires = int(time.time()) + ttl_seconds
+    return f"{expires}.{_csrf_signature(auth_token, expires)}"
+
+
+def verify_csrf_token(auth_token: str, csrf_token: str) -> bool:
+    expires, _, signature = csrf_token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    # Байты, а не str: compare_digest падает на не-ASCII строках из заголовка.
+    return hmac.compare_digest(signature.encode(), _csrf_signature(auth_token, int(expires)).encode())
+
+
 def get_token_from_request(request: Request) -> Optional[str]:
     """
     Получает токен из заголовка Authorization или из куки.
@@ -83,18 +115,20 @@ def get_admin_current_user(request: Request, db: Session = Depends(get_db)):
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_email = payload.get("sub")
-        user_role = payload.get("role")
+    except jwt.PyJWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Недействительный токен авторизации",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    user_email = payload.get("sub")
+    user_role = payload.get("role")
 
+    def load_admin() -> Admin:
         # Проверяем роль из токена
         if user_role == "admin":
             admin = db.query(Admin).filter(Admin.email == user_email).first()
             if admin:
-                if not admin.is_active:
-                    raise HTTPException(
-                        status_code=status.HTTP_403_FORBIDDEN,
-                        detail="Аккаунт деактивирован",
-                    )
                 return admin
 
         # Если роль не админ или админ не найден, проверяем обычного пользователя
@@ -113,15 +147,17 @@ def get_admin_current_user(request: Request, db: Session = Depends(get_db)):
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Доступ запрещен - требуются права администратора"
             )
-
         return admin
 
-    except jwt.PyJWTError:
+    admin = principal_cache.resolve(db, Admin, token, user_email, load_admin)
+    # is_active проверяется после кеша, а не в load_admin: закешированный
+    # админ проходит ту же проверку.
+    if user_role == "admin" and not admin.is_active:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Недействительный токен авторизации",
-            headers={"WWW-Authenticate": "Bearer"}
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Аккаунт деактивирован",
         )
+    return admin
 
 
 def require_role(*roles: str):
@@ -129,7 +165,9 @@ def require_role(*roles: str):
     Dependency factory для RBAC: пропускает только админов с одной из
     перечисленных ролей. Проверяет Admin.role из БД (а не claim из JWT),
     чтобы смена/понижение роли действовала немедленно, а не только после
-    истечения уже выданного токена.
+    истечения уже выданного токена. Роль берётся из кеша принципалов —
+    код, меняющий Admin.role/is_active, обязан вызвать
+    principal_cache.invalidate(email).
     """
     def dependency(current_admin: Admin = Depends(get_admin_current_user)) -> Admin:
         if current_admin.role not in roles:
@@ -183,13 +221,16 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"}
         )
 
-    user = db.query(User).filter(User.email == user_email).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Пользователь не найден"
-        )
+    def load_user() -> User:
+        user = db.query(User).filter(User.email == user_email).first()
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Пользователь не найден"
+            )
+        return user
 
+    user = principal_cache.resolve(db, User, token, user_email, load_user)
     if not user.is_active:
         # Токен ещё валиден (не истёк), но аккаунт деактивирован админом
         # ПОСЛЕ его выдачи — раньше это никак не проверялось: деактивация
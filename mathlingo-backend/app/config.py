@@ -39,3 +39,78 @@ def auth_cookie_kwargs() -> dict:
         "samesite": COOKIE_SAMESITE,
         "path": "/",
     }
+
+
+# Режим записи попыток учеников (submit-answer, игровой submit-attempt).
+#   sync   — попытка, очки, mastery и проверка аномалий пишутся прямо в
+#            запросе (по умолчанию, как было всегда).
+#   stream — запрос только решает "верно/неверно" и кладёт попытку в
+#            Redis stream; в БД её пишет отдельный воркер пачками
+#            (python -m app.services.attempt_ingest). Для пиков нагрузки:
+#            ученик не ждёт коммитов, но попытка видна в дашбордах/mastery
+#            с задержкой в одну пачку воркера.
+ATTEMPT_INGEST_MODE = os.getenv("ATTEMPT_INGEST_MODE", "sync").strip().lower()
+
+
+# Сводка админ-dashboard (app/services/dashboard.py) считает разделы
+# параллельно, каждый на своём соединении из пула.
+#   DASHBOARD_SECTION_WORKERS          — общий на процесс потолок потоков
+#                                        (= лишних соединений к БД) под
+#                                        разделы всех запросов сразу.
+#   DASHBOARD_SECTION_TIMEOUT_SECONDS  — бюджет одного раздела; не
+#                                        уложившийся отдаётся null и
+#                                        попадает в degraded, а не держит
+#                                        весь ответ.
+DASHBOARD_SECTION_WORKERS = int(os.getenv("DASHBOARD_SECTION_WORKERS", "8"))
+DASHBOARD_SECTION_TIMEOUT_SECONDS = float(os.getenv("DASHBOARD_SECTION_TIMEOUT_SECONDS", "5"))
+
+
+# Локальный уровень кеша (app/services/cache.py): LRU в памяти каждого
+# воркера перед Redis, инвалидация между воркерами — через Redis pub/sub.
+#   LOCAL_CACHE_MAX_BYTES    — потолок по суммарному размеру JSON записей.
+#   LOCAL_CACHE_TTL_SECONDS  — сколько живёт локальная копия; это же потолок
+#                              устаревания, если сообщение об инвалидации
+#                              потерялось.
+LOCAL_CACHE_ENABLED = _flag("LOCAL_CACHE_ENABLED", default=True)
+LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+LOCAL_CACHE_TTL_SECONDS = float(os.getenv("LOCAL_CACHE_TTL_SECONDS", "10"))
+
+
+# Кеш токен -> принципал для auth-зависимостей (app/services/principal_cache.py):
+# запрос с известным токеном не ходит в БД за пользователем/админом.
+# Деактивация и удаление инвалидируют его явно, TTL — только срок жизни
+# записи в Redis.
+AUTH_PRINCIPAL_CACHE_ENABLED = _flag("AUTH_PRINCIPAL_CACHE_ENABLED", default=True)
+AUTH_PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("AUTH_PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+
+# Где живут CSRF-токены cookie-сессий (csrf_protection в main.py).
+#   redis — случайный токен, SETEX на GET /api/me и GET на каждой мутации
+#           (по умолчанию, как было всегда). Новый токен вытесняет старый.
+#   hmac  — подписанный токен с истечением, выведенный из auth-токена и
+#           SECRET_KEY (app/auth.py: create_csrf_token); проверка — только
+#           CPU, мутации не ходят в Redis и не зависят от него. Старый
+#           токен действует до своего истечения, а не до выдачи нового.
+CSRF_MODE = os.getenv("CSRF_MODE", "redis").strip().lower()
+
+
+# Запись audit_log мидлварью AuditLogMiddleware (main.py,
+# app/services/audit_writer.py).
+#   sync      — строка пишется в конце каждого мутирующего admin-запроса
+#               отдельной транзакцией (по умолчанию, как было всегда).
+#   buffered  — запрос кладёт событие в ограниченный буфер процесса, фоновый
+#               поток пишет буфер пачками одной транзакцией раз в
+#               AUDIT_FLUSH_INTERVAL_SECONDS или по набору
+#               AUDIT_FLUSH_BATCH_SIZE событий; остаток дописывается при
+#               остановке приложения (lifespan).
+# AUDIT_QUEUE_FULL_POLICY — что делать, если в буфере уже
+# AUDIT_QUEUE_MAX_SIZE событий (БД не успевает или недоступна):
+#   sync   — записать это событие прямо в запросе (по умолчанию);
+#   flush  — записать в запросе весь буфер вместе с ним: запросы тормозят,
+#            пока БД не догонит, но порядок id сохраняется.
+# Событие не отбрасывается ни в одном из режимов.
+AUDIT_LOG_MODE = os.getenv("AUDIT_LOG_MODE", "sync").strip().lower()
+AUDIT_QUEUE_MAX_SIZE = int(os.getenv("AUDIT_QUEUE_MAX_SIZE", "10000"))
+AUDIT_QUEUE_FULL_POLICY = os.getenv("AUDIT_QUEUE_FULL_POLICY", "sync").strip().lower()
+AUDIT_FLUSH_BATCH_SIZE = int(os.getenv("AUDIT_FLUSH_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1"))
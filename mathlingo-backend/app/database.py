@@ -1,7 +1,11 @@
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+
+from sqlalchemy import create_engine, event, exc
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import Pool, QueuePool
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,9 +22,61 @@ if not DATABASE_URL:
 # QueuePool (реальная БД) — SQLite в тестах использует SingletonThreadPool,
 # который эти аргументы не принимает, поэтому применяем только для
 # не-SQLite URL (R4).
+#
+# Метрики пула (pool_stats): сколько раз соединение брали из пула и сколько
+# ждали выдачи — под нагрузкой это первое, что упирается в
+# pool_size + max_overflow раньше, чем в саму БД.
+class _PoolMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def record_wait(self, seconds: float, timed_out: bool) -> None:
+        with self.lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            self.timeouts += int(timed_out)
+
+
+pool_metrics = _PoolMetrics()
+
+
+@event.listens_for(Pool, "checkout")
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    with pool_metrics.lock:
+        pool_metrics.checkouts += 1
+
+
+class _TimedQueuePool(QueuePool):
+    """
+    QueuePool, замеряющий ожидание выдачи соединения (включая открытие
+    нового в пределах overflow). _do_get рекурсивен — меряем только
+    внешний вызов.
+    """
+    _depth = threading.local()
+
+    def _do_get(self):
+        if getattr(self._depth, "value", 0):
+            return super()._do_get()
+        self._depth.value = 1
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self._depth.value = 0
+            pool_metrics.record_wait(time.perf_counter() - started, timed_out)
+
+
 engine_kwargs = {"pool_pre_ping": True, "pool_recycle": 1800}
 if not DATABASE_URL.startswith("sqlite"):
-    engine_kwargs.update(pool_size=10, max_overflow=20)
+    engine_kwargs.update(pool_size=10, max_overflow=20, poolclass=_TimedQueuePool)
 
 # Создаем движок SQLAlchemy
 engine = create_engine(DATABASE_URL, **engine_kwargs)
@@ -31,10 +87,74 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Базовый класс для моделей
 Base = declarative_base()
 
+class LazySession:
+    """
+    Сессия запроса, которая создаётся при первом обращении к ней. Роуты,
+    отвечающие из кеша (dashboard, активный сценарий, skills, subjects),
+    объявляют get_db ради промаха — на попадании сессия не создаётся, и
+    закрывать нечего. Соединение из пула Session и так берёт только на
+    первом запросе к БД; get_bind() (independent_session) не создаёт ни
+    сессию, ни соединение.
+    """
+
+    def __init__(self, factory=None):
+        self._factory = factory or SessionLocal
+        self._session = None
+
+    @property
+    def materialized(self) -> bool:
+        return self._session is not None
+
+    def _get(self):
+        if self._session is None:
+            self._session = self._factory()
+        return self._session
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def get_bind(self, *args, **kwargs):
+        if self._session is None and not args and not kwargs:
+            return self._factory.kw["bind"]
+        return self._get().get_bind(*args, **kwargs)
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+
+
 # Функция для получения сессии БД
 def get_db():
-    db = SessionLocal()
+    db = LazySession()
     try:
         yield db
     finally:
         db.close()
+
+
+def pool_stats() -> dict:
+    """Счётчики выдачи соединений и текущая занятость пула основного engine."""
+    with pool_metrics.lock:
+        stats = {
+            "checkouts": pool_metrics.checkouts,
+            "checkout_wait_seconds_total": round(pool_metrics.wait_seconds_total, 6),
+            "checkout_wait_seconds_max": round(pool_metrics.wait_seconds_max, 6),
+            "checkout_timeouts": pool_metrics.timeouts,
+        }
+    if isinstance(engine.pool, QueuePool):
+        stats.update(
+            checked_out=engine.pool.checkedout(),
+            pool_size=engine.pool.size(),
+            overflow=engine.pool.overflow(),
+        )
+    return stats
+
+
+def independent_session(db):
+    """
+    Новая сессия на том же engine, что и db (в тестах — на тестовой SQLite).
+    Для работы, которая может пережить запрос или идти в другом потоке —
+    например, фоновый пересчёт кеша (cache.get_or_refresh): сессию запроса
+    к тому моменту уже закроет get_db.
+    """
+    return SessionLocal(bind=db.get_bind())
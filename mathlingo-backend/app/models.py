@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, UniqueConstraint, JSON
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Date, Float, Index, UniqueConstraint, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -161,6 +161,15 @@ class Attempt(Base):
     docs/roadmap/product-technical-plan.md, R2 §2).
     """
     __tablename__ = "attempts"
+    __table_args__ = (
+        # История ученика по типу контента: прогресс тренажёра
+        # (exam_trainer.compute_progress) и пересборка очереди повторений
+        # (exam_review.rebuild). Подбор next_task ходит уже в очередь.
+        Index(
+            "ix_attempts_user_id_content_type_content_id_is_correct",
+            "user_id", "content_type", "content_id", "is_correct",
+        ),
+    )
 
     # "exam" — попытки тренажёра ЕГЭ/ОГЭ, content_id смотрит на exam_tasks
     # (Ф3, app/services/exam_trainer.py).
@@ -177,6 +186,11 @@ class Attempt(Base):
     hints_used = Column(Integer, nullable=False, default=0)
     source = Column(String, nullable=False, default="manual")
     created_at = Column(DateTime, default=datetime.utcnow)
+    # id записи Redis stream, если попытка пришла через очередь
+    # (app/services/attempt_ingest.py) — уникальность не даёт воркеру
+    # записать её дважды при повторной обработке после падения. NULL для
+    # синхронной записи.
+    ingest_id = Column(String, nullable=True, unique=True, index=True)
 
     user = relationship("User")
     skill = relationship("Skill")
@@ -204,6 +218,11 @@ class MasteryState(Base):
     factors = Column(JSON, nullable=True)
     window_from = Column(DateTime, nullable=True)
     window_to = Column(DateTime, nullable=True)
+    # Кольцевой буфер окна (<= WINDOW_SIZE позиций, от новой попытки к
+    # старой): [attempt_id, created_at, correct, hinted, time_ratio] — см.
+    # apply_attempt() в app/services/mastery.py. NULL — строка записана до
+    # появления буфера, первый же пересчёт его заполнит.
+    window_buffer = Column(JSON, nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user = relationship("User")
@@ -367,7 +386,7 @@ class AIQuota(Base):
 
 class AuditLog(Base):
     """
-    Пишется автоматически мидлварью audit_logging в main.py для КАЖДОГО
+    Пишется автоматически мидлварью AuditLogMiddleware в main.py для КАЖДОГО
     мутирующего запроса под /admin (POST/PUT/PATCH/DELETE), успешного или
     нет — покрытие не зависит от того, вспомнил ли автор нового эндпоинта
     вызвать логирование вручную. entity_type/entity_id/action — best-effort
@@ -506,14 +525,66 @@ class ContentFlag(Base):
 
 
 class UserProgress(Base):
+    """
+    Сводная строка прогресса ученика. total_points меняется только атомарным
+    UPDATE ... SET total_points = total_points + n (app/services/progress.py),
+    а каждое начисление остаётся строкой в points_ledger. Строка на ученика
+    одна — иначе параллельные первые начисления создали бы две.
+    """
     __tablename__ = "user_progress"
+    __table_args__ = (
+        UniqueConstraint("user_id", name="uq_user_progress_user_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     current_level = Column(Integer, default=1)
     total_points = Column(Integer, default=0)
-    completed_locations = Column(String, default="[]")  # JSON массив с ID локаций
-    unlocked_achievements = Column(String, default="[]")  # JSON массив с ID достижений
+
+
+class PointsLedgerEntry(Base):
+    """
+    Одно начисление очков (append-only): сумма по ученику — история
+    total_points с момента появления журнала; строки не правятся и не
+    удаляются, кроме как вместе с учеником.
+    """
+    __tablename__ = "points_ledger"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    points = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UserCompletedLocation(Base):
+    """
+    Пройденная учеником локация карты. Раньше — JSON-строка
+    user_progress.completed_locations, которую каждая загрузка карты
+    разбирала json.loads и сканировала списком; теперь это строки с
+    уникальным индексом (user_id, location_id).
+    """
+    __tablename__ = "user_completed_locations"
+    __table_args__ = (
+        UniqueConstraint("user_id", "location_id", name="uq_user_completed_locations_user_location"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    location_id = Column(Integer, ForeignKey("map_locations.id", ondelete="CASCADE"), nullable=False)
+    completed_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UserAchievement(Base):
+    """Открытое учеником достижение (раньше — user_progress.unlocked_achievements)."""
+    __tablename__ = "user_achievements"
+    __table_args__ = (
+        UniqueConstraint("user_id", "achievement_id", name="uq_user_achievements_user_achievement"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    achievement_id = Column(Integer, ForeignKey("achievements.id", ondelete="CASCADE"), nullable=False)
+    unlocked_at = Column(DateTime, default=datetime.utcnow)
 
 
 # Модель раздела математики
@@ -598,8 +669,17 @@ class GameEvent(Base):
     client_ts — время события НА КЛИЕНТЕ: события могут копиться в офлайн-
     очереди (Фаза 7) и долетать пачкой позже created_at, поэтому порядок для
     аналитики надо брать по client_ts, а не по времени вставки.
+
+    level_id/stars/metric — известные поля payload, разложенные при приёме
+    (game_telemetry.extract_fields): воронку и исходы сессий аналитика
+    считает агрегатами по ним, а не разбором JSON в Python. metric — ходы
+    (игра A) или тики (игра B). NULL — поля в payload не было.
     """
     __tablename__ = "game_events"
+    __table_args__ = (
+        Index("ix_game_events_event_type_level_id", "event_type", "level_id"),
+        Index("ix_game_events_session_id_event_type", "session_id", "event_type"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("game_sessions.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -607,10 +687,105 @@ class GameEvent(Base):
     payload = Column(JSON, nullable=True)
     client_ts = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    level_id = Column(String, nullable=True)
+    stars = Column(Integer, nullable=True)
+    metric = Column(Float, nullable=True)
 
     session = relationship("GameSession")
 
 
+class GameEventBatch(Base):
+    """
+    Принятый батч телеметрии с клиентским batch_id — ключ идемпотентности:
+    офлайн-очередь (Фаза 7) ретраит батч, если не дождалась ответа, и без
+    этой строки события посчитались бы дважды. Пишется в той же транзакции,
+    что и сами события (app/services/game_telemetry.py), поэтому "батч
+    принят" и "события записаны" не расходятся. session_id/accepted —
+    чтобы повтор получил тот же ответ, что и оригинал.
+    """
+    __tablename__ = "game_event_batches"
+    __table_args__ = (
+        UniqueConstraint("user_id", "batch_id", name="uq_game_event_batches_user_batch"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    batch_id = Column(String, nullable=False)
+    session_id = Column(Integer, ForeignKey("game_sessions.id", ondelete="CASCADE"), nullable=False)
+    accepted = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class GameLevelDailyStats(Base):
+    """
+    Дневной роллап телеметрии по уровню игры — из него /admin/games/analytics
+    считает воронку, не читая game_events (app/services/game_analytics.py).
+    day — дата НАЧАЛА сессии (UTC): окно аналитики всегда фильтровало по
+    started_at, поэтому события позднего батча идут в день своей сессии.
+    Звёзды хранятся ровно в том виде, который читает отчёт: число
+    прохождений со звёздами, их сумма и сколько из них на MASTERY_STARS.
+    Ведётся инкрементально при приёме батча (app/services/game_rollups.py).
+    """
+    __tablename__ = "game_level_daily_stats"
+    __table_args__ = (
+        UniqueConstraint("game_id", "level_id", "day", name="uq_game_level_daily_stats_game_level_day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    game_id = Column(String, nullable=False)
+    level_id = Column(String, nullable=False)
+    day = Column(Date, nullable=False)
+    starts = Column(Integer, nullable=False, default=0)
+    completes = Column(Integer, nullable=False, default=0)
+    abandons = Column(Integer, nullable=False, default=0)
+    stars_count = Column(Integer, nullable=False, default=0)
+    stars_sum = Column(Integer, nullable=False, default=0)
+    stars_mastered = Column(Integer, nullable=False, default=0)
+    metric_count = Column(Integer, nullable=False, default=0)
+    metric_sum = Column(Float, nullable=False, default=0)
+
+
+class GameDailyStats(Base):
+    """
+    Дневной роллап сессий игры (day — дата начала сессии, как и у
+    GameLevelDailyStats). sessions_open уменьшается, когда сессия
+    закрывается; sessions_abandoned — сессии с level_abandon и без
+    level_complete, поэтому может и уменьшиться, если завершение долетело
+    следующим батчем.
+    """
+    __tablename__ = "game_daily_stats"
+    __table_args__ = (
+        UniqueConstraint("game_id", "day", name="uq_game_daily_stats_game_day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    game_id = Column(String, nullable=False)
+    day = Column(Date, nullable=False)
+    sessions_total = Column(Integer, nullable=False, default=0)
+    sessions_open = Column(Integer, nullable=False, default=0)
+    sessions_completed = Column(Integer, nullable=False, default=0)
+    sessions_abandoned = Column(Integer, nullable=False, default=0)
+    duration_count = Column(Integer, nullable=False, default=0)
+    duration_sum_seconds = Column(Float, nullable=False, default=0)
+
+
+class GameDailyPlayer(Base):
+    """
+    Кто играл в игру в этот день. Уникальных игроков за окно не сложить из
+    дневных счётчиков, поэтому players считается COUNT(DISTINCT) по этой
+    таблице — она растёт как «игроко-дни», а не как события.
+    """
+    __tablename__ = "game_daily_players"
+    __table_args__ = (
+        UniqueConstraint("game_id", "day", "user_id", name="uq_game_daily_players_game_day_user"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    game_id = Column(String, nullable=False)
+    day = Column(Date, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+
 class UserGameProgress(Base):
     """
     Лучший результат пользователя на каждом уровне игры — межсессионно, в
@@ -631,6 +806,10 @@ class UserGameProgress(Base):
     level_id = Column(String, nullable=False)
     best_stars = Column(Integer, nullable=False, default=0)
     best_metric = Column(Integer, nullable=True)  # ходы (A) / итерации (B), меньше = лучше
+    # best_stars до последнего улучшения; NULL — рекорд ещё не обновлялся.
+    # Пишется апсертом (app/services/game_progress.py), из неё считается
+    # прирост для лидерборда.
+    previous_best_stars = Column(Integer, nullable=True)
     completed_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User")
@@ -669,6 +848,12 @@ class ExamTask(Base):
     Ответ/разбор наружу студенту не отдаются до проверки (см. app/routes/exam.py).
     """
     __tablename__ = "exam_tasks"
+    __table_args__ = (
+        # Порядок подбора тренажёра (exam_trainer.next_task): с ним LIMIT 1
+        # идёт по индексу и останавливается на первом подходящем, а не
+        # сортирует весь срез банка.
+        Index("ix_exam_tasks_difficulty_id", "difficulty", "id"),
+    )
 
     EXAMS = ("oge", "ege")
     TRACKS = ("base", "profile")  # у ЕГЭ; у ОГЭ track=None
@@ -691,6 +876,31 @@ class ExamTask(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class ExamReviewItem(Base):
+    """
+    Состояние интервального повторения (SM-2) задания банка для ученика —
+    очередь повторений тренажёра. Строка появляется при первой попытке и
+    пересчитывается на каждой следующей (app/services/exam_review.py);
+    /api/exam/next берёт самое раннее due_at по индексу (user_id, due_at),
+    а не восстанавливает историю из attempts.
+    """
+    __tablename__ = "exam_review_items"
+    __table_args__ = (
+        UniqueConstraint("user_id", "exam_task_id", name="uq_exam_review_items_user_task"),
+        Index("ix_exam_review_items_user_id_due_at", "user_id", "due_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    exam_task_id = Column(Integer, ForeignKey("exam_tasks.id", ondelete="CASCADE"), nullable=False)
+    repetitions = Column(Integer, nullable=False, default=0)   # верных подряд
+    interval_days = Column(Integer, nullable=False, default=0)
+    ease_factor = Column(Float, nullable=False, default=2.5)
+    lapses = Column(Integer, nullable=False, default=0)        # сколько раз «забыл»
+    due_at = Column(DateTime, nullable=False)
+    last_reviewed_at = Column(DateTime, nullable=True)
+
+
 class TutorProfile(Base):
     """
     Публичный профиль репетитора в маркетплейсе. Связь 1:1 с User — наличие
@@ -0,0 +1,67 @@
+# app/routes/_conditional.py
+"""
+Условные GET (ETag / If-None-Match) для редко меняющихся student-facing
+ресурсов: каталог игр, разделы, темы, активный сценарий, данные группы
+заданий — фронт перезапрашивает их почти на каждом экране. Не роутер,
+только зависимости.
+
+ETag строится из версии содержимого (поколение пространства имён кеша,
+см. cache.namespaced_key), а не из хеша тела: версия читается из
+локального уровня кеша, и совпавший If-None-Match отвечает 304 до
+запросов роута, валидации и сериализации.
+
+Для закрытых ресурсов 304 отдаётся только после auth-зависимости роута
+(principal=get_current_user / get_admin_current_user / require_role(...)):
+одной подписи токена мало — иначе деактивированный пользователь или
+ученик с токеном на /admin/... узнавали бы по 304, менялось ли
+содержимое. Принципал берётся из кеша (app/services/principal_cache.py),
+так что на 304 по-прежнему нет запросов к БД.
+"""
+from typing import Any, Callable, Optional
+
+from fastapi import Depends, HTTPException, Request, Response, status
+
+from app.services import cache
+
+# Запросы, для которых If-None-Match означает «отдай 304» (RFC 9110 §13.1.2).
+_CONDITIONAL_METHODS = ("GET", "HEAD")
+
+
+def namespace_version(namespace: str) -> str:
+    """Версия содержимого = поколение пространства имён кеша."""
+    return f"{namespace}.g{cache.namespace_generation(namespace)}"
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Слабое сравнение: W/"x" клиента совпадает с "x".
+    return "*" in candidates or etag in (tag.removeprefix("W/") for tag in candidates)
+
+
+def etag_dependency(version: Callable[[Request], str], principal: Optional[Callable[..., Any]] = None):
+    """
+    Dependency factory: version(request) -> версия содержимого ресурса
+    (дёшево, без БД). Совпал If-None-Match — 304 Not Modified, иначе
+    ETag проставляется в ответ (и в request.state для
+    response_cache.build_response) и роут выполняется как обычно.
+    principal — auth-зависимость роута (та же, что у его параметра: FastAPI
+    разрешит её один раз на запрос); без неё ресурс публичный.
+    """
+    def check(request: Request, response: Response) -> str:
+        etag = f'"{version(request)}"'
+        request.state.etag = etag
+        if (
+                request.method in _CONDITIONAL_METHODS
+                and _matches(request.headers.get("if-none-match", ""), etag)
+        ):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return etag
+
+    if principal is None:
+        return check
+
+    def dependency(request: Request, response: Response, _principal: Any = Depends(principal)) -> str:
+        return check(request, response)
+
+    return dependency
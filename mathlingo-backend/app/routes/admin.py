@@ -7,7 +7,7 @@ from pydantic import BaseModel
 
 from app.database import get_db
 from app.models import (
-    Admin, AuditLog, Diagnostic, Skill, Task, User, Subject, AdventureMap,
+    Admin, AuditLog, Diagnostic, Skill, Task, User, Subject, AdventureMap, UserGameProgress,
 )
 from app.schemas import (
     AdminAccountResponse, AdminCreate, AdminResponse, AuditLogResponse,
@@ -16,7 +16,7 @@ from app.schemas import (
 from app.auth import get_admin_current_user, get_admin_current_user_optional, create_access_token, hash_password, verify_password, require_role
 from app.routes._admin_rbac import CAN_MANAGE_CONTENT
 from app.routes.subjects import SUBJECTS_LIST_CACHE_PREFIX
-from app.services import cache
+from app.services import cache, leaderboard, principal_cache
 from typing import Optional
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -155,7 +155,7 @@ def create_subject(
     db.add(db_subject)
     db.commit()
     db.refresh(db_subject)
-    cache.delete_prefix(f"{SUBJECTS_LIST_CACHE_PREFIX}:")
+    cache.bump_namespace(SUBJECTS_LIST_CACHE_PREFIX)
     return db_subject
 
 
@@ -193,7 +193,7 @@ def update_subject(
 
     db.commit()
     db.refresh(db_subject)
-    cache.delete_prefix(f"{SUBJECTS_LIST_CACHE_PREFIX}:")
+    cache.bump_namespace(SUBJECTS_LIST_CACHE_PREFIX)
     return db_subject
 
 
@@ -237,7 +237,7 @@ def delete_subject(
 
     db.delete(db_subject)
     db.commit()
-    cache.delete_prefix(f"{SUBJECTS_LIST_CACHE_PREFIX}:")
+    cache.bump_namespace(SUBJECTS_LIST_CACHE_PREFIX)
     return None
 
 
@@ -259,6 +259,8 @@ def update_user_status(
 
     user.is_active = status_update.is_active  # Используем is_active из модели
     db.commit()
+    # Деактивация действует сразу — и для уже закешированных токенов.
+    principal_cache.invalidate(user.email)
     return {"message": f"Пользователь {'активирован' if status_update.is_active else 'деактивирован'} успешно"}
 
 
@@ -287,12 +289,15 @@ def bulk_update_user_status(
         db: Session = Depends(get_db),
         current_admin: Admin = Depends(require_role("superadmin")),
 ):
+    emails = [email for (email,) in db.query(User.email).filter(User.id.in_(body.ids))]
     updated = (
         db.query(User)
         .filter(User.id.in_(body.ids))
         .update({"is_active": body.is_active}, synchronize_session=False)
     )
     db.commit()
+    for email in emails:
+        principal_cache.invalidate(email)
     return {"updated_count": updated}
 
 
@@ -309,9 +314,15 @@ def delete_user(
 
     # Optional: Handle related tasks
     db.query(Task).filter(Task.owner_id == user_id).update({Task.owner_id: None})
+    # Прогресс мини-игр — источник рейтинга; вместе с ним пользователь
+    # уходит и из ZSET'ов лидерборда (после commit).
+    db.query(UserGameProgress).filter(UserGameProgress.user_id == user_id).delete(synchronize_session=False)
 
+    email = user.email
     db.delete(user)
     db.commit()
+    principal_cache.invalidate(email)
+    leaderboard.remove_user_or_invalidate(user_id)
     return {"message": "User deleted successfully"}
 
 
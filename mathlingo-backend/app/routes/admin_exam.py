@@ -16,11 +16,12 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import Admin, ExamTask
 from app.routes._admin_rbac import CAN_MANAGE_CONTENT, CAN_VIEW_QUALITY
+from app.routes.exam import EXAM_TOPICS_CACHE_PREFIX
 from app.schemas import (
     ExamBankStats, ExamGenerateRequest, ExamGenerateResult,
     ExamImportResult, ExamTopicFacet,
 )
-from app.services import content_pack, exam_generator
+from app.services import cache, content_pack, exam_generator
 
 router = APIRouter(prefix="/admin/exam", tags=["admin_exam"])
 
@@ -36,6 +37,7 @@ async def import_exam_pack(
     raw = await file.read()
     text = raw.decode("utf-8", errors="replace")
     result = content_pack.import_pack(db, text)
+    cache.bump_namespace(EXAM_TOPICS_CACHE_PREFIX)
     return ExamImportResult(**result)
 
 
@@ -52,6 +54,7 @@ def generate_exam_tasks(
         db, exam=body.exam, track=body.track, count=body.count,
         topics=body.topics, seed=body.seed,
     )
+    cache.bump_namespace(EXAM_TOPICS_CACHE_PREFIX)
     return ExamGenerateResult(**result)
 
 
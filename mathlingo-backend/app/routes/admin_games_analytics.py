@@ -34,7 +34,9 @@ def get_games_analytics(
     """
     Сводка вовлечённости по играм. Без параметров — по всем известным играм за
     всё время. game_id сужает до одной игры (404 на неизвестную), days — до
-    окна в N последних дней (по началу сессии).
+    окна в N последних дней (по началу сессии). Сводка читается из дневных
+    роллапов, неполный первый день окна досчитывается по событиям (см.
+    compute_game_engagement).
     """
     if game_id is not None and game_id not in GameSession.GAME_IDS:
         raise HTTPException(status_code=404, detail="Unknown game_id")
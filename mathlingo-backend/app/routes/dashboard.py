@@ -4,14 +4,14 @@ R3 task 7: финальный dashboard — один эндпоинт, агре
 mastery_state/ai_generation_items/content_flags/audit_log (см.
 app/services/dashboard.py и docs/roadmap/product-technical-plan.md R3 §3).
 """
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import get_db, independent_session, pool_stats
 from app.models import Admin
-from app.schemas import DashboardOverviewResponse
+from app.schemas import DashboardOverviewResponse, RuntimeStatsResponse
 from app.auth import require_role
-from app.services import cache, dashboard
+from app.services import cache, dashboard, response_cache
 
 router = APIRouter(prefix="/admin/dashboard", tags=["dashboard"])
 
@@ -25,22 +25,42 @@ CAN_VIEW_DASHBOARD = require_role("superadmin", "content_manager", "teacher")
 # учитывать include_admin_actions — иначе ответ, закешированный для
 # superadmin (с действиями администраторов), мог бы отдаться teacher'у,
 # которому эти данные видеть нельзя (см. R3 §5).
+# По истечении DASHBOARD_CACHE_TTL сводка пересчитывается в фоне одним
+# держателем лока, а до DASHBOARD_CACHE_HARD_TTL отдаётся устаревшая —
+# одновременные запросы на истёкшем ключе не пересчитывают все агрегаты
+# разом (см. cache.get_or_refresh). В кеше — готовое сжатое тело ответа
+# (app/services/response_cache.py).
 DASHBOARD_CACHE_TTL = 45
+DASHBOARD_CACHE_HARD_TTL = 300
 
 
 @router.get("/overview", response_model=DashboardOverviewResponse)
 def get_dashboard_overview(
+        request: Request,
         db: Session = Depends(get_db),
         current_admin: Admin = Depends(CAN_VIEW_DASHBOARD),
 ):
     include_admin_actions = current_admin.role != "teacher"
     cache_key = f"dashboard_overview:{'full' if include_admin_actions else 'teacher'}"
 
-    cached = cache.get_json(cache_key)
-    if cached is not None:
-        return cached
+    def compute():
+        with independent_session(db) as own_db:
+            overview = dashboard.get_overview(own_db, include_admin_actions=include_admin_actions)
+        return DashboardOverviewResponse.model_validate(overview).model_dump(mode="json")
 
-    overview = dashboard.get_overview(db, include_admin_actions=include_admin_actions)
-    result_dict = DashboardOverviewResponse.model_validate(overview).model_dump(mode="json")
-    cache.set_json(cache_key, result_dict, ttl=DASHBOARD_CACHE_TTL)
-    return result_dict
+    # Неполную сводку (раздел не уложился в таймаут) не кешируем — иначе
+    # null держался бы весь TTL, хотя следующий запрос мог бы его досчитать.
+    return response_cache.cached_response(
+        request, cache_key, compute,
+        soft_ttl=DASHBOARD_CACHE_TTL, hard_ttl=DASHBOARD_CACHE_HARD_TTL,
+        cache_if=lambda result: not result["degraded"],
+    )
+
+
+@router.get("/runtime", response_model=RuntimeStatsResponse)
+def get_runtime_stats(current_admin: Admin = Depends(require_role("superadmin"))):
+    """
+    Давление на пул соединений и попадания в кеш этого воркера — видно,
+    сколько запросов отвечают, не беря соединение из пула.
+    """
+    return RuntimeStatsResponse(db_pool=pool_stats(), cache=cache.stats())
@@ -10,21 +10,29 @@
 """
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.auth import get_current_user
-from app.database import get_db
+from app.database import get_db, independent_session
 from app.models import ExamTask, User
 from app.schemas import (
     ExamAttemptRequest, ExamAttemptResult, ExamProgress,
     ExamTaskList, ExamTaskPublic, ExamTopicFacet,
 )
-from app.services import exam_trainer
+from app.services import cache, exam_trainer, response_cache
 
 router = APIRouter(prefix="/api/exam", tags=["exam"])
 
+# Фасеты тем — GROUP BY по всему банку на каждое открытие дерева тем, а банк
+# меняется только импортом/генерацией (content_pack, exam_generator — они
+# инвалидируют пространство имён через cache.bump_namespace). Мягкий/жёсткий
+# TTL — см. cache.get_or_refresh.
+EXAM_TOPICS_CACHE_PREFIX = "exam_topics"
+EXAM_TOPICS_CACHE_TTL = 300
+EXAM_TOPICS_CACHE_HARD_TTL = 1800
+
 
 def _apply_filters(query, exam, track, topic, task_number):
     if exam is not None:
@@ -57,6 +65,7 @@ def list_exam_tasks(
 
 @router.get("/topics", response_model=list[ExamTopicFacet])
 def list_topics(
+        request: Request,
         exam: Optional[str] = Query(default=None),
         track: Optional[str] = Query(default=None),
         db: Session = Depends(get_db),
@@ -64,21 +73,28 @@ def list_topics(
 ):
     """Фасеты для навигации курса: сколько заданий по каждой (exam, track,
     task_number, topic). Используется деревом тем на фронте."""
-    query = db.query(
-        ExamTask.exam, ExamTask.track, ExamTask.task_number, ExamTask.topic,
-        func.count(ExamTask.id),
+    def compute():
+        with independent_session(db) as own_db:
+            query = own_db.query(
+                ExamTask.exam, ExamTask.track, ExamTask.task_number, ExamTask.topic,
+                func.count(ExamTask.id),
+            )
+            if exam is not None:
+                query = query.filter(ExamTask.exam == exam)
+            if track is not None:
+                query = query.filter(ExamTask.track == track)
+            rows = query.group_by(
+                ExamTask.exam, ExamTask.track, ExamTask.task_number, ExamTask.topic,
+            ).all()
+        return [
+            ExamTopicFacet(exam=e, track=t, task_number=n, topic=tp, count=c).model_dump(mode="json")
+            for (e, t, n, tp, c) in rows
+        ]
+
+    return response_cache.cached_response(
+        request, cache.namespaced_key(EXAM_TOPICS_CACHE_PREFIX, exam, track), compute,
+        soft_ttl=EXAM_TOPICS_CACHE_TTL, hard_ttl=EXAM_TOPICS_CACHE_HARD_TTL,
     )
-    if exam is not None:
-        query = query.filter(ExamTask.exam == exam)
-    if track is not None:
-        query = query.filter(ExamTask.track == track)
-    rows = query.group_by(
-        ExamTask.exam, ExamTask.track, ExamTask.task_number, ExamTask.topic,
-    ).all()
-    return [
-        ExamTopicFacet(exam=e, track=t, task_number=n, topic=tp, count=c)
-        for (e, t, n, tp, c) in rows
-    ]
 
 
 @router.get("/tasks/{task_id}", response_model=ExamTaskPublic)
@@ -102,7 +118,7 @@ def next_exam_task(
         db: Session = Depends(get_db),
         current_user: User = Depends(get_current_user),
 ):
-    """Что решать дальше: сначала невиденное, потом нерешённое, потом повтор."""
+    """Что решать дальше: созревшее повторение, потом невиденное, потом ближайшее повторение."""
     task = exam_trainer.next_task(
         db, current_user, exam=exam, track=track, topic=topic, task_number=task_number,
     )
@@ -10,20 +10,22 @@ backend-контракт, на который он будет опираться
 домен (GameScenario), что и admin-CRUD выше, только другой префикс и роли,
 поэтому отдельный router (student_router) в этом же файле.
 """
+import time
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from app.database import get_db
+from app.database import get_db, independent_session
 from app.models import Admin, GameScenario, GameScenarioChecklistItem, Skill, User
 from app.schemas import (
     ActiveGameScenarioResponse, GameAttemptSubmissionRequest, GameAttemptSubmissionResponse,
     GameScenarioChecklistItemResponse, GameScenarioCreate, GameScenarioResponse, GameScenarioUpdate,
 )
 from app.auth import get_admin_current_user, get_current_user, require_role
-from app.services import cache, game_attempts, game_config
+from app.routes._conditional import etag_dependency, namespace_version
+from app.services import attempt_ingest, cache, game_attempts, game_config
 
 router = APIRouter(prefix="/admin/game-scenarios", tags=["game_scenarios"])
 student_router = APIRouter(prefix="/gamification/game-scenarios", tags=["game_scenarios"])
@@ -34,15 +36,32 @@ student_router = APIRouter(prefix="/gamification/game-scenarios", tags=["game_sc
 # template_key). TTL — подстраховка на случай пропущенной инвалидации, не
 # основной механизм актуальности.
 ACTIVE_SCENARIO_CACHE_PREFIX = "game_scenario_active"
+# Мягкий/жёсткий TTL (cache.get_or_refresh): после мягкого сценарий
+# перечитывается в фоне, а ученики до жёсткого получают прежний без ожидания
+# БД — в т.ч. в момент, когда ключ истекает под нагрузкой стартов игр.
 ACTIVE_SCENARIO_CACHE_TTL = 300
+ACTIVE_SCENARIO_CACHE_HARD_TTL = 900
+
+
+def _active_scenario_namespace(template_key: str) -> str:
+    # Пространство имён на шаблон: публикация derivfall не сбрасывает кеш
+    # integral_builder.
+    return f"{ACTIVE_SCENARIO_CACHE_PREFIX}:{template_key}"
 
 
 def _active_scenario_cache_key(template_key: str, mode: Optional[str]) -> str:
-    return f"{ACTIVE_SCENARIO_CACHE_PREFIX}:{template_key}:{mode or '_'}"
+    return cache.namespaced_key(_active_scenario_namespace(template_key), mode or "_")
 
 
 def _invalidate_active_scenario_cache(template_key: str) -> None:
-    cache.delete_prefix(f"{ACTIVE_SCENARIO_CACHE_PREFIX}:{template_key}:")
+    cache.bump_namespace(_active_scenario_namespace(template_key))
+
+
+def _active_scenario_version(request) -> str:
+    # Кроме правок, активный сценарий меняет и время (availability_from/to),
+    # поэтому версия — ещё и окно мягкого TTL: ETag устаревает не позже кеша.
+    namespace = _active_scenario_namespace(request.path_params["template_key"])
+    return f"{namespace_version(namespace)}.t{int(time.time()) // ACTIVE_SCENARIO_CACHE_TTL}"
 
 # Создание/редактирование/публикация/архивация сценария — superadmin и
 # content_manager (симметрично CAN_MANAGE_CONTENT в admin.py). Просмотр,
@@ -304,7 +323,10 @@ def archive_scenario(
 
 # --- Студенческие эндпоинты (см. docstring модуля) ---
 
-@student_router.get("/active/{template_key}", response_model=ActiveGameScenarioResponse)
+@student_router.get(
+    "/active/{template_key}", response_model=ActiveGameScenarioResponse,
+    dependencies=[Depends(etag_dependency(_active_scenario_version, principal=get_current_user))],
+)
 def get_active_game_scenario(
         template_key: str,
         mode: Optional[str] = None,
@@ -331,32 +353,40 @@ def get_active_game_scenario(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Неизвестный template_key: {template_key}")
 
     cache_key = _active_scenario_cache_key(template_key, mode)
-    cached = cache.get_json(cache_key)
-    if cached is not None:
-        return cached
-
-    now = datetime.utcnow()
-    scenarios = (
-        db.query(GameScenario)
-        .filter(
-            GameScenario.template_key == template_key,
-            GameScenario.status == "published",
-            (GameScenario.availability_from == None) | (GameScenario.availability_from <= now),
-            (GameScenario.availability_to == None) | (GameScenario.availability_to >= now),
-        )
-        .order_by(GameScenario.published_at.desc())
-        .all()
-    )
-    if mode is not None:
-        scenarios = [s for s in scenarios if s.config.get("mode") == mode]
-
-    if not scenarios:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Для этого шаблона нет доступного опубликованного сценария")
 
-    result = ActiveGameScenarioResponse.model_validate(scenarios[0], from_attributes=True)
-    result_dict = result.model_dump(mode="json")
-    cache.set_json(cache_key, result_dict, ttl=ACTIVE_SCENARIO_CACHE_TTL)
-    return result_dict
+    def compute():
+        now = datetime.utcnow()
+        with independent_session(db) as own_db:
+            scenarios = (
+                own_db.query(GameScenario)
+                .filter(
+                    GameScenario.template_key == template_key,
+                    GameScenario.status == "published",
+                    (GameScenario.availability_from == None) | (GameScenario.availability_from <= now),
+                    (GameScenario.availability_to == None) | (GameScenario.availability_to >= now),
+                )
+                .order_by(GameScenario.published_at.desc())
+                .all()
+            )
+            if mode is not None:
+                scenarios = [s for s in scenarios if s.config.get("mode") == mode]
+
+            if not scenarios:
+                # Фоновый пересчёт (истёк availability_to без правки сценария —
+                # namespace не бампался) только логирует исключение, и прежний
+                # сценарий отдавался бы до жёсткого TTL. Убираем его сами:
+                # следующий запрос пересчитает и получит 404.
+                if cache.get_client().exists(cache_key):
+                    cache.delete(cache_key)
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Для этого шаблона нет доступного опубликованного сценария")
+
+            result = ActiveGameScenarioResponse.model_validate(scenarios[0], from_attributes=True)
+            return result.model_dump(mode="json")
+
+    return cache.get_or_refresh(
+        cache_key, compute,
+        soft_ttl=ACTIVE_SCENARIO_CACHE_TTL, hard_ttl=ACTIVE_SCENARIO_CACHE_HARD_TTL,
+    )
 
 
 def _is_scenario_active(scenario: GameScenario, now: datetime) -> bool:
@@ -388,6 +418,21 @@ def submit_game_attempt(
     if not _is_scenario_active(scenario, datetime.utcnow()):
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Сценарий недоступен для игры")
 
+    if attempt_ingest.is_enabled():
+        is_correct, points = game_attempts.evaluate(body.score, body.max_score)
+        attempt_ingest.enqueue(
+            user_id=current_user.id,
+            content_type="game",
+            content_id=scenario.id,
+            skill_id=scenario.skill_id,
+            is_correct=is_correct,
+            time_spent_ms=body.time_spent_ms,
+            hints_used=0,
+            source="game",
+            points=points,
+        )
+        return GameAttemptSubmissionResponse(is_correct=is_correct)
+
     attempt = game_attempts.record_attempt(
         db, current_user.id, scenario,
         score=body.score, max_score=body.max_score, time_spent_ms=body.time_spent_ms,
@@ -6,33 +6,43 @@
 идёт через POST /gamification/game-scenarios/{id}/submit-attempt -> attempts
 (дашборд + mastery). Здесь — то, чего в той системе нет:
 
-  POST /api/games/events           батч гранулярной телеметрии (Фаза 5)
+  POST /api/games/events           батч гранулярной телеметрии (Фаза 5);
+                                   JSON или NDJSON, опционально gzip
   GET  /api/games/progress         межсессионный прогресс по уровням
   POST /api/games/progress         апсерт лучшего результата на уровне
+  POST /api/games/progress/batch   то же для многих уровней (офлайн-синхронизация)
   GET  /api/games/levels/{game_id} конфиг уровней (Фаза 0 — мок)
 
 Мутирующие эндпоинты автоматически защищены CSRF-middleware в main.py (путь
 не /admin, метод POST, есть auth-cookie) — фронтенд обязан слать их через
 общий api-axios-инстанс с X-CSRF-Token.
 """
+import hashlib
+import json
+from collections import defaultdict
 from datetime import datetime
-from typing import List, Optional
+from functools import lru_cache
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.auth import get_current_user
 from app.database import get_db
-from app.models import GameEvent, GameSession, User, UserGameProgress
+from app.models import GameSession, User, UserGameProgress
+from app.routes._conditional import etag_dependency
 from app.schemas import (
     GameCatalogResponse,
     GameEventsBatchRequest, GameEventsBatchResponse,
     GameLevelConfig, GameLevelsResponse,
-    GameProgressResponse, GameProgressUpsertRequest,
+    GameProgressBatchUpsertRequest, GameProgressResponse, GameProgressUpsertRequest,
     LeaderboardResponse,
 )
 from app.services.game_catalog import get_catalog
-from app.services.leaderboard import compute_leaderboard
+from app.services import game_progress, game_rollups, game_telemetry, leaderboard, response_cache
 
 router = APIRouter(prefix="/api/games", tags=["games"])
 
@@ -59,23 +69,43 @@ _MOCK_LEVELS = {
 }
 
 
-@router.get("/catalog", response_model=GameCatalogResponse)
-def get_games_catalog(current_user: User = Depends(get_current_user)):
+@lru_cache(maxsize=1)
+def _catalog_version() -> str:
+    # Каталог — константа процесса: версия считается один раз, а не на запрос.
+    raw = json.dumps(get_catalog(), sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return f"catalog.{hashlib.sha256(raw).hexdigest()[:16]}"
+
+
+@router.get(
+    "/catalog", response_model=GameCatalogResponse,
+    dependencies=[Depends(etag_dependency(lambda request: _catalog_version(), principal=get_current_user))],
+)
+def get_games_catalog(request: Request, current_user: User = Depends(get_current_user)):
     """Единый каталог всех игр с тегами уровней. Фильтрация по уровню ученика —
-    на фронте (одна выборка + тумблер «показать все»)."""
-    return GameCatalogResponse(entries=get_catalog())
+    на фронте (одна выборка + тумблер «показать все»). Каталог статичен —
+    тело сериализуется и сжимается один раз на процесс (response_cache)."""
+    return response_cache.static_response(
+        request, "games_catalog",
+        lambda: GameCatalogResponse(entries=get_catalog()).model_dump(mode="json"),
+    )
 
 
 @router.get("/leaderboard", response_model=LeaderboardResponse)
 def get_leaderboard(
         game_id: Optional[str] = Query(default=None),
         limit: int = Query(default=20, ge=1, le=100),
+        period: Literal[leaderboard.PERIODS] = Query(default="all"),  # type: ignore[valid-type]
         db: Session = Depends(get_db),
         current_user: User = Depends(get_current_user),
 ):
     """Рейтинг по сумме звёзд. Без game_id — сводный по всем играм; с game_id —
-    по одной игре. Всегда возвращает позицию текущего игрока (me), даже вне топа."""
-    return compute_leaderboard(db, game_id=game_id, limit=limit, current_user_id=current_user.id)
+    по одной игре. period — за всё время или за текущую неделю/месяц/сезон
+    (звёзды, набранные за период). Всегда возвращает позицию текущего игрока
+    (me), даже вне топа. Читается из Redis ZSET'ов (app/services/leaderboard.py),
+    не из SQL."""
+    return leaderboard.get_leaderboard(
+        db, game_id=game_id, limit=limit, current_user_id=current_user.id, period=period,
+    )
 
 
 @router.get("/levels/{game_id}", response_model=GameLevelsResponse)
@@ -89,9 +119,34 @@ def get_game_levels(
     return GameLevelsResponse(game_id=game_id, levels=levels)
 
 
+async def _events_batch_body(request: Request) -> GameEventsBatchRequest:
+    """
+    Тело батча телеметрии: JSON или NDJSON, опционально gzip (см.
+    app/services/game_telemetry.py). Разбирается вручную, а не
+    стандартным body-параметром FastAPI — тот умеет только несжатый JSON.
+    Ошибки схемы — те же 422, что и у обычного body-параметра.
+    """
+    raw = await request.body()
+    try:
+        data = game_telemetry.decode_batch_body(
+            raw,
+            content_type=request.headers.get("content-type", ""),
+            content_encoding=request.headers.get("content-encoding", ""),
+        )
+        return GameEventsBatchRequest.model_validate(data)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _replayed_batch(batch) -> GameEventsBatchResponse:
+    return GameEventsBatchResponse(session_id=batch.session_id, accepted=batch.accepted)
+
+
 @router.post("/events", response_model=GameEventsBatchResponse)
 def post_game_events(
-        body: GameEventsBatchRequest,
+        body: GameEventsBatchRequest = Depends(_events_batch_body),
         db: Session = Depends(get_db),
         current_user: User = Depends(get_current_user),
 ):
@@ -99,12 +154,22 @@ def post_game_events(
     Приём батча телеметрии. Без session_id открывает новую сессию и возвращает
     её id (клиент кладёт его в последующие батчи). Проверяет, что переданная
     сессия принадлежит текущему пользователю и той же игре — иначе нельзя
-    писать события в чужую/другую сессию.
+    писать события в чужую/другую сессию. Повтор батча с уже принятым
+    batch_id возвращает исходный ответ и ничего не пишет.
     """
+    if body.batch_id is not None:
+        already_accepted = game_telemetry.find_batch(db, current_user.id, body.batch_id)
+        if already_accepted:
+            return _replayed_batch(already_accepted)
+
     if body.session_id is not None:
+        # Блокировка строки сессии до commit: два батча одной сессии иначе
+        # оба увидели бы её исход/ended_at «до» и оба посчитали бы
+        # завершение в роллапах (game_rollups.apply_batch).
         session = (
             db.query(GameSession)
             .filter(GameSession.id == body.session_id, GameSession.user_id == current_user.id)
+            .with_for_update()
             .first()
         )
         if session is None:
@@ -116,21 +181,27 @@ def post_game_events(
         db.add(session)
         db.flush()  # нужен session.id для событий ниже
 
-    for ev in body.events:
-        db.add(GameEvent(
-            session_id=session.id,
-            event_type=ev.event_type,
-            payload=ev.payload,
-            client_ts=ev.client_ts,
-        ))
+    if body.batch_id is not None:
+        try:
+            game_telemetry.record_batch(db, current_user.id, body.batch_id, session.id, len(body.events))
+        except IntegrityError:
+            # Тот же батч параллельно принимает другой запрос — он и запишет.
+            db.rollback()
+            return _replayed_batch(game_telemetry.find_batch(db, current_user.id, body.batch_id))
 
     # Закрываем сессию только один раз — повторный end_session по уже
     # закрытой сессии не сдвигает ended_at.
-    if body.end_session and session.ended_at is None:
+    ended_now = body.end_session and session.ended_at is None
+    if ended_now:
         session.ended_at = datetime.utcnow()
 
+    # Роллапы — до вставки событий: исход сессии считается относительно
+    # уже записанных (см. game_rollups.apply_batch).
+    game_rollups.apply_batch(db, session, body.events, new_session=body.session_id is None, ended_now=ended_now)
+    accepted = game_telemetry.insert_events(db, session.id, body.events)
+
     db.commit()
-    return GameEventsBatchResponse(session_id=session.id, accepted=len(body.events))
+    return GameEventsBatchResponse(session_id=session.id, accepted=accepted)
 
 
 @router.get("/progress", response_model=List[GameProgressResponse])
@@ -145,6 +216,12 @@ def get_game_progress(
     return query.all()
 
 
+def _level_result(item: GameProgressUpsertRequest) -> game_progress.LevelResult:
+    return game_progress.LevelResult(
+        game_id=item.game_id, level_id=item.level_id, stars=item.stars, metric=item.metric,
+    )
+
+
 @router.post("/progress", response_model=GameProgressResponse)
 def upsert_game_progress(
         body: GameProgressUpsertRequest,
@@ -154,40 +231,37 @@ def upsert_game_progress(
     """
     Апсерт лучшего результата на уровне. «Лучше» = больше звёзд; при равных
     звёздах — меньше метрика (ходы/итерации). Худший результат не затирает
-    прошлый рекорд.
+    прошлый рекорд. Один атомарный запрос (app/services/game_progress.py) —
+    одновременные завершения уровня не падают на уникальном ключе.
     """
-    row = (
-        db.query(UserGameProgress)
-        .filter(
-            UserGameProgress.user_id == current_user.id,
-            UserGameProgress.game_id == body.game_id,
-            UserGameProgress.level_id == body.level_id,
-        )
-        .first()
+    (outcome,) = game_progress.upsert_best(db, current_user.id, [_level_result(body)])
+    # Ответ — до commit: после него строка истекла бы и перечитывалась.
+    response = GameProgressResponse.model_validate(outcome.row)
+    db.commit()
+    leaderboard.record_progress_or_invalidate(
+        body.game_id, current_user.id, outcome.stars_delta, outcome.levels_delta,
     )
+    return response
 
-    if row is None:
-        row = UserGameProgress(
-            user_id=current_user.id,
-            game_id=body.game_id,
-            level_id=body.level_id,
-            best_stars=body.stars,
-            best_metric=body.metric,
-            completed_at=datetime.utcnow(),
-        )
-        db.add(row)
-    else:
-        better_stars = body.stars > row.best_stars
-        same_stars_better_metric = (
-            body.stars == row.best_stars
-            and body.metric is not None
-            and (row.best_metric is None or body.metric < row.best_metric)
-        )
-        if better_stars or same_stars_better_metric:
-            row.best_stars = body.stars
-            row.best_metric = body.metric
-            row.completed_at = datetime.utcnow()
 
+@router.post("/progress/batch", response_model=List[GameProgressResponse])
+def upsert_game_progress_batch(
+        body: GameProgressBatchUpsertRequest,
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+):
+    """
+    То же для многих уровней сразу (офлайн-синхронизация) — один INSERT на
+    всю пачку. Повторы одного уровня схлопываются в лучший; ответ — по
+    строке на уровень.
+    """
+    outcomes = game_progress.upsert_best(db, current_user.id, [_level_result(item) for item in body.items])
+    response = [GameProgressResponse.model_validate(o.row) for o in outcomes]
+    deltas = defaultdict(lambda: [0, 0])
+    for outcome in outcomes:
+        deltas[outcome.row.game_id][0] += outcome.stars_delta
+        deltas[outcome.row.game_id][1] += outcome.levels_delta
     db.commit()
-    db.refresh(row)
-    return row
+    for game_id, (stars_delta, levels_delta) in deltas.items():
+        leaderboard.record_progress_or_invalidate(game_id, current_user.id, stars_delta, levels_delta)
+    return response
@@ -6,15 +6,18 @@ docs/roadmap/product-technical-plan.md.
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
-import json
 from typing import List
 import jwt
 import os
 
-from app.database import get_db
-from app.models import Admin, AdventureMap, MapLocation, TaskGroup, Task, User, UserProgress
+from app.database import get_db, independent_session
+from app.models import (
+    Admin, AdventureMap, MapLocation, TaskGroup, Task, User, UserAchievement, UserCompletedLocation, UserProgress,
+)
 from app.auth import get_token_from_request, require_role
 from app.schemas import AdventureMapCreate, AdventureMapResponse
+from app.services import cache, progress
+from app.services.content_version import MAP_SKELETON_NAMESPACE
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
@@ -198,6 +201,94 @@ def get_map_by_id(
     return adventure_map
 
 
+# Скелет карты — сама карта, локации, группы и id их заданий — общий для
+# всех учеников и меняется только правками контента, поэтому собирается
+# тремя запросами (а не запросом на каждую локацию и группу) и кешируется на
+# карту. Поколение MAP_SKELETON_NAMESPACE поднимает app/services/content_version.py
+# при коммите любой правки карт/локаций/групп/заданий — в т.ч. из
+# admin_gamification.py; TTL — только подстраховка. Прогресс ученика
+# накладывается поверх скелета в каждом запросе.
+MAP_SKELETON_CACHE_TTL = 600
+MAP_SKELETON_CACHE_HARD_TTL = 3600
+
+
+def _load_map_skeleton(db: Session, map_id: int) -> dict:
+    adventure_map = db.query(AdventureMap).filter(AdventureMap.id == map_id).first()
+    if not adventure_map:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Карта не найдена")
+
+    locations = (
+        db.query(MapLocation)
+        .filter(MapLocation.adventure_map_id == map_id)
+        .order_by(MapLocation.id)
+        .all()
+    )
+    groups_by_location = {location.id: [] for location in locations}
+    for group in (
+            db.query(TaskGroup)
+            .filter(TaskGroup.location_id.in_(list(groups_by_location)))
+            .order_by(TaskGroup.id)
+            .all()
+    ):
+        groups_by_location[group.location_id].append(group)
+
+    task_ids_by_group = {group.id: [] for groups in groups_by_location.values() for group in groups}
+    for task_id, group_id in (
+            db.query(Task.id, Task.task_group_id)
+            .filter(Task.task_group_id.in_(list(task_ids_by_group)))
+            .order_by(Task.id)
+            .all()
+    ):
+        task_ids_by_group[group_id].append(task_id)
+
+    return {
+        "map": {
+            "id": adventure_map.id,
+            "name": adventure_map.name,
+            "description": adventure_map.description,
+            "background_image": adventure_map.background_image,
+            "subject_id": adventure_map.subject_id,
+            "locations": [
+                {
+                    "id": location.id,
+                    "name": location.name,
+                    "description": location.description,
+                    "position_x": location.position_x,
+                    "position_y": location.position_y,
+                    "icon_url": location.icon_url,
+                    "taskGroups": [
+                        {
+                            "id": group.id,
+                            "name": group.name,
+                            "description": group.description,
+                            "difficulty": group.difficulty,
+                            "reward_points": group.reward_points,
+                            "tasks": task_ids_by_group[group.id],
+                        }
+                        for group in groups_by_location[location.id]
+                    ],
+                }
+                for location in locations
+            ],
+        },
+        # Правила разблокировки в ответ не входят — нужны только для
+        # наложения прогресса. Пары, а не словарь: ключи JSON — строки.
+        "unlockedBy": [[location.id, location.unlocked_by_location_id] for location in locations],
+    }
+
+
+def _map_skeleton(db: Session, map_id: int) -> dict:
+    def compute():
+        with independent_session(db) as own_db:
+            return _load_map_skeleton(own_db, map_id)
+
+    return cache.get_or_refresh(
+        cache.namespaced_key(MAP_SKELETON_NAMESPACE, map_id), compute,
+        soft_ttl=MAP_SKELETON_CACHE_TTL, hard_ttl=MAP_SKELETON_CACHE_HARD_TTL,
+    )
+
+
 @router.get("/maps/{map_id}/data")
 def get_map_data(
         map_id: int,
@@ -208,7 +299,6 @@ def get_map_data(
 
     # Check for admin token in Authorization header first
     auth_header = request.headers.get("Authorization")
-    admin_user = None
     user = None
 
     if auth_header and auth_header.startswith("Bearer "):
@@ -220,138 +310,78 @@ def get_map_data(
             role = payload.get("role")
 
             if role == "admin":
-                admin_user = db.query(Admin).filter(Admin.email == email).first()
-                if admin_user:
-                    print(f"✅ Admin access to map data: {admin_user.email} (ID {admin_user.id})", flush=True)
-                    user = admin_user  # Use admin as the authenticated user
-        except Exception as e:
-            print(f"⚠️ Admin token verification failed: {str(e)}", flush=True)
+                # Use admin as the authenticated user
+                user = db.query(Admin).filter(Admin.email == email).first()
+        except jwt.PyJWTError:
             # Continue to cookie check if admin auth fails
+            pass
 
     # If admin authentication failed, try regular user authentication with cookie
     if not user:
+        cookie_token = request.cookies.get("token")
+        if not cookie_token:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Authentication token missing"
+            )
         try:
-            cookie_token = request.cookies.get("token")
-            if not cookie_token:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Authentication token missing"
-                )
-
             payload = jwt.decode(cookie_token, SECRET_KEY, algorithms=[ALGORITHM])
-            user_email = payload.get("sub")
-
-            user = db.query(User).filter(User.email == user_email).first()
-            if not user:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="User not found"
-                )
-
-            print(f"✅ User access to map data: {user.email} (ID {user.id})", flush=True)
-        except (jwt.exceptions.InvalidSignatureError, jwt.exceptions.PyJWTError) as e:
-            print(f"❌ Cookie token verification failed: {str(e)}", flush=True)
+        except jwt.PyJWTError as e:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail=f"Invalid authentication token: {str(e)}"
             )
 
-    # Now that authentication is handled, proceed with the original function logic
-    adventure_map = db.query(AdventureMap).filter(AdventureMap.id == map_id).first()
-    if not adventure_map:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail="Карта не найдена")
+        user = db.query(User).filter(User.email == payload.get("sub")).first()
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found"
+            )
 
-    # Get all locations for this map
-    locations = db.query(MapLocation).filter(MapLocation.adventure_map_id == map_id).all()
+    skeleton = _map_skeleton(db, map_id)
 
     # Get user progress (only if this is a regular user, not an administrator)
-    user_id = getattr(user, 'id', None)
-    user_progress = None
-
+    completed_locations = []
+    unlocked_achievements = []
     if isinstance(user, User):
-        user_progress = db.query(UserProgress).filter(UserProgress.user_id == user.id).first()
-
-        if not user_progress:
-            # Create progress record if it doesn't exist
-            user_progress = UserProgress(
-                user_id=user.id,
-                current_level=1,
-                total_points=0,
-                completed_locations="[]",
-                unlocked_achievements="[]"
-            )
-            db.add(user_progress)
-            db.commit()
-            db.refresh(user_progress)
+        # Create progress record if it doesn't exist
+        user_progress = progress.get_or_create(db, user.id)
+        db.commit()
+
+        # Пройденные локации и достижения — строки таблиц со связью по
+        # (user_id, ...), по индексу, без разбора JSON.
+        completed_locations = [
+            location_id for (location_id,) in
+            db.query(UserCompletedLocation.location_id)
+            .filter(UserCompletedLocation.user_id == user.id)
+            .order_by(UserCompletedLocation.id)
+        ]
+        unlocked_achievements = [
+            achievement_id for (achievement_id,) in
+            db.query(UserAchievement.achievement_id)
+            .filter(UserAchievement.user_id == user.id)
+            .order_by(UserAchievement.id)
+        ]
     else:
         # For administrator create a fake progress object
         user_progress = UserProgress(
             user_id=0,
             current_level=1,
             total_points=0,
-            completed_locations="[]",
-            unlocked_achievements="[]"
         )
 
-    # Convert JSON strings to lists
-    completed_locations = json.loads(user_progress.completed_locations)
-    unlocked_achievements = json.loads(user_progress.unlocked_achievements)
-
-    # Determine unlocked locations (first is always unlocked)
-    unlocked_locations = []
-
-    for location in locations:
-        # Admin sees all locations
-        if isinstance(user, Admin):
-            unlocked_locations.append(location.id)
-        else:
-            # For regular users follow unlocking rules
-            if location.unlocked_by_location_id is None:
-                unlocked_locations.append(location.id)
-            elif location.unlocked_by_location_id in completed_locations:
-                unlocked_locations.append(location.id)
-
-    # Get task groups for each location
-    location_data = []
-    for location in locations:
-        task_groups = db.query(TaskGroup).filter(TaskGroup.location_id == location.id).all()
-
-        # Get tasks for each group
-        task_group_data = []
-        for group in task_groups:
-            tasks = db.query(Task).filter(Task.task_group_id == group.id).all()
-            task_ids = [task.id for task in tasks]
-
-            task_group_data.append({
-                "id": group.id,
-                "name": group.name,
-                "description": group.description,
-                "difficulty": group.difficulty,
-                "reward_points": group.reward_points,
-                "tasks": task_ids
-            })
-
-        location_data.append({
-            "id": location.id,
-            "name": location.name,
-            "description": location.description,
-            "position_x": location.position_x,
-            "position_y": location.position_y,
-            "icon_url": location.icon_url,
-            "taskGroups": task_group_data
-        })
-
-    # Build response
-    response = {
-        "map": {
-            "id": adventure_map.id,
-            "name": adventure_map.name,
-            "description": adventure_map.description,
-            "background_image": adventure_map.background_image,
-            "subject_id": adventure_map.subject_id,
-            "locations": location_data
-        },
+    # Determine unlocked locations (first is always unlocked).
+    # Admin sees all locations; regular users follow unlocking rules.
+    completed = set(completed_locations)
+    unlocked_locations = [
+        location_id
+        for location_id, unlocked_by in skeleton["unlockedBy"]
+        if isinstance(user, Admin) or unlocked_by is None or unlocked_by in completed
+    ]
+
+    return {
+        "map": skeleton["map"],
         "userProgress": {
             "level": user_progress.current_level,
             "totalPoints": user_progress.total_points,
@@ -360,5 +390,3 @@ def get_map_data(
             "unlockedAchievements": unlocked_achievements
         }
     }
-
-    return response
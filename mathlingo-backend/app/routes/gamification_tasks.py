@@ -4,16 +4,23 @@
 (R2 задачи 1, 3) — выделено из gamification.py при разбиении по доменам
 (R4), см. docs/roadmap/product-technical-plan.md.
 """
+from collections import defaultdict
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.database import get_db
-from app.models import Attempt, Diagnostic, Task, TaskGroup, MapLocation, AdventureMap, User, UserProgress
+from app.models import Attempt, Diagnostic, Task, TaskGroup, MapLocation, AdventureMap, User
 from app.auth import get_current_user
-from app.services import content_quality, mastery
+from app.routes._conditional import etag_dependency, namespace_version
+from app.services import attempt_ingest, content_quality, mastery, progress
+from app.services.content_version import TASK_GROUP_DATA_NAMESPACE
 from app.schemas import (
     TaskSubmissionRequest,
     TaskSubmissionResponse,
+    TaskGroupBatchSubmitRequest,
+    TaskGroupBatchSubmitResponse,
+    TaskGroupBatchSubmitResult,
     DiagnosticView,
     DiagnosticSubmitRequest,
     DiagnosticSubmitResponse,
@@ -28,8 +35,18 @@ router = APIRouter(prefix="/gamification", tags=["gamification"])
 # До этого POST /gamification/task-groups/{id}/data и /submit-answer не
 # существовали вообще, хотя фронтенд (TaskSolver.tsx, utils/api.ts) уже их
 # вызывал — весь student-facing флоу решения заданий был мёртв (404).
-
-@router.post("/task-groups/{group_id}/data")
+#
+# data — чтение, но фронт шлёт его POST'ом; GET — тот же ответ с условным
+# запросом (If-None-Match -> 304, см. app/routes/_conditional.py). Версия
+# содержимого — поколение, которое поднимает app/services/content_version.py
+# при любой правке заданий/групп.
+
+@router.api_route(
+    "/task-groups/{group_id}/data", methods=["GET", "POST"],
+    dependencies=[Depends(etag_dependency(
+        lambda request: namespace_version(TASK_GROUP_DATA_NAMESPACE), principal=get_current_user,
+    ))],
+)
 def get_task_group_data(
         group_id: int,
         db: Session = Depends(get_db),
@@ -85,6 +102,42 @@ def _is_answer_correct(task: Task, answer: str) -> bool:
     return answer.strip().lower() == task.correct_answer.strip().lower()
 
 
+def _enqueue_task_attempt(user_id: int, task: Task, item: TaskSubmissionRequest, is_correct: bool, points: int) -> None:
+    attempt_ingest.enqueue(
+        user_id=user_id,
+        content_type="task",
+        content_id=task.id,
+        skill_id=task.skill_id,
+        is_correct=is_correct,
+        time_spent_ms=item.time_spent_ms,
+        hints_used=item.hints_used,
+        source="manual",
+        points=points,
+        estimated_time_seconds=task.estimated_time_seconds,
+    )
+
+
+def _task_attempt(user_id: int, task: Task, item: TaskSubmissionRequest, is_correct: bool) -> Attempt:
+    return Attempt(
+        user_id=user_id,
+        content_type="task",
+        content_id=task.id,
+        skill_id=task.skill_id,
+        is_correct=is_correct,
+        time_spent_ms=item.time_spent_ms,
+        hints_used=item.hints_used,
+        source="manual",
+    )
+
+
+def _submission_response(is_correct: bool, points: int) -> TaskSubmissionResponse:
+    return TaskSubmissionResponse(
+        isCorrect=is_correct,
+        points=points,
+        feedback=None if is_correct else "Попробуйте ещё раз",
+    )
+
+
 @router.post("/submit-answer", response_model=TaskSubmissionResponse)
 def submit_answer(
         body: TaskSubmissionRequest,
@@ -100,48 +153,107 @@ def submit_answer(
     is_correct = _is_answer_correct(task, body.answer)
     points = task.reward_points if is_correct else 0
 
-    db.add(Attempt(
-        user_id=current_user.id,
-        content_type="task",
-        content_id=task.id,
-        skill_id=task.skill_id,
-        is_correct=is_correct,
-        time_spent_ms=body.time_spent_ms,
-        hints_used=body.hints_used,
-        source="manual",
-    ))
+    if attempt_ingest.is_enabled():
+        # Write-behind: попытку, очки, mastery и аномалию запишет воркер
+        # очереди (app/services/attempt_ingest.py) — ученик не ждёт коммитов.
+        _enqueue_task_attempt(current_user.id, task, body, is_correct, points)
+        return _submission_response(is_correct, points)
+
+    attempt = _task_attempt(current_user.id, task, body, is_correct)
+    db.add(attempt)
+    db.flush()
+
+    # Пересчёт mastery — сразу после попытки (R2 task 2), инкрементально по
+    # буферу окна и в той же транзакции, что попытка и очки. No-op, если у
+    # задания нет темы: без skill_id некуда писать состояние.
+    mastery.apply_attempt(db, attempt, task.estimated_time_seconds)
 
     if is_correct:
-        # UserProgress до этого создавался лениво только в get_map_data —
-        # если ученик решает задание, ни разу не открыв карту (например,
-        # прямой deep-link), строки могло не быть, и очки терялись молча.
-        progress = db.query(UserProgress).filter(UserProgress.user_id == current_user.id).first()
-        if not progress:
-            progress = UserProgress(
-                user_id=current_user.id,
-                current_level=1,
-                total_points=0,
-                completed_locations="[]",
-                unlocked_achievements="[]",
-            )
-            db.add(progress)
-        progress.total_points += points
+        progress.add_points(db, current_user.id, points)
 
     db.commit()
 
-    # Пересчёт mastery — синхронно, сразу после попытки (R2 task 2). Только
-    # если у задания вообще есть тема: без skill_id некуда писать состояние.
-    if task.skill_id is not None:
-        mastery.recompute(db, current_user.id, task.skill_id)
-
     # Пост-публикационный мониторинг (R2 task 7): только для опубликованных
     # AI-заданий, no-op для ручного контента и черновиков.
     content_quality.check_for_anomaly(db, task)
 
-    return TaskSubmissionResponse(
-        isCorrect=is_correct,
-        points=points,
-        feedback=None if is_correct else "Попробуйте ещё раз",
+    return _submission_response(is_correct, points)
+
+
+@router.post("/task-groups/{group_id}/submit-batch", response_model=TaskGroupBatchSubmitResponse)
+def submit_task_group_batch(
+        group_id: int,
+        body: TaskGroupBatchSubmitRequest,
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+):
+    """
+    Все ответы прохождения группы одним запросом — вместо submit-answer на
+    каждое задание (коммит + пересчёт mastery + проверка аномалии на каждый
+    ответ). Задания грузятся одним запросом, попытки пишутся одной
+    транзакцией, очки начисляются один раз, mastery пересчитывается по
+    разу на тему. Проверка ответа и результат по каждому заданию — те же,
+    что у submit-answer. Либо принимаются все ответы, либо ни один:
+    задание не из этой группы — 400, неопубликованное — 409.
+    """
+    task_group = db.query(TaskGroup).filter(TaskGroup.id == group_id).first()
+    if not task_group:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Группа заданий не найдена")
+
+    task_ids = {item.task_id for item in body.answers}
+    tasks_by_id = {
+        t.id: t
+        for t in db.query(Task).filter(Task.id.in_(task_ids), Task.task_group_id == group_id).all()
+    }
+    for item in body.answers:
+        task = tasks_by_id.get(item.task_id)
+        if not task:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Задание {item.task_id} не входит в эту группу",
+            )
+        if task.status != "published":
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Задание недоступно для решения")
+
+    results = []
+    attempts = []
+    total_points = 0
+    for item in body.answers:
+        task = tasks_by_id[item.task_id]
+        is_correct = _is_answer_correct(task, item.answer)
+        points = task.reward_points if is_correct else 0
+        total_points += points
+        results.append(TaskGroupBatchSubmitResult(task_id=task.id, **_submission_response(is_correct, points).model_dump()))
+
+        if attempt_ingest.is_enabled():
+            _enqueue_task_attempt(current_user.id, task, item, is_correct, points)
+        else:
+            attempts.append((_task_attempt(current_user.id, task, item, is_correct), task.estimated_time_seconds))
+
+    if attempts:
+        db.add_all([a for a, _ in attempts])
+        db.flush()
+
+        by_skill = defaultdict(list)
+        for attempt, estimated in attempts:
+            if attempt.skill_id is not None:
+                by_skill[attempt.skill_id].append((attempt, estimated))
+        for skill_attempts in by_skill.values():
+            mastery.apply_attempts(db, skill_attempts)
+
+        if total_points:
+            progress.add_points(db, current_user.id, total_points)
+
+        db.commit()
+
+        # По разу на задание, а не на ответ (check_for_anomaly коммитит сам).
+        for task in tasks_by_id.values():
+            content_quality.check_for_anomaly(db, task)
+
+    return TaskGroupBatchSubmitResponse(
+        results=results,
+        correct_count=sum(1 for r in results if r.isCorrect),
+        total_points=total_points,
     )
 
 
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from app.database import get_db
+from app.database import get_db, independent_session
 from app.models import Admin, Skill, Subject
 from app.schemas import SkillCreate, SkillResponse, SkillUpdate
 from app.auth import get_admin_current_user, require_role
-from app.services import cache
+from app.routes._conditional import etag_dependency, namespace_version
+from app.services import cache, response_cache
 
 router = APIRouter(prefix="/admin/skills", tags=["skills"])
 
@@ -16,30 +17,40 @@ router = APIRouter(prefix="/admin/skills", tags=["skills"])
 # docs/roadmap/product-technical-plan.md (R1, §5).
 CAN_MANAGE = require_role("superadmin", "content_manager")
 
+# Пространство имён ключей списка (cache.namespaced_key); мутации ниже
+# инвалидируют его через cache.bump_namespace.
 SKILLS_LIST_CACHE_PREFIX = "skills_list"
+# Мягкий/жёсткий TTL — см. cache.get_or_refresh.
 SKILLS_LIST_CACHE_TTL = 120
+SKILLS_LIST_CACHE_HARD_TTL = 600
 
 
-@router.get("/", response_model=List[SkillResponse])
+@router.get(
+    "/", response_model=List[SkillResponse],
+    dependencies=[Depends(etag_dependency(
+        lambda request: namespace_version(SKILLS_LIST_CACHE_PREFIX), principal=get_admin_current_user,
+    ))],
+)
 def get_skills(
+    request: Request,
     subject_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
     current_admin: Admin = Depends(get_admin_current_user),
 ):
-    cache_key = f"{SKILLS_LIST_CACHE_PREFIX}:{subject_id}:{skip}:{limit}"
-    cached = cache.get_json(cache_key)
-    if cached is not None:
-        return cached
+    def compute():
+        with independent_session(db) as own_db:
+            query = own_db.query(Skill)
+            if subject_id is not None:
+                query = query.filter(Skill.subject_id == subject_id)
+            skills = query.order_by(Skill.order, Skill.id).offset(skip).limit(limit).all()
+            return [SkillResponse.model_validate(s, from_attributes=True).model_dump(mode="json") for s in skills]
 
-    query = db.query(Skill)
-    if subject_id is not None:
-        query = query.filter(Skill.subject_id == subject_id)
-    skills = query.order_by(Skill.order, Skill.id).offset(skip).limit(limit).all()
-    result = [SkillResponse.model_validate(s, from_attributes=True).model_dump(mode="json") for s in skills]
-    cache.set_json(cache_key, result, ttl=SKILLS_LIST_CACHE_TTL)
-    return result
+    return response_cache.cached_response(
+        request, cache.namespaced_key(SKILLS_LIST_CACHE_PREFIX, subject_id, skip, limit), compute,
+        soft_ttl=SKILLS_LIST_CACHE_TTL, hard_ttl=SKILLS_LIST_CACHE_HARD_TTL,
+    )
 
 
 @router.get("/{skill_id}", response_model=SkillResponse)
@@ -77,7 +88,7 @@ def create_skill(
     db.add(db_skill)
     db.commit()
     db.refresh(db_skill)
-    cache.delete_prefix(f"{SKILLS_LIST_CACHE_PREFIX}:")
+    cache.bump_namespace(SKILLS_LIST_CACHE_PREFIX)
     return db_skill
 
 
@@ -109,5 +120,5 @@ def update_skill(
 
     db.commit()
     db.refresh(db_skill)
-    cache.delete_prefix(f"{SKILLS_LIST_CACHE_PREFIX}:")
+    cache.bump_namespace(SKILLS_LIST_CACHE_PREFIX)
     return db_skill
@@ -1,35 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import List
 
-from app.database import get_db
+from app.database import get_db, independent_session
 from app.models import Subject
 from app.schemas import SubjectResponse
 from app.auth import get_current_user
-from app.services import cache
+from app.routes._conditional import etag_dependency, namespace_version
+from app.services import cache, response_cache
 
 router = APIRouter(tags=["subjects"])
 
+# Пространство имён ключей списка (cache.namespaced_key) — правки разделов
+# в admin.py инвалидируют его через cache.bump_namespace.
 SUBJECTS_LIST_CACHE_PREFIX = "subjects_list"
+# Мягкий TTL — через сколько список пересчитывается в фоне; жёсткий — сколько
+# устаревший список ещё можно отдавать (см. cache.get_or_refresh).
 SUBJECTS_LIST_CACHE_TTL = 120
+SUBJECTS_LIST_CACHE_HARD_TTL = 600
 
 
-@router.get("/", response_model=List[SubjectResponse])
+@router.get(
+    "/", response_model=List[SubjectResponse],
+    dependencies=[Depends(etag_dependency(lambda request: namespace_version(SUBJECTS_LIST_CACHE_PREFIX)))],
+)
 def get_subjects(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db)
 ):
     """Получить список всех активных разделов математики"""
-    cache_key = f"{SUBJECTS_LIST_CACHE_PREFIX}:{skip}:{limit}"
-    cached = cache.get_json(cache_key)
-    if cached is not None:
-        return cached
+    def compute():
+        with independent_session(db) as own_db:
+            subjects = own_db.query(Subject).filter(Subject.is_active == True).offset(skip).limit(limit).all()
+            return [SubjectResponse.model_validate(s, from_attributes=True).model_dump(mode="json") for s in subjects]
 
-    subjects = db.query(Subject).filter(Subject.is_active == True).offset(skip).limit(limit).all()
-    result = [SubjectResponse.model_validate(s, from_attributes=True).model_dump(mode="json") for s in subjects]
-    cache.set_json(cache_key, result, ttl=SUBJECTS_LIST_CACHE_TTL)
-    return result
+    return response_cache.cached_response(
+        request, cache.namespaced_key(SUBJECTS_LIST_CACHE_PREFIX, skip, limit), compute,
+        soft_ttl=SUBJECTS_LIST_CACHE_TTL, hard_ttl=SUBJECTS_LIST_CACHE_HARD_TTL,
+    )
 
 @router.get("/{subject_id}", response_model=SubjectResponse)
 def get_subject(
@@ -567,15 +567,26 @@ class DashboardAdminAction(BaseModel):
 
 
 class DashboardOverviewResponse(BaseModel):
-    activity: DashboardActivitySummary
-    skill_progress: List[DashboardSkillProgress]
-    game_completion: List[DashboardGameCompletion]
-    ai_quality: DashboardAiQuality
-    review_queue: DashboardReviewQueue
-    publish_errors: Dict[str, int]
+    # Любой раздел может быть None, если не уложился в таймаут — тогда его
+    # имя есть в degraded (см. app/services/dashboard.py: get_overview).
+    activity: Optional[DashboardActivitySummary] = None
+    skill_progress: Optional[List[DashboardSkillProgress]] = None
+    game_completion: Optional[List[DashboardGameCompletion]] = None
+    ai_quality: Optional[DashboardAiQuality] = None
+    review_queue: Optional[DashboardReviewQueue] = None
+    publish_errors: Optional[Dict[str, int]] = None
     # None (а не []) для teacher — см. R3 §5: "частично, без раздела
     # действий администраторов".
     admin_actions: Optional[List[DashboardAdminAction]] = None
+    degraded: List[str] = []
+    section_timings_ms: Dict[str, float] = {}
+
+
+# Счётчики процесса, отвечающего на запрос (у каждого воркера uvicorn свои):
+# пул соединений БД (app/database.py: pool_stats) и уровни кеша (cache.stats).
+class RuntimeStatsResponse(BaseModel):
+    db_pool: Dict[str, float]
+    cache: Dict[str, int]
 
 
 # Student-facing: то же самое, что задание в task-groups/data — без
@@ -759,8 +770,6 @@ class UserProgressBase(BaseModel):
     user_id: int
     current_level: Optional[int] = 1
     total_points: Optional[int] = 0
-    completed_locations: Optional[str] = "[]"
-    unlocked_achievements: Optional[str] = "[]"
 
 
 class UserProgressCreate(UserProgressBase):
@@ -788,6 +797,25 @@ class TaskSubmissionResponse(BaseModel):
     feedback: Optional[str] = None
 
 
+# Потолок ответов в одном батч-сабмите группы — группа заданий на карте
+# небольшая, но запрос не должен превращаться в неограниченную вставку.
+MAX_ANSWERS_PER_BATCH = 100
+
+
+class TaskGroupBatchSubmitRequest(BaseModel):
+    answers: List[TaskSubmissionRequest] = Field(min_length=1, max_length=MAX_ANSWERS_PER_BATCH)
+
+
+class TaskGroupBatchSubmitResult(TaskSubmissionResponse):
+    task_id: int
+
+
+class TaskGroupBatchSubmitResponse(BaseModel):
+    results: List[TaskGroupBatchSubmitResult]
+    correct_count: int
+    total_points: int
+
+
 # ---------------------------------------------------------------------------
 # Мини-игры: телеметрия, прогресс, конфиг уровней.
 # game_id ограничен известными играми на уровне схемы — неизвестная игра
@@ -817,6 +845,9 @@ class GameEventsBatchRequest(BaseModel):
     session_id: Optional[int] = None
     events: List[GameEventIn] = Field(min_length=1, max_length=MAX_EVENTS_PER_BATCH)
     end_session: bool = False
+    # Ключ идемпотентности от клиента (например, uuid батча в офлайн-очереди):
+    # повтор с тем же batch_id не пишет события второй раз.
+    batch_id: Optional[str] = Field(default=None, min_length=1, max_length=64)
 
 
 class GameEventsBatchResponse(BaseModel):
@@ -833,6 +864,11 @@ class GameProgressUpsertRequest(BaseModel):
     metric: Optional[int] = Field(default=None, ge=0)
 
 
+class GameProgressBatchUpsertRequest(BaseModel):
+    # Офлайн-синхронизация: всё, что накопилось без сети, одним запросом.
+    items: List[GameProgressUpsertRequest] = Field(min_length=1, max_length=500)
+
+
 class GameProgressResponse(BaseModel):
     game_id: str
     level_id: str
@@ -992,6 +1028,7 @@ class LeaderboardEntry(BaseModel):
 
 class LeaderboardResponse(BaseModel):
     game_id: Optional[str] = None   # None = сводный рейтинг по всем играм
+    period: str = "all"             # all | week | month | season, см. app/services/leaderboard.py
     entries: List[LeaderboardEntry]
     me: Optional[LeaderboardEntry] = None  # позиция текущего игрока (может быть вне топа)
 
@@ -0,0 +1,272 @@
+"""
+Write-behind очередь попыток (ATTEMPT_INGEST_MODE=stream, см. app/config.py).
+
+В синхронном режиме submit-answer и игровой submit-attempt в самом запросе
+пишут Attempt, начисляют очки, пересчитывают mastery и проверяют аномалию —
+несколько коммитов до того, как ученик увидит "верно". В режиме stream
+запрос только решает правильность (это всё равно нужно для ответа) и кладёт
+готовую попытку в Redis stream; воркер (python -m app.services.attempt_ingest)
+вычитывает stream пачками через consumer group и пишет пачку одной
+транзакцией: попытки — одним INSERT'ом, очки — одним обновлением на
+ученика, mastery — одним read-modify-write на (user, skill), аномалии — по
+разу на задание.
+
+Доставка at-least-once: XACK только после commit, а повторно прочитанная
+после падения запись отсекается по уникальному attempts.ingest_id (id записи
+stream), так что очки не начисляются дважды.
+
+Ядовитые записи (битый JSON, FK на удалённого ученика/задание) не должны
+останавливать очередь: упавшая пачка откатывается и переигрывается по
+одной записи, хорошие подтверждаются, плохие остаются в pending и
+перечитываются. После MAX_DELIVERIES доставок (счётчик XPENDING) запись
+уходит в DEAD_LETTER_KEY с текстом ошибки и подтверждается; битый JSON —
+сразу, повтор его не исправит. Любая другая ошибка цикла (Redis, БД)
+логируется, воркер живёт дальше.
+"""
+import json
+import os
+import socket
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+
+import redis
+from sqlalchemy.orm import Session
+
+from app import config
+from app.models import Attempt, Task
+from app.services import cache, content_quality, mastery, progress
+
+STREAM_KEY = "attempts:ingest"
+GROUP = "attempt-ingest"
+DEAD_LETTER_KEY = "attempts:ingest:dead"
+
+# Сколько раз запись может прийти воркеру и упасть, прежде чем уйти в
+# dead-letter; и пауза цикла после ошибки, чтобы не крутиться вхолостую,
+# пока лежит Redis или БД.
+MAX_DELIVERIES = 5
+ERROR_BACKOFF_SECONDS = 1.0
+
+# Размер пачки воркера и сколько ждать новых записей в XREADGROUP BLOCK.
+BATCH_SIZE = 500
+BLOCK_MS = 5000
+
+
+def is_enabled() -> bool:
+    return config.ATTEMPT_INGEST_MODE == "stream"
+
+
+def enqueue(
+        *,
+        user_id: int,
+        content_type: str,
+        content_id: int,
+        skill_id: Optional[int],
+        is_correct: bool,
+        time_spent_ms: Optional[int],
+        hints_used: int,
+        source: str,
+        points: int,
+        estimated_time_seconds: Optional[int] = None,
+) -> str:
+    """
+    Кладёт уже проверенную попытку в stream, возвращает id записи.
+    created_at фиксируется здесь, в момент ответа ученика, а не при вставке
+    воркером — иначе порядок попыток в окне mastery зависел бы от очереди.
+    """
+    payload = {
+        "user_id": user_id,
+        "content_type": content_type,
+        "content_id": content_id,
+        "skill_id": skill_id,
+        "is_correct": is_correct,
+        "time_spent_ms": time_spent_ms,
+        "hints_used": hints_used,
+        "source": source,
+        "points": points,
+        "estimated_time_seconds": estimated_time_seconds,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+    return cache.get_client().xadd(STREAM_KEY, {"data": json.dumps(payload)})
+
+
+def ingest_batch(db: Session, entries: list[tuple[str, dict]]) -> int:
+    """
+    Пишет пачку [(stream_id, payload), ...] в БД, возвращает число реально
+    записанных попыток (без уже записанных ранее ingest_id).
+    """
+    stream_ids = [stream_id for stream_id, _ in entries]
+    already_ingested = {
+        row.ingest_id
+        for row in db.query(Attempt.ingest_id).filter(Attempt.ingest_id.in_(stream_ids))
+    }
+    fresh = [(stream_id, p) for stream_id, p in entries if stream_id not in already_ingested]
+    if not fresh:
+        return 0
+
+    attempts = [
+        (
+            Attempt(
+                user_id=p["user_id"],
+                content_type=p["content_type"],
+                content_id=p["content_id"],
+                skill_id=p["skill_id"],
+                is_correct=p["is_correct"],
+                time_spent_ms=p["time_spent_ms"],
+                hints_used=p["hints_used"],
+                source=p["source"],
+                created_at=datetime.fromisoformat(p["created_at"]),
+                ingest_id=stream_id,
+            ),
+            p,
+        )
+        for stream_id, p in fresh
+    ]
+    db.add_all([a for a, _ in attempts])
+    db.flush()
+
+    points_by_user: dict[int, int] = defaultdict(int)
+    by_user_skill: dict[tuple[int, int], list] = defaultdict(list)
+    task_ids = set()
+    for attempt, p in attempts:
+        points_by_user[attempt.user_id] += p["points"]
+        if attempt.skill_id is not None:
+            by_user_skill[(attempt.user_id, attempt.skill_id)].append((attempt, p["estimated_time_seconds"]))
+        if attempt.content_type == "task":
+            task_ids.add(attempt.content_id)
+
+    for user_id, points in points_by_user.items():
+        if points:
+            progress.add_points(db, user_id, points)
+    for items in by_user_skill.values():
+        mastery.apply_attempts(db, items)
+
+    db.commit()
+
+    # check_for_anomaly коммитит сам (как и в синхронном submit_answer) —
+    # после основной транзакции и по разу на задание, а не на попытку.
+    if task_ids:
+        for task in db.query(Task).filter(Task.id.in_(task_ids)).all():
+            content_quality.check_for_anomaly(db, task)
+
+    return len(fresh)
+
+
+def _ensure_group(client: redis.Redis) -> None:
+    try:
+        client.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _read(client: redis.Redis, consumer: str, stream_id: str, count: int, block_ms: Optional[int]) -> list:
+    response = client.xreadgroup(GROUP, consumer, {STREAM_KEY: stream_id}, count=count, block=block_ms)
+    if not response:
+        return []
+    # Записи, удалённые из stream (XDEL/MAXLEN), приходят из pending с
+    # пустыми полями: обработать их нечем, а без XACK они висели бы в PEL
+    # группы и перечитывались каждым проходом "0" — подтверждаем сразу.
+    entries = response[0][1]
+    _ack(client, [entry_id for entry_id, fields in entries if not fields])
+    return [(entry_id, fields) for entry_id, fields in entries if fields]
+
+
+def _ack(client: redis.Redis, entry_ids: list) -> None:
+    if entry_ids:
+        client.xack(STREAM_KEY, GROUP, *entry_ids)
+        # Подтверждённые записи больше не нужны — stream не растёт бесконечно.
+        client.xdel(STREAM_KEY, *entry_ids)
+
+
+def _dead_letter(client: redis.Redis, entry_id: str, fields: dict, error: str) -> None:
+    client.xadd(DEAD_LETTER_KEY, {"data": fields.get("data", ""), "entry_id": entry_id, "error": error})
+    _ack(client, [entry_id])
+    print(f"attempt_ingest: entry {entry_id} moved to {DEAD_LETTER_KEY}: {error}", flush=True)
+
+
+def _deliveries(client: redis.Redis, entry_ids: list) -> dict:
+    pending = client.xpending_range(
+        STREAM_KEY, GROUP, min=min(entry_ids), max=max(entry_ids), count=len(entry_ids) * 2,
+    )
+    return {p["message_id"]: p["times_delivered"] for p in pending}
+
+
+def drain_once(db: Session, consumer: str, count: int = BATCH_SIZE, block_ms: Optional[int] = None) -> int:
+    """
+    Обрабатывает одну пачку, возвращает число прочитанных записей. Сначала —
+    свои pending (прочитаны, но не подтверждены: воркер упал между commit и
+    XACK или запись уже падала), затем новые.
+    """
+    client = cache.get_client()
+    _ensure_group(client)
+
+    entries = _read(client, consumer, "0", count, None)
+    if not entries:
+        entries = _read(client, consumer, ">", count, block_ms)
+    if not entries:
+        return 0
+
+    parsed = []
+    for entry_id, fields in entries:
+        try:
+            parsed.append((entry_id, json.loads(fields["data"])))
+        except (KeyError, TypeError, ValueError) as e:
+            _dead_letter(client, entry_id, fields, f"bad payload: {e!r}")
+
+    try:
+        ingest_batch(db, parsed)
+    except Exception as e:
+        db.rollback()
+        print(f"attempt_ingest: batch of {len(parsed)} failed ({e!r}), retrying one by one", flush=True)
+    else:
+        _ack(client, [entry_id for entry_id, _ in parsed])
+        return len(entries)
+
+    fields_by_id = dict(entries)
+    failed = {}
+    for entry_id, payload in parsed:
+        try:
+            ingest_batch(db, [(entry_id, payload)])
+        except Exception as e:
+            db.rollback()
+            failed[entry_id] = repr(e)
+        else:
+            _ack(client, [entry_id])
+    if failed:
+        deliveries = _deliveries(client, list(failed))
+        for entry_id, error in failed.items():
+            if deliveries.get(entry_id, 0) >= MAX_DELIVERIES:
+                _dead_letter(client, entry_id, fields_by_id[entry_id], error)
+            else:
+                print(f"attempt_ingest: entry {entry_id} failed, will retry: {error}", flush=True)
+    return len(entries)
+
+
+def run_worker(consumer: Optional[str] = None) -> None:
+    """
+    Бесконечный цикл воркера. Имя consumer'а стабильное (по умолчанию —
+    hostname): после рестарта воркер подхватит свои же pending-записи.
+    """
+    from app.database import SessionLocal
+
+    consumer = consumer or os.getenv("ATTEMPT_INGEST_CONSUMER") or socket.gethostname()
+    print(f"attempt_ingest: consumer={consumer} stream={STREAM_KEY}", flush=True)
+    while True:
+        db = SessionLocal()
+        try:
+            processed = drain_once(db, consumer, block_ms=BLOCK_MS)
+        except Exception as e:
+            db.rollback()
+            print(f"attempt_ingest: drain failed: {e!r}", flush=True)
+            time.sleep(ERROR_BACKOFF_SECONDS)
+            continue
+        finally:
+            db.close()
+        if processed:
+            print(f"attempt_ingest: {processed} attempts", flush=True)
+
+
+if __name__ == "__main__":
+    run_worker()
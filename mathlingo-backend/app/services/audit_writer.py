@@ -0,0 +1,196 @@
+"""
+Запись audit_log для AuditLogMiddleware (main.py).
+
+В режиме sync (config.AUDIT_LOG_MODE) событие пишется сразу, в конце
+запроса: своя сессия, повторное определение админа по токену, commit — на
+каждую мутацию. В режиме buffered запрос только кладёт событие в буфер
+процесса, а фоновый поток пишет буфер пачками: одна сессия и один commit на
+пачку, админ по одному токену определяется в пачке один раз.
+
+Ни одно событие не теряется: переполненный буфер пишется в самом запросе
+(config.AUDIT_QUEUE_FULL_POLICY), неудачная пачка возвращается в начало
+буфера и повторяется на следующем сбросе, остаток сбрасывается в
+shutdown() из lifespan приложения. Если и там БД недоступна — события
+печатаются в лог построчно JSON'ом, а не исчезают молча.
+
+Актор определяется при записи, а не в момент запроса: в buffered это
+задержка до одного сброса, и токен, отозванный за это время, даст
+actor_admin_id = NULL.
+"""
+import json
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Callable, Optional
+
+from starlette.requests import Request
+
+from app import config
+from app.auth import get_admin_current_user_optional
+from app.models import AuditLog
+
+
+@dataclass
+class AuditEvent:
+    method: str
+    path: str
+    status_code: int
+    entity_type: Optional[str]
+    entity_id: Optional[str]
+    action: Optional[str]
+    # Заголовки запроса (токен — из Authorization или куки) для определения
+    # актора при записи.
+    headers: list = field(repr=False)
+    # get_db или его подмена из app.dependency_overrides на момент запроса.
+    db_dependency: Callable = field(repr=False)
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+
+_pending: deque = deque()
+_pending_lock = threading.Lock()
+# Одна пачка пишется за раз: фоновый поток, flush() и запрос с
+# переполненным буфером не пишут параллельно.
+_write_lock = threading.Lock()
+_wake = threading.Event()
+_stop = threading.Event()
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+
+def submit(event: AuditEvent) -> None:
+    if config.AUDIT_LOG_MODE != "buffered":
+        write_events([event])
+        return
+
+    _ensure_worker()
+    with _pending_lock:
+        accepted = len(_pending) < config.AUDIT_QUEUE_MAX_SIZE
+        if accepted:
+            _pending.append(event)
+            size = len(_pending)
+    if accepted:
+        if size >= config.AUDIT_FLUSH_BATCH_SIZE:
+            _wake.set()
+        return
+
+    if config.AUDIT_QUEUE_FULL_POLICY == "flush":
+        with _pending_lock:
+            _pending.append(event)
+        flush()
+    else:
+        write_events([event])
+
+
+def write_events(events: list[AuditEvent]) -> None:
+    """Пишет события одной транзакцией; исключение — ничего не записано."""
+    by_dependency: dict = {}
+    for event in events:
+        by_dependency.setdefault(event.db_dependency, []).append(event)
+
+    for db_dependency, group in by_dependency.items():
+        # Уважаем app.dependency_overrides[get_db], чтобы в тестах запись шла
+        # в ту же (тестовую) БД, что и остальное приложение, — мидлварь не
+        # проходит через DI и иначе взяла бы реальный get_db в обход подмены.
+        db_gen = db_dependency()
+        db = next(db_gen)
+        try:
+            actors = {}
+            rows = []
+            for event in group:
+                request = Request({"type": "http", "method": event.method, "path": event.path, "headers": event.headers})
+                token_key = request.headers.get("authorization"), request.cookies.get("token")
+                if token_key not in actors:
+                    actors[token_key] = get_admin_current_user_optional(request, db)
+                actor = actors[token_key]
+                rows.append(AuditLog(
+                    actor_admin_id=actor.id if actor else None,
+                    actor_role=actor.role if actor else None,
+                    method=event.method,
+                    path=event.path,
+                    entity_type=event.entity_type,
+                    entity_id=event.entity_id,
+                    action=event.action,
+                    status_code=event.status_code,
+                    created_at=event.created_at,
+                ))
+            db.add_all(rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            try:
+                next(db_gen)
+            except StopIteration:
+                pass
+
+
+def flush() -> int:
+    """
+    Пишет весь буфер пачками по AUDIT_FLUSH_BATCH_SIZE, возвращает число
+    записанных событий. Пачка, которую записать не удалось, возвращается в
+    начало буфера, исключение пробрасывается.
+    """
+    written = 0
+    with _write_lock:
+        while True:
+            with _pending_lock:
+                batch = [_pending.popleft() for _ in range(min(len(_pending), config.AUDIT_FLUSH_BATCH_SIZE))]
+            if not batch:
+                return written
+            try:
+                write_events(batch)
+            except Exception:
+                with _pending_lock:
+                    _pending.extendleft(reversed(batch))
+                raise
+            written += len(batch)
+
+
+def pending_count() -> int:
+    with _pending_lock:
+        return len(_pending)
+
+
+def _run() -> None:
+    while not _stop.is_set():
+        _wake.wait(config.AUDIT_FLUSH_INTERVAL_SECONDS)
+        _wake.clear()
+        try:
+            flush()
+        except Exception as e:
+            # Пачка осталась в буфере — повторим на следующем сбросе.
+            print(f"audit_writer: flush failed, {pending_count()} events pending: {e!r}", flush=True)
+
+
+def _ensure_worker() -> None:
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _stop.clear()
+            _worker = threading.Thread(target=_run, name="audit-writer", daemon=True)
+            _worker.start()
+
+
+def shutdown() -> None:
+    """Останавливает фоновый поток и дописывает буфер (lifespan приложения)."""
+    global _worker
+    with _worker_lock:
+        worker, _worker = _worker, None
+    if worker is not None:
+        _stop.set()
+        _wake.set()
+        worker.join()
+    try:
+        flush()
+    except Exception as e:
+        with _pending_lock:
+            lost = list(_pending)
+            _pending.clear()
+        print(f"audit_writer: final flush failed, dumping {len(lost)} events: {e!r}", flush=True)
+        for event in lost:
+            record = asdict(event)
+            del record["headers"], record["db_dependency"]
+            record["created_at"] = event.created_at.isoformat()
+            print(f"audit_writer: unwritten {json.dumps(record)}", flush=True)
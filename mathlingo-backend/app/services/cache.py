@@ -8,12 +8,30 @@ get_client() лениво создаёт клиент и кэширует его
 tests/conftest.py подменяет _client на fakeredis перед каждым тестом
 (параллельно тому, как get_db подменяется на тестовую SQLite-сессию) —
 это позволяет тестам не зависеть от реального Redis.
+
+get_or_refresh — кеш с мягким и жёстким TTL (stale-while-revalidate) и
+single-flight пересчётом: по истечении мягкого TTL значение продолжает
+отдаваться, а пересчитывает его в фоне ровно один держатель Redis-лока,
+вместо того чтобы все одновременные запросы разом пошли в БД (dogpile).
+
+get_json/set_json — двухуровневые: локальный LRU в процессе перед Redis,
+межпроцессная инвалидация через pub/sub (см. _LocalTier). Так же устроены
+get_fields/set_fields — хеш из полей-байтов без JSON (готовые сжатые тела
+ответов, app/services/response_cache.py).
 """
 import json
 import os
-from typing import Any, Optional
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
 
 import redis
+from redis.client import NEVER_DECODE
+
+from app import config
 
 _client: Optional[redis.Redis] = None
 
@@ -26,23 +44,405 @@ def get_client() -> redis.Redis:
     return _client
 
 
+# --- локальный (in-process) уровень ---
+#
+# Перед Redis — ограниченный LRU с TTL в памяти каждого воркера uvicorn:
+# попадание не стоит ни похода в Redis, ни json.loads. Каждая запись через
+# этот модуль (set_json/delete/bump_namespace) публикует ключ в
+# INVALIDATION_CHANNEL, и остальные воркеры выбрасывают свою копию.
+# Pub/sub без гарантии доставки (переподключение, отставший подписчик),
+# поэтому локальная копия живёт не дольше LOCAL_CACHE_TTL_SECONDS — это
+# потолок устаревания при потерянном сообщении.
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+# Отличает свои сообщения от чужих: свою копию писатель обновляет сам.
+_ORIGIN = secrets.token_hex(8)
+
+
+class _LocalTier:
+    """
+    LRU по размеру: вес записи — длина её JSON (приближение, Python-объекты
+    в памяти крупнее) или сумма длин полей для get_fields. Значения
+    отдаются как есть, без копии — вызывающие не должны их мутировать.
+    """
+
+    def __init__(self, client: redis.Redis, max_bytes: int, ttl: float):
+        self.client = client
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()  # key -> (value, size, expires_at)
+        self.size = 0
+        # Счётчик принятых инвалидаций: значение, прочитанное из Redis до
+        # инвалидации, могло устареть, и класть его локально уже нельзя.
+        self.epoch = 0
+        self.stats = {"local_hits": 0, "local_misses": 0, "redis_hits": 0, "redis_misses": 0}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        # Подписка — синхронно, до первой записи в локальный уровень: иначе
+        # инвалидации до старта потока терялись бы.
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(INVALIDATION_CHANNEL)
+        threading.Thread(target=self._listen, name="cache-invalidation", daemon=True).start()
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.stats["local_hits"] += 1
+                return True, entry[0]
+            if entry is not None:
+                self._drop(key)
+            self.stats["local_misses"] += 1
+            return False, None
+
+    def put(self, key: str, value: Any, size: int, epoch: Optional[int] = None) -> None:
+        with self.lock:
+            if epoch is not None and epoch != self.epoch:
+                return
+            self._drop(key)
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, size, time.monotonic() + self.ttl)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+
+    def evict(self, key: str) -> None:
+        with self.lock:
+            self.epoch += 1
+            self._drop(key)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.epoch += 1
+            self.entries.clear()
+            self.size = 0
+
+    def _drop(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def _listen(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                message = self.pubsub.get_message(timeout=1.0)
+            except redis.RedisError:
+                # Пока подписки нет, инвалидации теряются — всё локальное
+                # под подозрением.
+                self.clear()
+                time.sleep(1.0)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            origin, _, key = message["data"].partition(" ")
+            if origin != _ORIGIN:
+                self.evict(key)
+        self.pubsub.close()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+
+_local: Optional[_LocalTier] = None
+_local_lock = threading.Lock()
+
+
+def _local_tier() -> Optional[_LocalTier]:
+    global _local
+    if not config.LOCAL_CACHE_ENABLED:
+        return None
+    client = get_client()
+    with _local_lock:
+        # Клиент сменился (тесты подменяют _client на свежий fakeredis) —
+        # локальные копии и подписка относятся к старому.
+        if _local is None or _local.client is not client:
+            if _local is not None:
+                _local.stop()
+            _local = _LocalTier(client, config.LOCAL_CACHE_MAX_BYTES, config.LOCAL_CACHE_TTL_SECONDS)
+        return _local
+
+
+def stats() -> dict:
+    """Попадания/промахи по уровням и заполненность локального уровня."""
+    tier = _local_tier()
+    if tier is None:
+        return {}
+    with tier.lock:
+        return {**tier.stats, "local_entries": len(tier.entries), "local_bytes": tier.size}
+
+
+def _publish_invalidation(pipe, key: str) -> None:
+    pipe.publish(INVALIDATION_CHANNEL, f"{_ORIGIN} {key}")
+
+
 def get_json(key: str) -> Optional[Any]:
+    tier = _local_tier()
+    if tier is None:
+        raw = get_client().get(key)
+        return json.loads(raw) if raw is not None else None
+
+    found, value = tier.get(key)
+    if found:
+        return value
+    epoch = tier.epoch
     raw = get_client().get(key)
+    with tier.lock:
+        tier.stats["redis_misses" if raw is None else "redis_hits"] += 1
     if raw is None:
         return None
-    return json.loads(raw)
+    value = json.loads(raw)
+    tier.put(key, value, len(raw), epoch=epoch)
+    return value
 
 
 def set_json(key: str, value: Any, ttl: Optional[int] = None) -> None:
-    get_client().set(key, json.dumps(value), ex=ttl)
+    raw = json.dumps(value)
+    pipe = get_client().pipeline(transaction=False)
+    pipe.set(key, raw, ex=ttl)
+    _publish_invalidation(pipe, key)
+    pipe.execute()
+    tier = _local_tier()
+    if tier is not None:
+        tier.put(key, value, len(raw))
+
+
+def get_fields(key: str) -> Optional[dict[str, bytes]]:
+    """
+    Хеш key как {поле: байты} или None. Значения не декодируются: клиент
+    создан с decode_responses=True, но сжатые тела — не UTF-8.
+    """
+    tier = _local_tier()
+    if tier is not None:
+        found, value = tier.get(key)
+        if found:
+            return value
+        epoch = tier.epoch
+    raw = get_client().execute_command("HGETALL", key, **{NEVER_DECODE: True})
+    fields = {name.decode(): value for name, value in raw.items()} if raw else None
+    if tier is not None:
+        with tier.lock:
+            tier.stats["redis_misses" if fields is None else "redis_hits"] += 1
+        if fields is not None:
+            tier.put(key, fields, sum(map(len, fields.values())), epoch=epoch)
+    return fields
+
+
+def set_fields(key: str, fields: dict[str, bytes], ttl: Optional[int] = None) -> None:
+    """Заменяет хеш key целиком (MULTI: читатель не увидит смесь полей)."""
+    pipe = get_client().pipeline(transaction=True)
+    pipe.delete(key)
+    pipe.hset(key, mapping=fields)
+    if ttl is not None:
+        pipe.expire(key, ttl)
+    _publish_invalidation(pipe, key)
+    pipe.execute()
+    tier = _local_tier()
+    if tier is not None:
+        tier.put(key, fields, sum(map(len, fields.values())))
 
 
 def delete(key: str) -> None:
-    get_client().delete(key)
+    pipe = get_client().pipeline(transaction=False)
+    pipe.delete(key)
+    _publish_invalidation(pipe, key)
+    pipe.execute()
+    tier = _local_tier()
+    if tier is not None:
+        tier.evict(key)
+
+
+# --- пространства имён с поколениями ---
+#
+# Ключи группы (все страницы списка skills, все mode активного сценария
+# шаблона, ...) строятся через namespaced_key и содержат текущее поколение
+# пространства имён. Инвалидация группы — один INCR поколения: новые
+# запросы сразу идут мимо старых ключей, а те доживают свой TTL и исчезают
+# сами. Раньше здесь был delete_prefix — SCAN по всему keyspace Redis на
+# каждую правку темы/раздела/сценария, O(всех ключей) и блокирующий.
+
+NAMESPACE_PREFIX = "ns"
+
 
+def namespace_generation(namespace: str, strict: bool = False) -> int:
+    # Через get_json — поколение горячее самих ключей (читается на каждый
+    # namespaced_key) и так же держится в локальном уровне. strict — прямо
+    # из Redis, мимо локального уровня: для проверок, где даже секунды
+    # устаревания при потерянной инвалидации недопустимы (принципалы auth).
+    key = f"{NAMESPACE_PREFIX}:{namespace}"
+    if strict:
+        return int(get_client().get(key) or 0)
+    return int(get_json(key) or 0)
 
-def delete_prefix(prefix: str) -> None:
+
+def namespaced_key(namespace: str, *parts: Any) -> str:
+    """Ключ в пространстве имён: {namespace}:g{поколение}:{parts...}."""
+    return ":".join([namespace, f"g{namespace_generation(namespace)}", *map(str, parts)])
+
+
+def bump_namespace(namespace: str) -> None:
+    """
+    Инвалидирует все ключи пространства имён. Счётчик поколения живёт без
+    TTL: истеки он — поколение вернулось бы к 0, и ожили бы старые ключи
+    g0, если они ещё не истекли.
+    """
+    key = f"{NAMESPACE_PREFIX}:{namespace}"
+    pipe = get_client().pipeline(transaction=False)
+    pipe.incr(key)
+    _publish_invalidation(pipe, key)
+    pipe.execute()
+    tier = _local_tier()
+    if tier is not None:
+        tier.evict(key)
+
+
+# --- stale-while-revalidate ---
+
+LOCK_PREFIX = "lock"
+# Сколько держится лок пересчёта (страховка на случай, если держатель упал,
+# не отпустив его) и сколько промах ждёт чужого пересчёта, прежде чем
+# посчитать сам.
+REFRESH_LOCK_TTL = 30
+MISS_WAIT_SECONDS = 5.0
+MISS_POLL_SECONDS = 0.05
+
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+_refresh_executor_lock = threading.Lock()
+
+
+def _get_refresh_executor() -> ThreadPoolExecutor:
+    global _refresh_executor
+    with _refresh_executor_lock:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+        return _refresh_executor
+
+
+def _acquire_lock(key: str) -> Optional[str]:
+    token = secrets.token_hex(8)
+    if get_client().set(f"{LOCK_PREFIX}:{key}", token, nx=True, ex=REFRESH_LOCK_TTL):
+        return token
+    return None
+
+
+def _release_lock(key: str, token: str) -> None:
+    # Отпускаем только свой лок: если пересчёт шёл дольше REFRESH_LOCK_TTL,
+    # лок мог уже истечь и достаться другому процессу.
     client = get_client()
-    keys = list(client.scan_iter(f"{prefix}*"))
-    if keys:
-        client.delete(*keys)
+    lock_key = f"{LOCK_PREFIX}:{key}"
+    if client.get(lock_key) == token:
+        client.delete(lock_key)
+
+
+# Как SWR хранит значение вместе с отметкой «свежо до»: load(key) ->
+# (value, fresh_until) | None, save(key, value, fresh_until, ttl).
+
+def _load_json(key: str) -> Optional[tuple[Any, float]]:
+    entry = get_json(key)
+    return None if entry is None else (entry["value"], entry["fresh_until"])
+
+
+def _save_json(key: str, value: Any, fresh_until: float, ttl: int) -> None:
+    set_json(key, {"value": value, "fresh_until": fresh_until}, ttl=ttl)
+
+
+FRESH_UNTIL_FIELD = "fresh_until"
+
+
+def _load_fields(key: str) -> Optional[tuple[dict[str, bytes], float]]:
+    fields = get_fields(key)
+    return None if fields is None else (fields, float(fields[FRESH_UNTIL_FIELD]))
+
+
+def _save_fields(key: str, fields: dict[str, bytes], fresh_until: float, ttl: int) -> None:
+    set_fields(key, {**fields, FRESH_UNTIL_FIELD: repr(fresh_until).encode()}, ttl=ttl)
+
+
+def _store(key: str, value: Any, soft_ttl: int, hard_ttl: int,
+           cache_if: Optional[Callable[[Any], bool]], save: Callable) -> None:
+    if cache_if is None or cache_if(value):
+        save(key, value, time.time() + soft_ttl, hard_ttl)
+
+
+def _refresh(key: str, compute: Callable[[], Any], soft_ttl: int, hard_ttl: int,
+             cache_if: Optional[Callable[[Any], bool]], save: Callable, token: str) -> None:
+    try:
+        _store(key, compute(), soft_ttl, hard_ttl, cache_if, save)
+    except Exception as e:
+        # Фоновый пересчёт некому пробросить — устаревшее значение живёт
+        # до жёсткого TTL, следующий запрос попробует снова.
+        print(f"cache: background refresh of {key} failed: {e!r}", flush=True)
+    finally:
+        _release_lock(key, token)
+
+
+def _get_or_refresh(key: str, compute: Callable[[], Any], soft_ttl: int, hard_ttl: int,
+                    cache_if: Optional[Callable[[Any], bool]], load: Callable, save: Callable) -> Any:
+    entry = load(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() >= fresh_until:
+            token = _acquire_lock(key)
+            if token is not None:
+                _get_refresh_executor().submit(
+                    _refresh, key, compute, soft_ttl, hard_ttl, cache_if, save, token,
+                )
+        return value
+
+    token = _acquire_lock(key)
+    if token is None:
+        deadline = time.monotonic() + MISS_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(MISS_POLL_SECONDS)
+            entry = load(key)
+            if entry is not None:
+                return entry[0]
+            # Держатель закончил, но ничего не положил (cache_if или
+            # ошибка) — ждать дальше нечего.
+            if not get_client().exists(f"{LOCK_PREFIX}:{key}"):
+                break
+    try:
+        value = compute()
+        _store(key, value, soft_ttl, hard_ttl, cache_if, save)
+        return value
+    finally:
+        if token is not None:
+            _release_lock(key, token)
+
+
+def get_or_refresh(
+        key: str,
+        compute: Callable[[], Any],
+        soft_ttl: int,
+        hard_ttl: int,
+        cache_if: Optional[Callable[[Any], bool]] = None,
+) -> Any:
+    """
+    Значение по ключу; compute() — как его посчитать (JSON-сериализуемый
+    результат).
+      - свежее (моложе soft_ttl) — отдаётся как есть;
+      - устаревшее, но живое (Redis держит ключ hard_ttl) — отдаётся сразу,
+        а пересчёт в фоне запускает только тот, кто взял лок;
+      - промаха нет — считает держатель лока, остальные ждут его результат
+        до MISS_WAIT_SECONDS и только потом считают сами.
+    compute может выполниться в фоновом потоке, поэтому не должен
+    использовать сессию БД запроса — только открывать свою.
+    cache_if(value) -> False — результат отдаётся, но не кешируется.
+    """
+    return _get_or_refresh(key, compute, soft_ttl, hard_ttl, cache_if, _load_json, _save_json)
+
+
+def get_or_refresh_fields(
+        key: str,
+        compute: Callable[[], dict[str, bytes]],
+        soft_ttl: int,
+        hard_ttl: int,
+        cache_if: Optional[Callable[[dict[str, bytes]], bool]] = None,
+) -> dict[str, bytes]:
+    """
+    То же, что get_or_refresh, для значений-хешей из байтов (get_fields):
+    compute() возвращает {поле: байты}, хранится как есть, без JSON. У
+    значения из кеша есть служебное поле FRESH_UNTIL_FIELD.
+    """
+    return _get_or_refresh(key, compute, soft_ttl, hard_ttl, cache_if, _load_fields, _save_fields)
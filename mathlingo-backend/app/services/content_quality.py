@@ -48,7 +48,7 @@ def compute_task_quality(db: Session, task_id: int) -> dict:
 
 def check_for_anomaly(db: Session, task: Task) -> Optional[ContentFlag]:
     """
-    Вызывается синхронно после попытки (тот же принцип, что mastery.recompute
+    Вызывается синхронно после попытки (тот же принцип, что mastery.apply_attempt
     в submit_answer). Срабатывает только для опубликованных AI-заданий —
     ручной контент не подлежит автоматическому возврату (см.
     docs/roadmap/product-technical-plan.md, R2 §7: "статус меняет только
@@ -0,0 +1,54 @@
+"""
+Версия содержимого групп заданий (POST/GET /gamification/task-groups/{id}/data)
+для ETag — app/routes/_conditional.py — и поколение кеша скелетов карт
+(GET /gamification/maps/{id}/data, app/routes/gamification_maps.py).
+
+Задания и группы правят десятки мест (admin_tasks, admin_gamification,
+AI-конвейер, контроль качества, импорт), и ставить cache.bump_namespace в
+каждое — гарантированно пропустить следующее. Поэтому поколение
+пространства имён поднимает хук сессии: коммит, в котором flush тронул
+Task/TaskGroup/MapLocation/AdventureMap, инвалидирует все группы разом —
+контент правится редко, а ученики читают его постоянно. Массовые
+query(...).update()/delete() мимо flush хук не видит.
+"""
+from itertools import chain
+
+import redis
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models import AdventureMap, MapLocation, Task, TaskGroup
+from app.services import cache
+
+TASK_GROUP_DATA_NAMESPACE = "task_group_data"
+MAP_SKELETON_NAMESPACE = "map_skeleton"
+
+_NAMESPACES = (TASK_GROUP_DATA_NAMESPACE, MAP_SKELETON_NAMESPACE)
+
+_TRACKED_MODELS = (Task, TaskGroup, MapLocation, AdventureMap)
+_CHANGED_FLAG = "task_content_changed"
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_changed(session, flush_context):
+    if any(isinstance(obj, _TRACKED_MODELS) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info[_CHANGED_FLAG] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_on_commit(session):
+    if not session.info.pop(_CHANGED_FLAG, False):
+        return
+    for namespace in _NAMESPACES:
+        try:
+            cache.bump_namespace(namespace)
+        except redis.RedisError as e:
+            # Коммит уже прошёл — ронять из-за Redis запрос, изменивший контент,
+            # поздно и бессмысленно. Клиенты получат старый 304 (и старый
+            # скелет карты до его TTL) до следующей правки.
+            print(f"content_version: bump of {namespace} failed: {e!r}", flush=True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop(_CHANGED_FLAG, None)
@@ -6,13 +6,22 @@ docs/roadmap/product-technical-plan.md, R3 §3, §9 задача 7). Все за
 и опираются на ix_attempts_created_at_content_type_skill_id (см. миграцию
 9af2ea949ea8) — без него activity/game-завершаемость упирались бы в full
 scan на реальном объёме попыток.
+
+Разделы сводки независимы и считаются параллельно, каждый на своём
+соединении и со своим таймаутом (get_overview): холодный промах кеша стоит
+как самый медленный раздел, а не как сумма всех, а зависший раздел
+отдаётся null, не держа весь ответ.
 """
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from datetime import datetime, timedelta
 from typing import Optional
 
-from sqlalchemy import Integer, func
+from sqlalchemy import Integer, func, text
 from sqlalchemy.orm import Session
 
+from app import config
 from app.models import (
     Admin, AIGenerationItem, Attempt, AuditLog, ContentFlag,
     GameScenario, MasteryState, Skill, Task,
@@ -152,20 +161,110 @@ def admin_activity_summary(db: Session, limit: int = RECENT_ADMIN_ACTIONS_LIMIT)
     ]
 
 
-def get_overview(db: Session, include_admin_actions: bool) -> dict:
+# Разделы сводки: имя ответа -> функция. admin_actions — только не для
+# teacher (см. get_overview).
+SECTIONS = {
+    "activity": activity_summary,
+    "skill_progress": skill_progress_summary,
+    "game_completion": game_completion_summary,
+    "ai_quality": ai_quality_summary,
+    "review_queue": review_queue_summary,
+    "publish_errors": publish_errors_summary,
+    "admin_actions": admin_activity_summary,
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Один пул на процесс, а не на запрос: потолок потоков (и соединений
+    # к БД под разделы) общий для всех одновременных запросов dashboard.
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=config.DASHBOARD_SECTION_WORKERS, thread_name_prefix="dashboard-section",
+            )
+        return _executor
+
+
+def _run_section(bind, name: str, timeout: float):
+    """
+    Раздел на собственной сессии (своё соединение из пула engine) — одну
+    Session между потоками делить нельзя. На Postgres запрос раздела ещё и
+    обрывается по statement_timeout: иначе раздел, по которому ответ уже
+    отдан как degraded, занимал бы поток и соединение до конца запроса.
+    """
+    started = time.perf_counter()
+    with Session(bind=bind) as section_db:
+        if bind.dialect.name == "postgresql":
+            section_db.execute(text(f"SET LOCAL statement_timeout = {int(timeout * 1000)}"))
+        result = SECTIONS[name](section_db)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def get_overview(db: Session, include_admin_actions: bool, parallel: Optional[bool] = None) -> dict:
     """
     include_admin_actions=False для teacher (см. R3 §5: "просмотр
     финального dashboard... частично, без раздела действий
     администраторов") — раздел просто отсутствует в ответе, а не пустой
     список, чтобы фронтенду не пришлось гадать "пусто" это или "не видно".
+
+    Разделы считаются параллельно в общем пуле потоков, каждый со своим
+    таймаутом (config.DASHBOARD_SECTION_TIMEOUT_SECONDS): не уложившийся
+    или упавший раздел — None в ответе и его имя в degraded, остальные
+    отдаются как есть. section_timings_ms — сколько занял каждый раздел (у degraded —
+    сколько его ждали). parallel=None — параллельно везде, кроме SQLite:
+    там одно соединение на процесс (тесты), и разделы идут по очереди на
+    сессии запроса, без таймаутов (упавший раздел — так же degraded).
     """
-    overview = {
-        "activity": activity_summary(db),
-        "skill_progress": skill_progress_summary(db),
-        "game_completion": game_completion_summary(db),
-        "ai_quality": ai_quality_summary(db),
-        "review_queue": review_queue_summary(db),
-        "publish_errors": publish_errors_summary(db),
-        "admin_actions": admin_activity_summary(db) if include_admin_actions else None,
-    }
+    names = [name for name in SECTIONS if include_admin_actions or name != "admin_actions"]
+    bind = db.get_bind()
+    if parallel is None:
+        parallel = bind.dialect.name != "sqlite"
+
+    overview: dict = {"admin_actions": None, "degraded": [], "section_timings_ms": {}}
+    if not parallel:
+        for name in names:
+            started = time.perf_counter()
+            try:
+                overview[name] = SECTIONS[name](db)
+            except Exception as e:
+                # Как и в параллельной ветке: упавший раздел — degraded, а не
+                # 500. Сессия запроса общая, поэтому откатываем её, чтобы
+                # следующие разделы не упёрлись в прерванную транзакцию.
+                db.rollback()
+                overview[name] = None
+                overview["degraded"].append(name)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                print(f"dashboard: section {name} failed after {elapsed_ms:.0f} ms: {e!r}", flush=True)
+            overview["section_timings_ms"][name] = round((time.perf_counter() - started) * 1000, 1)
+        return overview
+
+    timeout = config.DASHBOARD_SECTION_TIMEOUT_SECONDS
+    started = time.perf_counter()
+    executor = _get_executor()
+    futures = {name: executor.submit(_run_section, bind, name, timeout) for name in names}
+    for name, future in futures.items():
+        # Разделы стартуют одновременно, поэтому таймаут каждого отсчитываем
+        # от общего старта, а не от момента, когда дошла очередь его ждать.
+        remaining = max(0.0, started + timeout - time.perf_counter())
+        try:
+            overview[name], elapsed_ms = future.result(timeout=remaining)
+        except FuturesTimeoutError:
+            future.cancel()
+            overview[name] = None
+            overview["degraded"].append(name)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            print(f"dashboard: section {name} timed out after {elapsed_ms:.0f} ms", flush=True)
+        except Exception as e:
+            # В т.ч. QueryCanceled от statement_timeout: он срабатывает почти
+            # на том же сроке, что и таймаут future, — упавший раздел тоже
+            # degraded, а не 500 на всю сводку.
+            overview[name] = None
+            overview["degraded"].append(name)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            print(f"dashboard: section {name} failed after {elapsed_ms:.0f} ms: {e!r}", flush=True)
+        overview["section_timings_ms"][name] = round(elapsed_ms, 1)
     return overview
@@ -0,0 +1,167 @@
+"""
+Интервальное повторение заданий тренажёра ЕГЭ/ОГЭ (SM-2) — очередь
+exam_review_items, из которой exam_trainer.next_task берёт задание с самым
+ранним due_at.
+
+Очередь ведётся инкрементально: exam_trainer.submit_attempt в той же
+транзакции, что и попытку, пересчитывает строку (ученик, задание) —
+record_review. Попытки, записанные до появления очереди, переносит полный
+пересчёт из attempts (идемпотентен, можно гонять повторно):
+
+    python -m app.services.exam_review rebuild [user_id]
+
+От классического SM-2 отличаемся ответом-качеством и ошибкой: тренажёр
+знает только верно/неверно (QUALITY_CORRECT / QUALITY_WRONG), а неверно
+решённое задание возвращается не через сутки, а через RETRY_DELAY — работа
+над ошибками в ту же сессию, как и было до очереди.
+"""
+import sys
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import Attempt, ExamReviewItem, ExamTask
+
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+# Качество ответа по шкале SM-2 (0..5): верно без подсказок — 4 («хорошо»,
+# ease не меняется), неверно — 1 (повторение сбрасывается, ease падает).
+QUALITY_CORRECT = 4
+QUALITY_WRONG = 1
+RETRY_DELAY = timedelta(minutes=10)
+
+REBUILD_BATCH = 5000
+
+
+def _new_item(user_id: int, task_id: int, now: datetime) -> ExamReviewItem:
+    return ExamReviewItem(
+        user_id=user_id, exam_task_id=task_id, repetitions=0, interval_days=0,
+        ease_factor=INITIAL_EASE, lapses=0, due_at=now,
+    )
+
+
+def schedule(item: ExamReviewItem, correct: bool, now: datetime) -> None:
+    """Шаг SM-2: сдвигает due_at и пересчитывает ease по исходу попытки."""
+    quality = QUALITY_CORRECT if correct else QUALITY_WRONG
+    if correct:
+        if item.repetitions == 0:
+            interval = 1
+        elif item.repetitions == 1:
+            interval = 6
+        else:
+            interval = round(item.interval_days * item.ease_factor)
+        item.repetitions += 1
+        item.interval_days = interval
+        item.due_at = now + timedelta(days=interval)
+    else:
+        item.repetitions = 0
+        item.interval_days = 0
+        item.lapses += 1
+        item.due_at = now + RETRY_DELAY
+    penalty = 5 - quality
+    item.ease_factor = max(MIN_EASE, item.ease_factor + 0.1 - penalty * (0.08 + penalty * 0.02))
+    item.last_reviewed_at = now
+
+
+def record_review(
+        db: Session,
+        user_id: int,
+        task_id: int,
+        correct: bool,
+        now: Optional[datetime] = None,
+) -> ExamReviewItem:
+    """Учитывает попытку в очереди ученика. Не коммитит."""
+    now = now or datetime.utcnow()
+    query = db.query(ExamReviewItem).filter(
+        ExamReviewItem.user_id == user_id, ExamReviewItem.exam_task_id == task_id,
+    ).with_for_update()
+    item = query.first()
+    if item is None:
+        # Первая попытка из двух вкладок сразу: вторая вставка упрётся в
+        # uq_exam_review_items_user_task — тогда берём строку первой.
+        try:
+            with db.begin_nested():
+                item = _new_item(user_id, task_id, now)
+                db.add(item)
+        except IntegrityError:
+            item = query.one()
+    schedule(item, correct, now)
+    return item
+
+
+def rebuild(db: Session, user_id: Optional[int] = None) -> int:
+    """
+    Пересобирает очередь (всю или одного ученика) проигрыванием попыток
+    "exam" в порядке created_at. Коммитит. Возвращает число строк очереди.
+    """
+    stale = db.query(ExamReviewItem)
+    attempts = (
+        db.query(Attempt.user_id, Attempt.content_id, Attempt.is_correct, Attempt.created_at)
+        # Попытки по уже удалённым заданиям FK очереди всё равно не примет.
+        .join(ExamTask, ExamTask.id == Attempt.content_id)
+        .filter(Attempt.content_type == "exam")
+    )
+    if user_id is not None:
+        stale = stale.filter(ExamReviewItem.user_id == user_id)
+        attempts = attempts.filter(Attempt.user_id == user_id)
+    stale.delete(synchronize_session=False)
+
+    # Попытки идут по ученику подряд — в памяти состояние одного ученика,
+    # вставка пачками.
+    items: dict[tuple[int, int], ExamReviewItem] = {}
+    pending: list[dict] = []
+    total = 0
+    current_user = None
+
+    def flush_user():
+        pending.extend(
+            {c: getattr(item, c) for c in (
+                "user_id", "exam_task_id", "repetitions", "interval_days",
+                "ease_factor", "lapses", "due_at", "last_reviewed_at",
+            )}
+            for item in items.values()
+        )
+        items.clear()
+
+    def insert_pending():
+        nonlocal total
+        if pending:
+            db.execute(insert(ExamReviewItem), pending)
+            total += len(pending)
+            pending.clear()
+
+    ordered = attempts.order_by(Attempt.user_id, Attempt.created_at, Attempt.id)
+    for attempt_user_id, task_id, correct, created_at in ordered.yield_per(REBUILD_BATCH):
+        if attempt_user_id != current_user:
+            flush_user()
+            if len(pending) >= REBUILD_BATCH:
+                insert_pending()
+            current_user = attempt_user_id
+        reviewed_at = created_at or datetime.utcnow()
+        item = items.get((attempt_user_id, task_id))
+        if item is None:
+            item = items[(attempt_user_id, task_id)] = _new_item(attempt_user_id, task_id, reviewed_at)
+        schedule(item, correct, reviewed_at)
+    flush_user()
+    insert_pending()
+    db.commit()
+    return total
+
+
+if __name__ == "__main__":
+    # python -m app.services.exam_review rebuild [user_id]   — пересобрать из attempts
+    from app.database import SessionLocal
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    session = SessionLocal()
+    try:
+        if command == "rebuild":
+            only_user = int(sys.argv[2]) if len(sys.argv) > 2 else None
+            print(f"exam_review: rebuilt {rebuild(session, only_user)} items", flush=True)
+        else:
+            sys.exit(f"unknown command: {command}")
+    finally:
+        session.close()
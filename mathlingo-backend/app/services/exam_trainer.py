@@ -5,17 +5,22 @@
 Так и задумывалась generic-ссылка content_type/content_id (см. Attempt в
 models.py), и диагностика/mastery потом увидят экзаменационные попытки без
 отдельного слоя. Миграция не нужна: content_type — обычная строковая колонка.
+Что и когда повторять, хранит очередь SM-2 (ExamReviewItem,
+app/services/exam_review.py) — её обновляет submit_attempt.
 
 Проверка ответа — строковая, как и в Task.ANSWER_TYPES: нормализуем регистр,
 пробелы и запятую-разделитель (ученик пишет «0,25», банк хранит «0.25»).
 Настоящая математическая эквивалентность («1/2» ≡ «0.5») сюда сознательно не
 тянется — это работа отдельного checker'а, а не сравнения строк.
 """
+from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import exists
 from sqlalchemy.orm import Session
 
-from app.models import Attempt, ExamTask, User
+from app.models import Attempt, ExamReviewItem, ExamTask, User
+from app.services import exam_review
 
 # Сколько разных заданий по номеру нужно решить, чтобы считать номер закрытым.
 MASTERY_SOLVED = 3
@@ -52,6 +57,7 @@ def submit_attempt(
         time_spent_ms=time_spent_ms,
         source="manual",
     ))
+    exam_review.record_review(db, user.id, task.id, correct)
     db.commit()
     return {
         "correct": correct,
@@ -60,26 +66,12 @@ def submit_attempt(
     }
 
 
-def _solved_task_ids(db: Session, user: User) -> set:
-    rows = (
-        db.query(Attempt.content_id)
-        .filter(Attempt.user_id == user.id,
-                Attempt.content_type == "exam",
-                Attempt.is_correct.is_(True))
-        .distinct()
-        .all()
-    )
-    return {r[0] for r in rows}
-
-
-def _seen_task_ids(db: Session, user: User) -> set:
-    rows = (
-        db.query(Attempt.content_id)
-        .filter(Attempt.user_id == user.id, Attempt.content_type == "exam")
-        .distinct()
-        .all()
+def _in_queue(user: User):
+    """EXISTS(строка очереди ученика на это задание) — для анти-джойна «ещё не виденное»."""
+    return exists().where(
+        ExamReviewItem.user_id == user.id,
+        ExamReviewItem.exam_task_id == ExamTask.id,
     )
-    return {r[0] for r in rows}
 
 
 def next_task(
@@ -92,10 +84,16 @@ def next_task(
 ) -> Optional[ExamTask]:
     """
     Следующее задание для тренировки. Порядок предпочтения:
-      1) ещё не виденное — новое всегда интереснее;
-      2) виденное, но не решённое — работа над ошибками;
-      3) любое из среза — если всё решено, даём повторить.
+      1) повторение, срок которого подошёл (due_at <= сейчас), — самое
+         раннее; неверно решённые попадают сюда через RETRY_DELAY;
+      2) ещё не виденное — по (difficulty, id);
+      3) если всё видено и ничего не «созрело» — ближайшее по due_at
+         (повторить раньше срока лучше, чем упереться в тупик).
     Возвращает None, если под фильтры нет ни одного задания.
+
+    Историю ученика из attempts здесь больше не восстанавливаем: ступени 1 и
+    3 — поиск по индексу очереди (user_id, due_at) с LIMIT 1, ступень 2 —
+    анти-джойн к очереди (см. app/services/exam_review.py).
     """
     query = db.query(ExamTask)
     if exam is not None:
@@ -107,20 +105,18 @@ def next_task(
     if task_number is not None:
         query = query.filter(ExamTask.task_number == task_number)
 
-    candidates = query.order_by(ExamTask.difficulty, ExamTask.id).all()
-    if not candidates:
-        return None
-
-    seen = _seen_task_ids(db, user)
-    solved = _solved_task_ids(db, user)
-
-    for task in candidates:
-        if task.id not in seen:
-            return task
-    for task in candidates:
-        if task.id not in solved:
-            return task
-    return candidates[0]
+    reviews = (
+        query.join(ExamReviewItem, ExamReviewItem.exam_task_id == ExamTask.id)
+        .filter(ExamReviewItem.user_id == user.id)
+        .order_by(ExamReviewItem.due_at, ExamReviewItem.id)
+    )
+    task = reviews.filter(ExamReviewItem.due_at <= datetime.utcnow()).first()
+    if task is not None:
+        return task
+    task = query.filter(~_in_queue(user)).order_by(ExamTask.difficulty, ExamTask.id).first()
+    if task is not None:
+        return task
+    return reviews.first()
 
 
 def compute_progress(
@@ -1,22 +1,31 @@
 """
 Фаза 5: аналитика вовлечённости матричных мини-игр по телеметрии
-(game_sessions/game_events/user_game_progress). Как и content_quality,
-это чистые агрегаты в Python (не сырой SQL с JSON-операторами) — так
-цифры одинаково считаются на Postgres и на SQLite в тестах, а типы
-событий остаются свободными строками (backend их не перечисляет).
+(game_sessions/game_events/user_game_progress). Агрегаты — обычный SQL
+по типизированным колонкам game_events (level_id/stars/metric, их
+раскладывает приём телеметрии), без JSON-операторов — так цифры одинаково
+считаются на Postgres и на SQLite в тестах, а типы событий остаются
+свободными строками (backend их не перечисляет).
 
 Три оси, которые нужны продукту (Duolingo-for-math): доходят ли до конца
 (воронка level_start → level_complete), насколько залипают (сессии, их
 длина, брошенность) и растёт ли мастерство (звёзды, освоенные уровни).
 Ось «качество усвоения» (pre/post-квизы) — отдельная, это Фаза 6.
+
+Админ-отчёт читает дневные роллапы (compute_game_engagement; ведёт их
+app/services/game_rollups.py при приёме телеметрии), а не сырые события:
+на окне в 365 дней загрузка всех событий в Python не масштабируется.
+Подсчёт по событиям остаётся эталоном (compute_game_engagement_from_events)
+— с ним сверяются роллапы в тестах и в `game_rollups check`.
 """
-from collections import defaultdict
-from datetime import datetime
+from datetime import datetime, time, timedelta
 from typing import Optional
 
+from sqlalchemy import case, func
 from sqlalchemy.orm import Session
 
-from app.models import GameEvent, GameSession, UserGameProgress
+from app.models import (
+    GameDailyPlayer, GameDailyStats, GameEvent, GameLevelDailyStats, GameSession, UserGameProgress,
+)
 
 # Порог «уровень освоен»: 3 звезды — это укладывание в пар (см. starsFor* во
 # фронтовом движке). Держим здесь, чтобы менять определение мастерства в одном
@@ -24,113 +33,241 @@ from app.models import GameEvent, GameSession, UserGameProgress
 MASTERY_STARS = 3
 
 
-def _completion_metric(payload: dict) -> Optional[float]:
-    """
-    Усилие на прохождение из payload level_complete: ходы (игра A) или тики
-    (игра B). В обеих играх меньше = лучше; имя поля разное, поэтому берём
-    первое присутствующее, а не завязываемся на конкретную игру.
-    """
-    for key in ("moves", "ticks"):
-        value = payload.get(key)
-        if isinstance(value, (int, float)) and not isinstance(value, bool):
-            return float(value)
-    return None
+_COMPLETE = "level_complete"
+_ABANDON = "level_abandon"
+_FUNNEL_EVENTS = ("level_start", _COMPLETE, _ABANDON)
 
 
-def compute_game_engagement(db: Session, game_id: str, since: Optional[datetime] = None) -> dict:
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _event_aggregates(db: Session, game_id: str, since: Optional[datetime] = None,
+                      until: Optional[datetime] = None) -> dict:
     """
-    Сводка вовлечённости по одной игре. since (если задан) ограничивает окно
-    по началу сессии — для срезов «за N дней». Все доли — None при пустом
-    знаменателе, чтобы фронт различал «0%» и «данных нет».
+    Агрегаты по сырым сессиям и событиям игры (типизированные колонки
+    GameEvent) для сессий, начатых в [since, until). Границы необязательны.
     """
-    sessions_q = db.query(GameSession).filter(GameSession.game_id == game_id)
-    if since is not None:
-        sessions_q = sessions_q.filter(GameSession.started_at >= since)
-    sessions = sessions_q.all()
-    session_ids = [s.id for s in sessions]
+    def window(query):
+        if since is not None:
+            query = query.filter(GameSession.started_at >= since)
+        if until is not None:
+            query = query.filter(GameSession.started_at < until)
+        return query
+
+    sessions = window(
+        db.query(GameSession.user_id, GameSession.started_at, GameSession.ended_at)
+        .filter(GameSession.game_id == game_id)
+    ).all()
+
+    def game_events(query):
+        return window(query.join(GameSession, GameSession.id == GameEvent.session_id).filter(
+            GameSession.game_id == game_id, GameEvent.event_type.in_(_FUNNEL_EVENTS)
+        ))
+
+    is_complete = GameEvent.event_type == _COMPLETE
+    # Исход каждой сессии: был ли в ней complete / abandon.
+    outcomes = game_events(
+        db.query(
+            func.max(case((is_complete, 1), else_=0)).label("completed"),
+            func.max(case((GameEvent.event_type == _ABANDON, 1), else_=0)).label("abandoned"),
+        )
+    ).group_by(GameEvent.session_id).subquery()
+    sessions_completed, sessions_abandoned = db.query(
+        _count_if(outcomes.c.completed == 1),
+        # Брошенная = явный level_abandon и ни одного level_complete в сессии.
+        _count_if((outcomes.c.abandoned == 1) & (outcomes.c.completed == 0)),
+    ).one()
+
+    level_key = func.coalesce(GameEvent.level_id, "—")
+    level_rows = game_events(
+        db.query(
+            level_key,
+            _count_if(GameEvent.event_type == "level_start"),
+            _count_if(is_complete),
+            _count_if(GameEvent.event_type == _ABANDON),
+            _count_if(is_complete & GameEvent.stars.isnot(None)),
+            func.coalesce(func.sum(case((is_complete, GameEvent.stars))), 0),
+            _count_if(is_complete & (GameEvent.stars >= MASTERY_STARS)),
+            _count_if(is_complete & GameEvent.metric.isnot(None)),
+            func.coalesce(func.sum(case((is_complete, GameEvent.metric))), 0),
+        )
+    ).group_by(level_key).all()
 
-    sessions_total = len(sessions)
-    players = len({s.user_id for s in sessions})
-    sessions_open = sum(1 for s in sessions if s.ended_at is None)
     durations = [
-        (s.ended_at - s.started_at).total_seconds()
-        for s in sessions if s.ended_at is not None
+        (ended_at - started_at).total_seconds()
+        for _, started_at, ended_at in sessions if ended_at is not None
     ]
-    avg_session_seconds = round(sum(durations) / len(durations), 1) if durations else None
+    return {
+        "user_ids": {user_id for user_id, _, _ in sessions},
+        "sessions_total": len(sessions),
+        "sessions_completed": sessions_completed,
+        "sessions_abandoned": sessions_abandoned,
+        "sessions_open": sum(1 for _, _, ended_at in sessions if ended_at is None),
+        "duration_count": len(durations),
+        "duration_sum": sum(durations),
+        "level_rows": level_rows,
+    }
+
 
-    events = (
-        db.query(GameEvent).filter(GameEvent.session_id.in_(session_ids)).all()
-        if session_ids else []
+def _mastery(db: Session, game_id: str) -> tuple[int, int]:
+    """(освоенных уровней, игроков с освоенным уровнем) — без окна, как и раньше."""
+    levels_mastered, players_with_mastery = (
+        db.query(func.count(UserGameProgress.id), func.count(func.distinct(UserGameProgress.user_id)))
+        .filter(UserGameProgress.game_id == game_id, UserGameProgress.best_stars >= MASTERY_STARS)
+        .one()
     )
+    return levels_mastered, players_with_mastery
 
-    starts: dict[str, int] = defaultdict(int)
-    completes: dict[str, int] = defaultdict(int)
-    abandons: dict[str, int] = defaultdict(int)
-    stars_by_level: dict[str, list] = defaultdict(list)
-    metric_by_level: dict[str, list] = defaultdict(list)
-    all_stars: list[int] = []
-    sessions_with_complete: set[int] = set()
-    sessions_with_abandon: set[int] = set()
-
-    for event in events:
-        payload = event.payload if isinstance(event.payload, dict) else {}
-        level_id = payload.get("level_id") or "—"
-        if event.event_type == "level_start":
-            starts[level_id] += 1
-        elif event.event_type == "level_complete":
-            completes[level_id] += 1
-            sessions_with_complete.add(event.session_id)
-            stars = payload.get("stars")
-            if isinstance(stars, int) and not isinstance(stars, bool):
-                stars_by_level[level_id].append(stars)
-                all_stars.append(stars)
-            metric = _completion_metric(payload)
-            if metric is not None:
-                metric_by_level[level_id].append(metric)
-        elif event.event_type == "level_abandon":
-            abandons[level_id] += 1
-            sessions_with_abandon.add(event.session_id)
-
-    total_starts = sum(starts.values())
-    total_completes = sum(completes.values())
-
-    level_ids = sorted(set(starts) | set(completes) | set(abandons))
+
+def compute_game_engagement_from_events(db: Session, game_id: str, since: Optional[datetime] = None) -> dict:
+    """
+    Эталонная сводка вовлечённости по одной игре — по сырым сессиям и
+    событиям (агрегаты по типизированным колонкам GameEvent). since (если
+    задан) ограничивает окно по началу сессии. Все доли — None при пустом
+    знаменателе, чтобы фронт различал «0%» и «данных нет».
+    """
+    raw = _event_aggregates(db, game_id, since)
+    levels_mastered, players_with_mastery = _mastery(db, game_id)
+    return _summary(
+        game_id,
+        players=len(raw.pop("user_ids")),
+        **raw,
+        levels_mastered=levels_mastered,
+        players_with_mastery=players_with_mastery,
+    )
+
+
+def _ratio(numerator, denominator, digits):
+    return round(numerator / denominator, digits) if denominator else None
+
+
+def _summary(game_id: str, *, players, sessions_total, sessions_completed, sessions_abandoned,
+             sessions_open, duration_count, duration_sum, level_rows,
+             levels_mastered, players_with_mastery) -> dict:
+    """
+    Сборка ответа из агрегатов — общая для эталона и роллапов. level_rows:
+    (level_id, starts, completes, abandons, stars_count, stars_sum,
+    stars_mastered, metric_count, metric_sum) по уровню.
+    """
     per_level = []
-    for level_id in level_ids:
-        s = starts[level_id]
-        c = completes[level_id]
-        stars = stars_by_level[level_id]
-        metrics = metric_by_level[level_id]
+    total_starts = total_completes = stars_count = stars_sum = stars_mastered = 0
+    # Сортировка в Python, а не ORDER BY: порядок уровней не должен зависеть
+    # от collation базы.
+    for (level_id, starts, completes, abandons, level_stars_count, level_stars_sum,
+         level_stars_mastered, metric_count, metric_sum) in sorted(level_rows, key=lambda row: row[0]):
+        total_starts += starts
+        total_completes += completes
+        stars_count += level_stars_count
+        stars_sum += level_stars_sum
+        stars_mastered += level_stars_mastered
         per_level.append({
             "level_id": level_id,
-            "starts": s,
-            "completes": c,
-            "abandons": abandons[level_id],
-            "completion_rate": round(c / s, 3) if s else None,
-            "avg_stars": round(sum(stars) / len(stars), 2) if stars else None,
-            "avg_metric": round(sum(metrics) / len(metrics), 2) if metrics else None,
+            "starts": starts,
+            "completes": completes,
+            "abandons": abandons,
+            "completion_rate": _ratio(completes, starts, 3),
+            "avg_stars": _ratio(level_stars_sum, level_stars_count, 2),
+            "avg_metric": _ratio(metric_sum, metric_count, 2),
         })
 
-    progress = db.query(UserGameProgress).filter(UserGameProgress.game_id == game_id).all()
-    mastered = [p for p in progress if p.best_stars >= MASTERY_STARS]
-
     return {
         "game_id": game_id,
         "players": players,
         "sessions_total": sessions_total,
-        "sessions_completed": len(sessions_with_complete),
-        # Брошенная = явный level_abandon и ни одного level_complete в сессии.
-        "sessions_abandoned": len(sessions_with_abandon - sessions_with_complete),
+        "sessions_completed": sessions_completed,
+        "sessions_abandoned": sessions_abandoned,
         "sessions_open": sessions_open,
-        "avg_session_seconds": avg_session_seconds,
+        "avg_session_seconds": _ratio(duration_sum, duration_count, 1),
         "level_starts": total_starts,
         "level_completes": total_completes,
-        "completion_rate": round(total_completes / total_starts, 3) if total_starts else None,
-        "avg_stars": round(sum(all_stars) / len(all_stars), 2) if all_stars else None,
-        "three_star_share": round(
-            sum(1 for st in all_stars if st >= MASTERY_STARS) / len(all_stars), 3
-        ) if all_stars else None,
-        "levels_mastered": len(mastered),
-        "players_with_mastery": len({p.user_id for p in mastered}),
+        "completion_rate": _ratio(total_completes, total_starts, 3),
+        "avg_stars": _ratio(stars_sum, stars_count, 2),
+        "three_star_share": _ratio(stars_mastered, stars_count, 3),
+        "levels_mastered": levels_mastered,
+        "players_with_mastery": players_with_mastery,
         "per_level": per_level,
     }
+
+
+def compute_game_engagement(db: Session, game_id: str, since: Optional[datetime] = None) -> dict:
+    """
+    Сводка вовлечённости по одной игре из дневных роллапов — те же поля и
+    те же числа, что у compute_game_engagement_from_events, в том числе для
+    since посреди дня: полные дни после since берутся из роллапов, а
+    неполный первый день [since, следующая полночь) — из сырых событий
+    (это не больше суток телеметрии).
+    """
+    first_full_day = None
+    partial = None
+    if since is not None:
+        first_full_day = since.date()
+        if since.time() != time.min:
+            first_full_day += timedelta(days=1)
+            partial = _event_aggregates(db, game_id, since, datetime.combine(first_full_day, time.min))
+
+    def windowed(query, model):
+        query = query.filter(model.game_id == game_id)
+        return query.filter(model.day >= first_full_day) if first_full_day is not None else query
+
+    (sessions_total, sessions_open, sessions_completed, sessions_abandoned,
+     duration_count, duration_sum) = windowed(
+        db.query(
+            func.coalesce(func.sum(GameDailyStats.sessions_total), 0),
+            func.coalesce(func.sum(GameDailyStats.sessions_open), 0),
+            func.coalesce(func.sum(GameDailyStats.sessions_completed), 0),
+            func.coalesce(func.sum(GameDailyStats.sessions_abandoned), 0),
+            func.coalesce(func.sum(GameDailyStats.duration_count), 0),
+            func.coalesce(func.sum(GameDailyStats.duration_sum_seconds), 0),
+        ),
+        GameDailyStats,
+    ).one()
+
+    level_rows = windowed(
+        db.query(
+            GameLevelDailyStats.level_id,
+            func.sum(GameLevelDailyStats.starts),
+            func.sum(GameLevelDailyStats.completes),
+            func.sum(GameLevelDailyStats.abandons),
+            func.sum(GameLevelDailyStats.stars_count),
+            func.sum(GameLevelDailyStats.stars_sum),
+            func.sum(GameLevelDailyStats.stars_mastered),
+            func.sum(GameLevelDailyStats.metric_count),
+            func.sum(GameLevelDailyStats.metric_sum),
+        ),
+        GameLevelDailyStats,
+    ).group_by(GameLevelDailyStats.level_id).all()
+
+    player_ids = windowed(db.query(GameDailyPlayer.user_id), GameDailyPlayer)
+    if partial is None:
+        players = player_ids.distinct().count()
+    else:
+        # Игроки неполного дня и полных дней пересекаются — считаем
+        # различных по объединению, а не суммой.
+        players = len(partial["user_ids"] | {user_id for (user_id,) in player_ids.distinct()})
+        sessions_total += partial["sessions_total"]
+        sessions_open += partial["sessions_open"]
+        sessions_completed += partial["sessions_completed"]
+        sessions_abandoned += partial["sessions_abandoned"]
+        duration_count += partial["duration_count"]
+        duration_sum += partial["duration_sum"]
+        by_level = {row[0]: list(row[1:]) for row in level_rows}
+        for level_id, *values in partial["level_rows"]:
+            current = by_level.setdefault(level_id, [0] * len(values))
+            by_level[level_id] = [a + b for a, b in zip(current, values)]
+        level_rows = [(level_id, *values) for level_id, values in by_level.items()]
+
+    levels_mastered, players_with_mastery = _mastery(db, game_id)
+    return _summary(
+        game_id,
+        players=players,
+        sessions_total=sessions_total,
+        sessions_completed=sessions_completed,
+        sessions_abandoned=sessions_abandoned,
+        sessions_open=sessions_open,
+        duration_count=duration_count,
+        duration_sum=duration_sum,
+        level_rows=level_rows,
+        levels_mastered=levels_mastered,
+        players_with_mastery=players_with_mastery,
+    )
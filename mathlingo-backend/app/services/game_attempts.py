@@ -12,8 +12,8 @@ from typing import Optional
 
 from sqlalchemy.orm import Session
 
-from app.models import Attempt, GameScenario, UserProgress
-from app.services import mastery
+from app.models import Attempt, GameScenario
+from app.services import mastery, progress
 
 # Порог "сессия засчитана как успешная" — начальный, как и пороги в
 # mastery.py (см. комментарий там же про то, почему они собраны в одном
@@ -27,6 +27,19 @@ GAME_SESSION_PASS_THRESHOLD = 0.5
 GAME_SESSION_REWARD_POINTS = 20
 
 
+def evaluate(score: int, max_score: int) -> tuple[bool, int]:
+    """
+    (is_correct, points_earned) для итога сессии. Вынесено из record_attempt,
+    чтобы режим очереди попыток (app/services/attempt_ingest.py) решал
+    "засчитано/нет" в запросе ровно так же, как синхронный путь.
+    """
+    max_score = max(0, max_score)
+    score = max(0, min(score, max_score))
+    is_correct = max_score > 0 and (score / max_score) >= GAME_SESSION_PASS_THRESHOLD
+    points_earned = round(GAME_SESSION_REWARD_POINTS * (score / max_score)) if is_correct else 0
+    return is_correct, points_earned
+
+
 def record_attempt(
         db: Session,
         user_id: int,
@@ -38,12 +51,10 @@ def record_attempt(
     """
     Пишет одну запись в attempts (content_type=game, source=game) и, если у
     сценария указана тема (skill_id — nullable, см. app/models.py
-    GameScenario), синхронно пересчитывает mastery_state по той же теме —
-    тем же принципом, что submit_answer в app/routes/gamification.py.
+    GameScenario), в той же транзакции обновляет mastery_state по той же
+    теме — тем же принципом, что submit_answer в app/routes/gamification_tasks.py.
     """
-    max_score = max(0, max_score)
-    score = max(0, min(score, max_score))
-    is_correct = max_score > 0 and (score / max_score) >= GAME_SESSION_PASS_THRESHOLD
+    is_correct, points_earned = evaluate(score, max_score)
 
     attempt = Attempt(
         user_id=user_id,
@@ -56,27 +67,16 @@ def record_attempt(
         source="game",
     )
     db.add(attempt)
+    db.flush()
+
+    # Инкрементальный пересчёт по буферу окна, в той же транзакции, что
+    # попытка и очки (no-op без skill_id). estimated_time_seconds у игровой
+    # сессии нет — time_ratio для неё не считается.
+    mastery.apply_attempt(db, attempt)
 
     if is_correct:
-        points_earned = round(GAME_SESSION_REWARD_POINTS * (score / max_score)) if max_score else 0
-        # Та же ленивая инициализация, что в submit_answer — UserProgress
-        # мог не существовать, если ученик ни разу не открывал карту.
-        progress = db.query(UserProgress).filter(UserProgress.user_id == user_id).first()
-        if not progress:
-            progress = UserProgress(
-                user_id=user_id,
-                current_level=1,
-                total_points=0,
-                completed_locations="[]",
-                unlocked_achievements="[]",
-            )
-            db.add(progress)
-        progress.total_points += points_earned
+        progress.add_points(db, user_id, points_earned)
 
     db.commit()
     db.refresh(attempt)
-
-    if scenario.skill_id is not None:
-        mastery.recompute(db, user_id, scenario.skill_id)
-
     return attempt
@@ -0,0 +1,134 @@
+"""
+Апсерт лучшего результата на уровне (POST /api/games/progress и
+/progress/batch, app/routes/games.py) одним INSERT ... ON CONFLICT DO UPDATE
+... WHERE <новый результат лучше> RETURNING — на Postgres и SQLite.
+
+Раньше роут делал SELECT, затем INSERT или UPDATE: два одновременных
+завершения уровня оба не находили строку, и второй INSERT падал на
+uq_user_game_progress_user_game_level (500). Теперь конфликт разрешает сама
+база под блокировкой строки.
+
+Лидерборду (leaderboard.record_progress) нужен прирост звёзд и уровней.
+RETURNING отдаёт только новую строку, поэтому DO UPDATE заодно пишет
+прежние звёзды в previous_best_stars (в SET колонки таблицы — ещё старые
+значения), а INSERT оставляет её NULL: по вернувшейся строке прирост точен
+и при гонке. Строка не вернулась — результат не лучше, прироста нет.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import UserGameProgress
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+@dataclass
+class LevelResult:
+    game_id: str
+    level_id: str
+    stars: int
+    metric: Optional[int]
+
+
+@dataclass
+class UpsertOutcome:
+    row: UserGameProgress
+    stars_delta: int = 0
+    levels_delta: int = 0
+
+
+def _better(stars: int, metric: Optional[int], best_stars: int, best_metric: Optional[int]) -> bool:
+    """«Лучше» = больше звёзд; при равных звёздах — меньше метрика."""
+    if stars != best_stars:
+        return stars > best_stars
+    return metric is not None and (best_metric is None or metric < best_metric)
+
+
+def _best_per_level(results: Iterable[LevelResult]) -> list[LevelResult]:
+    # Один уровень дважды в одном INSERT Postgres не примет ("cannot affect
+    # row a second time") — из повторов пачки остаётся лучший.
+    best: dict[tuple[str, str], LevelResult] = {}
+    for result in results:
+        key = (result.game_id, result.level_id)
+        current = best.get(key)
+        if current is None or _better(result.stars, result.metric, current.stars, current.metric):
+            best[key] = result
+    return list(best.values())
+
+
+def upsert_best(db: Session, user_id: int, results: Iterable[LevelResult]) -> list[UpsertOutcome]:
+    """
+    Апсерт пачки уровней одним запросом. Не коммитит. Возвращает исход по
+    каждому уровню (повторы схлопнуты) в порядке первого появления; row —
+    актуальная строка, даже если результат рекорд не побил.
+    """
+    results = _best_per_level(results)
+    if not results:
+        return []
+
+    insert = _INSERTS[db.get_bind().dialect.name]
+    now = datetime.utcnow()
+    stmt = insert(UserGameProgress).values([
+        {
+            "user_id": user_id,
+            "game_id": r.game_id,
+            "level_id": r.level_id,
+            "best_stars": r.stars,
+            "best_metric": r.metric,
+            "previous_best_stars": None,
+            "completed_at": now,
+        }
+        for r in results
+    ])
+    table, excluded = UserGameProgress.__table__.c, stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.user_id, table.game_id, table.level_id],
+        set_={
+            "best_stars": excluded.best_stars,
+            "best_metric": excluded.best_metric,
+            "previous_best_stars": table.best_stars,
+            "completed_at": excluded.completed_at,
+        },
+        where=or_(
+            excluded.best_stars > table.best_stars,
+            and_(
+                excluded.best_stars == table.best_stars,
+                excluded.best_metric.isnot(None),
+                or_(table.best_metric.is_(None), excluded.best_metric < table.best_metric),
+            ),
+        ),
+    ).returning(UserGameProgress)
+
+    written = {
+        (row.game_id, row.level_id): row
+        for row in db.scalars(stmt, execution_options={"populate_existing": True})
+    }
+
+    # Уровни, где рекорд не побит, RETURNING не вернул — дочитываем.
+    missing = [(r.game_id, r.level_id) for r in results if (r.game_id, r.level_id) not in written]
+    unchanged = {}
+    if missing:
+        unchanged = {
+            (row.game_id, row.level_id): row
+            for row in db.query(UserGameProgress).filter(
+                UserGameProgress.user_id == user_id,
+                tuple_(UserGameProgress.game_id, UserGameProgress.level_id).in_(missing),
+            )
+        }
+
+    outcomes = []
+    for r in results:
+        key = (r.game_id, r.level_id)
+        row = written.get(key)
+        if row is None:
+            outcomes.append(UpsertOutcome(row=unchanged[key]))
+        elif row.previous_best_stars is None:
+            outcomes.append(UpsertOutcome(row=row, stars_delta=row.best_stars, levels_delta=1))
+        else:
+            outcomes.append(UpsertOutcome(row=row, stars_delta=row.best_stars - row.previous_best_stars))
+    return outcomes
@@ -0,0 +1,273 @@
+"""
+Дневные роллапы телеметрии мини-игр (game_level_daily_stats,
+game_daily_stats, game_daily_players) — то, из чего /admin/games/analytics
+считает сводку, не загружая сессии и события в Python
+(app/services/game_analytics.py).
+
+Роллапы ведутся инкрементально в той же транзакции, что и приём батча
+(POST /api/games/events): счётчики увеличиваются атомарным
+INSERT ... ON CONFLICT DO UPDATE SET x = x + :delta, так что параллельные
+батчи разных игроков в один (игра, уровень, день) не теряют инкременты.
+Данные, записанные в обход эндпоинта (старые события до миграции, ручные
+правки), подтягивает полный пересчёт из сырых таблиц:
+
+    python -m app.services.game_rollups rebuild
+
+(check — сверка сводки из роллапов с эталонным подсчётом по событиям.)
+"""
+import sys
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import (
+    GameDailyPlayer, GameDailyStats, GameEvent, GameLevelDailyStats, GameSession,
+)
+from app.services.game_analytics import _ABANDON, _COMPLETE, _FUNNEL_EVENTS, MASTERY_STARS
+from app.services.game_telemetry import extract_fields
+
+
+def _add_events(row: Counter, event_type: str, count: int, stars_count: int, stars_sum: int,
+                stars_mastered: int, metric_count: int, metric_sum: float) -> None:
+    """
+    Добавляет в счётчики уровня группу из count событий одного типа (с
+    суммами по их stars/metric). Правила те же, что в
+    compute_game_engagement_from_events: звёзды и метрика считаются только
+    у level_complete.
+    """
+    if event_type == "level_start":
+        row["starts"] += count
+    elif event_type == _COMPLETE:
+        row["completes"] += count
+        row["stars_count"] += stars_count
+        row["stars_sum"] += stars_sum
+        row["stars_mastered"] += stars_mastered
+        row["metric_count"] += metric_count
+        row["metric_sum"] += metric_sum
+    elif event_type == _ABANDON:
+        row["abandons"] += count
+
+
+def _level_deltas(events: Iterable) -> dict[str, Counter]:
+    """
+    События батча (GameEventIn) -> приращения GameLevelDailyStats по
+    level_id. Поля берутся так же, как приём раскладывает их в колонки
+    game_events (extract_fields); уровни появляются только из
+    start/complete/abandon.
+    """
+    deltas: dict[str, Counter] = defaultdict(Counter)
+    for ev in events:
+        if ev.event_type not in _FUNNEL_EVENTS:
+            continue
+        fields = extract_fields(ev.payload)
+        stars, metric = fields["stars"], fields["metric"]
+        _add_events(
+            deltas[fields["level_id"] or "—"], ev.event_type, 1,
+            stars_count=int(stars is not None),
+            stars_sum=stars or 0,
+            stars_mastered=int(stars is not None and stars >= MASTERY_STARS),
+            metric_count=int(metric is not None),
+            metric_sum=metric or 0,
+        )
+    return deltas
+
+
+def _session_outcome(event_types: set) -> tuple[int, int]:
+    """(completed, abandoned) сессии по набору её типов событий."""
+    completed = _COMPLETE in event_types
+    return int(completed), int(_ABANDON in event_types and not completed)
+
+
+def _insert(db: Session):
+    return postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+
+
+def _increment(db: Session, model, keys: dict, deltas: dict) -> None:
+    deltas = {column: value for column, value in deltas.items() if value}
+    if not deltas:
+        return
+    table = model.__table__
+    stmt = _insert(db)(table).values(**keys, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: table.c[column] + stmt.excluded[column] for column in deltas},
+    )
+    db.execute(stmt)
+
+
+def _add_player(db: Session, game_id: str, day: date, user_id: int) -> None:
+    stmt = _insert(db)(GameDailyPlayer.__table__).values(game_id=game_id, day=day, user_id=user_id)
+    db.execute(stmt.on_conflict_do_nothing(index_elements=["game_id", "day", "user_id"]))
+
+
+def apply_batch(db: Session, session: GameSession, events: list, new_session: bool, ended_now: bool) -> None:
+    """
+    Учитывает в роллапах один принятый батч (GameEventIn из app/schemas.py).
+    Вызывать ДО вставки событий батча: исход сессии (завершена/брошена)
+    считается как разница «до батча» и «после», а «до» читается из
+    game_events. Вызывающий держит строку session под FOR UPDATE до
+    commit — иначе параллельные батчи одной сессии посчитали бы одно
+    завершение дважды. Не коммитит.
+    """
+    game_id = session.game_id
+    day = session.started_at.date()
+
+    for level_id, deltas in _level_deltas(events).items():
+        _increment(db, GameLevelDailyStats, {"game_id": game_id, "level_id": level_id, "day": day}, deltas)
+
+    session_deltas: Counter = Counter()
+    if new_session:
+        session_deltas["sessions_total"] += 1
+        session_deltas["sessions_open"] += 1
+        _add_player(db, game_id, day, session.user_id)
+
+    batch_types = {ev.event_type for ev in events} & {_COMPLETE, _ABANDON}
+    if batch_types:
+        seen = set()
+        if not new_session:
+            seen = {
+                event_type for (event_type,) in
+                db.query(GameEvent.event_type)
+                .filter(GameEvent.session_id == session.id, GameEvent.event_type.in_((_COMPLETE, _ABANDON)))
+                .distinct()
+            }
+        completed_before, abandoned_before = _session_outcome(seen)
+        completed_after, abandoned_after = _session_outcome(seen | batch_types)
+        session_deltas["sessions_completed"] += completed_after - completed_before
+        session_deltas["sessions_abandoned"] += abandoned_after - abandoned_before
+
+    if ended_now:
+        session_deltas["sessions_open"] -= 1
+        session_deltas["duration_count"] += 1
+        session_deltas["duration_sum_seconds"] += (session.ended_at - session.started_at).total_seconds()
+
+    _increment(db, GameDailyStats, {"game_id": game_id, "day": day}, session_deltas)
+
+
+def rebuild(db: Session, game_ids: Optional[Iterable[str]] = None) -> None:
+    """
+    Полный пересчёт роллапов из game_sessions/game_events (по умолчанию —
+    всех игр) и commit. Для бэкфилла после миграции и как компактор для
+    данных, записанных в обход приёма батчей.
+    """
+    game_ids = list(game_ids or GameSession.GAME_IDS)
+
+    sessions = {
+        s.id: s for s in db.query(GameSession).filter(GameSession.game_id.in_(game_ids))
+    }
+    session_rows: dict[tuple, Counter] = defaultdict(Counter)
+    players = set()
+    for s in sessions.values():
+        key = (s.game_id, s.started_at.date())
+        session_rows[key]["sessions_total"] += 1
+        players.add((*key, s.user_id))
+        if s.ended_at is None:
+            session_rows[key]["sessions_open"] += 1
+        else:
+            session_rows[key]["duration_count"] += 1
+            session_rows[key]["duration_sum_seconds"] += (s.ended_at - s.started_at).total_seconds()
+
+    # События агрегирует база — по (сессия, уровень, тип) на типизированных
+    # колонках; в Python приходят группы, а не строки событий.
+    level_key = func.coalesce(GameEvent.level_id, "—")
+    grouped = (
+        db.query(
+            GameEvent.session_id,
+            level_key,
+            GameEvent.event_type,
+            func.count(GameEvent.id),
+            func.count(GameEvent.stars),
+            func.coalesce(func.sum(GameEvent.stars), 0),
+            func.coalesce(func.sum(case((GameEvent.stars >= MASTERY_STARS, 1), else_=0)), 0),
+            func.count(GameEvent.metric),
+            func.coalesce(func.sum(GameEvent.metric), 0),
+        )
+        .join(GameSession, GameSession.id == GameEvent.session_id)
+        .filter(GameSession.game_id.in_(game_ids), GameEvent.event_type.in_(_FUNNEL_EVENTS))
+        .group_by(GameEvent.session_id, level_key, GameEvent.event_type)
+    )
+    level_counters: dict[tuple, Counter] = defaultdict(Counter)
+    outcome_types: dict[int, set] = defaultdict(set)
+    for session_id, level_id, event_type, *aggregates in grouped.yield_per(5000):
+        s = sessions[session_id]
+        _add_events(level_counters[(s.game_id, level_id, s.started_at.date())], event_type, *aggregates)
+        outcome_types[session_id].add(event_type)
+
+    for session_id, event_types in outcome_types.items():
+        s = sessions[session_id]
+        completed, abandoned = _session_outcome(event_types)
+        session_rows[(s.game_id, s.started_at.date())]["sessions_completed"] += completed
+        session_rows[(s.game_id, s.started_at.date())]["sessions_abandoned"] += abandoned
+
+    level_rows = [
+        {"game_id": game_id, "level_id": level_id, "day": day, **counters}
+        for (game_id, level_id, day), counters in level_counters.items()
+    ]
+
+    for model in (GameLevelDailyStats, GameDailyStats, GameDailyPlayer):
+        db.query(model).filter(model.game_id.in_(game_ids)).delete(synchronize_session=False)
+    # Пустые Counter'ы не дают всех колонок — executemany требует одинаковый
+    # набор ключей, поэтому добиваем нулями.
+    if level_rows:
+        columns = ("starts", "completes", "abandons", "stars_count", "stars_sum",
+                   "stars_mastered", "metric_count", "metric_sum")
+        db.execute(GameLevelDailyStats.__table__.insert(), [
+            {**{c: 0 for c in columns}, **row} for row in level_rows
+        ])
+    if session_rows:
+        columns = ("sessions_total", "sessions_open", "sessions_completed", "sessions_abandoned",
+                   "duration_count", "duration_sum_seconds")
+        db.execute(GameDailyStats.__table__.insert(), [
+            {**{c: 0 for c in columns}, **counters, "game_id": game_id, "day": day}
+            for (game_id, day), counters in session_rows.items()
+        ])
+    if players:
+        db.execute(GameDailyPlayer.__table__.insert(), [
+            {"game_id": game_id, "day": day, "user_id": user_id} for game_id, day, user_id in players
+        ])
+    db.commit()
+
+
+def check_consistency(db: Session, game_id: str, since: Optional[datetime] = None) -> list[str]:
+    """
+    Расхождения сводки из роллапов с эталонным подсчётом по сырым событиям
+    (compute_game_engagement_from_events). Пустой список — роллапы верны.
+    """
+    from app.services.game_analytics import compute_game_engagement, compute_game_engagement_from_events
+
+    expected = compute_game_engagement_from_events(db, game_id, since)
+    actual = compute_game_engagement(db, game_id, since)
+    return [
+        f"{key}: rollup={actual[key]!r} events={expected[key]!r}"
+        for key in expected if actual[key] != expected[key]
+    ]
+
+
+if __name__ == "__main__":
+    # python -m app.services.game_rollups rebuild   — пересобрать из game_events
+    # python -m app.services.game_rollups check     — сверить с эталоном
+    from app.database import SessionLocal
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    session = SessionLocal()
+    try:
+        if command == "rebuild":
+            rebuild(session)
+            print("game_rollups: rebuilt", flush=True)
+        elif command == "check":
+            failed = False
+            for gid in GameSession.GAME_IDS:
+                mismatches = check_consistency(session, gid)
+                print(f"game_rollups[{gid}]: {len(mismatches)} mismatches", flush=True)
+                for m in mismatches:
+                    print(f"  {m}", flush=True)
+                failed = failed or bool(mismatches)
+            sys.exit(1 if failed else 0)
+        else:
+            sys.exit(f"unknown command: {command}")
+    finally:
+        session.close()
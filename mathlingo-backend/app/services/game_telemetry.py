@@ -0,0 +1,188 @@
+"""
+Приём телеметрии мини-игр (POST /api/games/events) — разбор тела батча и
+массовая вставка событий. Раньше роут делал db.add(GameEvent(...)) на
+каждое событие: на 5 событиях незаметно, на сотнях за один flush клиента —
+сотни ORM-объектов и INSERT'ов. Здесь события пишутся одним executemany
+через Core (SQLite, тесты) или одним COPY (Postgres).
+
+Известные поля payload (level_id, stars, ходы/тики) при вставке
+раскладываются в типизированные колонки — по ним аналитика считает
+агрегаты в SQL (extract_fields).
+
+Тело батча — обычный JSON (GameEventsBatchRequest) или NDJSON: первая строка —
+заголовок батча ({"game_id", "session_id", "end_session", "batch_id"}),
+каждая следующая — одно событие. Оба варианта можно прислать сжатыми
+(Content-Encoding: gzip) — офлайн-очередь копит батчи, и на мобильной сети
+сжатие окупается.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.models import GameEvent, GameEventBatch
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+# Потолок распакованного тела — gzip-бомба не должна раздуться в памяти
+# процесса. С запасом покрывает MAX_EVENTS_PER_BATCH событий (app/schemas.py).
+MAX_BATCH_BODY_BYTES = 4 * 1024 * 1024
+
+# Колонки, которые пишет вставка (порядок важен для COPY).
+_EVENT_COLUMNS = (
+    "session_id", "event_type", "payload", "client_ts", "created_at", "level_id", "stars", "metric",
+)
+
+
+def _completion_metric(payload: dict) -> Optional[float]:
+    """
+    Усилие на прохождение из payload level_complete: ходы (игра A) или тики
+    (игра B). В обеих играх меньше = лучше; имя поля разное, поэтому берём
+    первое присутствующее, а не завязываемся на конкретную игру.
+    """
+    for key in ("moves", "ticks"):
+        value = payload.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    return None
+
+
+def extract_fields(payload) -> dict:
+    """
+    Известные поля payload -> типизированные колонки GameEvent (level_id,
+    stars, metric), по которым аналитика агрегирует в SQL, не разбирая JSON.
+    Что не распознано — NULL; сам payload хранится как есть.
+    """
+    payload = payload if isinstance(payload, dict) else {}
+    level_id = payload.get("level_id")
+    stars = payload.get("stars")
+    return {
+        # Пустой level_id — то же, что отсутствующий (аналитика кладёт оба в "—").
+        "level_id": str(level_id) if level_id else None,
+        "stars": stars if isinstance(stars, int) and not isinstance(stars, bool) else None,
+        "metric": _completion_metric(payload),
+    }
+
+
+def _gunzip(raw: bytes) -> bytes:
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(raw, MAX_BATCH_BODY_BYTES + 1)
+    except zlib.error:
+        raise ValueError("Некорректное gzip-тело")
+    if len(data) > MAX_BATCH_BODY_BYTES or decompressor.unconsumed_tail:
+        raise ValueError("Тело батча слишком большое")
+    return data
+
+
+def decode_batch_body(raw: bytes, content_type: str = "", content_encoding: str = "") -> dict:
+    """
+    Тело запроса -> dict в форме GameEventsBatchRequest (валидирует уже
+    вызывающий). ValueError — тело не разбирается (битый gzip/JSON).
+    """
+    if content_encoding.strip().lower() == "gzip":
+        raw = _gunzip(raw)
+    elif len(raw) > MAX_BATCH_BODY_BYTES:
+        raise ValueError("Тело батча слишком большое")
+
+    try:
+        text = raw.decode("utf-8")
+        if content_type.split(";")[0].strip().lower() in NDJSON_CONTENT_TYPES:
+            lines = [line for line in text.splitlines() if line.strip()]
+            if not lines:
+                raise ValueError("Пустой NDJSON-батч")
+            header = json.loads(lines[0])
+            if not isinstance(header, dict):
+                raise ValueError("Первая строка NDJSON должна быть заголовком батча")
+            return {**header, "events": [json.loads(line) for line in lines[1:]]}
+        return json.loads(text)
+    except UnicodeDecodeError:
+        raise ValueError("Тело батча не в UTF-8")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Некорректный JSON: {e.msg}")
+
+
+def find_batch(db: Session, user_id: int, batch_id: str) -> Optional[GameEventBatch]:
+    return (
+        db.query(GameEventBatch)
+        .filter(GameEventBatch.user_id == user_id, GameEventBatch.batch_id == batch_id)
+        .first()
+    )
+
+
+def record_batch(db: Session, user_id: int, batch_id: str, session_id: int, accepted: int) -> None:
+    """
+    Фиксирует batch_id и сразу flush'ит: параллельный ретрай того же батча
+    упрётся в уникальный (user_id, batch_id) здесь, ДО вставки событий
+    (IntegrityError ловит роут и отвечает сохранённым результатом).
+    """
+    db.add(GameEventBatch(user_id=user_id, batch_id=batch_id, session_id=session_id, accepted=accepted))
+    db.flush()
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # client_ts — наивная колонка (как и остальные времена в моделях, UTC).
+    # Смещение клиента переводим в UTC сами: COPY в timestamp без зоны его
+    # молча отбросил бы, а SQLite — хранил бы местное время как есть.
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _copy_rows(db: Session, rows: list[dict]) -> None:
+    # CSV-формат COPY: пустое некавыченное поле = NULL, поэтому None пишем как
+    # пустую строку (event_type пустым не бывает — min_length=1 в схеме).
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            row["session_id"],
+            row["event_type"],
+            json.dumps(row["payload"]) if row["payload"] is not None else None,
+            row["client_ts"].isoformat() if row["client_ts"] is not None else None,
+            row["created_at"].isoformat(),
+            row["level_id"],
+            row["stars"],
+            row["metric"],
+        ])
+    buffer.seek(0)
+
+    # То же соединение (и транзакция), что у сессии — COPY коммитится вместе
+    # с сессией игры и записью батча.
+    dbapi_connection = db.connection().connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {GameEvent.__tablename__} ({', '.join(_EVENT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+
+def insert_events(db: Session, session_id: int, events: list) -> int:
+    """
+    Массовая вставка событий батча (GameEventIn из app/schemas.py) в
+    game_events. Не коммитит. Возвращает число записанных событий.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            "session_id": session_id,
+            "event_type": ev.event_type,
+            "payload": ev.payload,
+            "client_ts": _naive_utc(ev.client_ts),
+            "created_at": now,
+            **extract_fields(ev.payload),
+        }
+        for ev in events
+    ]
+    if not rows:
+        return 0
+
+    if db.get_bind().dialect.name == "postgresql":
+        _copy_rows(db, rows)
+    else:
+        db.execute(GameEvent.__table__.insert(), rows)
+    return len(rows)
@@ -4,13 +4,23 @@
 играх 3★ = идеальное прохождение). Сводный лидерборд — по всем играм, частный
 — по одной game_id. Ничьи разрешаем по числу пройденных уровней, затем по id
 (детерминированно).
+
+Ограничение: rebuild() восстанавливает из SQL только all-time рейтинги.
+Рейтинги за неделю/месяц/сезон живут лишь в дневных бакетах Redis — в
+user_game_progress нет истории приростов по дням, восстанавливать их не из
+чего. После потери Redis (flush, сбой без персистентности) периодные
+рейтинги пусты и заново набираются по мере новых приростов.
 """
 from collections import defaultdict
+from datetime import date, datetime, timedelta
 from typing import Optional
 
+import redis
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.models import User, UserGameProgress
+from app.services import cache
 
 
 def compute_leaderboard(
@@ -54,3 +64,371 @@ def compute_leaderboard(
         me = next((e for e in ranked if e["user_id"] == current_user_id), None)
 
     return {"game_id": game_id, "entries": ranked[:limit], "me": me}
+
+
+# ---------------------------------------------------------------------------
+# Redis-лидерборд: compute_leaderboard выше грузит весь user_game_progress на
+# каждый запрос. Здесь тот же рейтинг поддерживается инкрементально в ZSET'ах
+# (по одному на игру + сводный) — топ-N и позиция игрока за O(log n).
+# compute_leaderboard остаётся эталоном: с ним сверяется check_consistency()
+# и из SQL строится rebuild().
+#
+# Порядок тот же: звёзды desc, уровни desc, user_id asc. Звёзды и уровни
+# упакованы в score (stars * LEVELS_FACTOR + levels — целые, в double точны),
+# тайбрейк по id — в member: при равном score ZREVRANGE отдаёт member'ы в
+# обратном лексикографическом порядке, поэтому member = (MEMBER_ID_BASE - id)
+# фиксированной ширины, и меньший id оказывается выше.
+# ---------------------------------------------------------------------------
+
+ZSET_PREFIX = "leaderboard"
+GLOBAL_KEY = f"{ZSET_PREFIX}:global"
+# Есть ли вообще построенный рейтинг (после rebuild). Без него ZSET'ы могли
+# не существовать или устареть (Redis очищен) — читать их нельзя.
+READY_KEY = f"{ZSET_PREFIX}:ready"
+# Какие игры уже есть в ZSET'ах — чтобы rebuild мог убрать ключи игр без
+# прогресса, не сканируя keyspace.
+GAMES_KEY = f"{ZSET_PREFIX}:games"
+
+LEVELS_FACTOR = 1_000_000
+MEMBER_ID_BASE = 10 ** 12
+_MEMBER_WIDTH = 12
+
+
+def _zset_key(game_id: Optional[str]) -> str:
+    return f"{ZSET_PREFIX}:game:{game_id}" if game_id is not None else GLOBAL_KEY
+
+
+def _member(user_id: int) -> str:
+    return f"{MEMBER_ID_BASE - user_id:0{_MEMBER_WIDTH}d}"
+
+
+def _member_user_id(member: str) -> int:
+    return MEMBER_ID_BASE - int(member)
+
+
+def _score(stars: int, levels: int) -> int:
+    return stars * LEVELS_FACTOR + levels
+
+
+def _scope(game_id: Optional[str]) -> str:
+    return f"game:{game_id}" if game_id is not None else "global"
+
+
+def _day_bucket_key(day: date, game_id: Optional[str]) -> str:
+    return f"{ZSET_PREFIX}:day:{day.isoformat()}:{_scope(game_id)}"
+
+
+def record_progress(
+        game_id: str,
+        user_id: int,
+        stars_delta: int,
+        levels_delta: int,
+        today: Optional[date] = None,
+) -> None:
+    """
+    Вызывается после коммита апсерта прогресса (app/routes/games.py), только
+    когда рейтинг реально изменился: новый уровень (levels_delta=1) или
+    больше звёзд на уже пройденном. Улучшение только метрики рейтинг не
+    меняет. Тот же прирост пишется в дневной бакет — из них собираются
+    рейтинги за период (см. ниже).
+    """
+    if not stars_delta and not levels_delta:
+        return
+    today = today or datetime.utcnow().date()
+    increment = _score(stars_delta, levels_delta)
+    member = _member(user_id)
+    pipe = cache.get_client().pipeline(transaction=False)
+    pipe.zincrby(_zset_key(game_id), increment, member)
+    pipe.zincrby(GLOBAL_KEY, increment, member)
+    pipe.sadd(GAMES_KEY, game_id)
+    for key in (_day_bucket_key(today, game_id), _day_bucket_key(today, None)):
+        pipe.zincrby(key, increment, member)
+        pipe.expire(key, BUCKET_TTL_SECONDS)
+    pipe.execute()
+
+
+def record_progress_or_invalidate(game_id: str, user_id: int, stars_delta: int, levels_delta: int) -> None:
+    """
+    record_progress для роутов после commit: прогресс уже сохранён, и сбой
+    Redis не должен превращать ответ в 500 — ретрай клиента дал бы
+    stars_delta == 0, и прирост потерялся бы насовсем. Вместо этого
+    снимаем READY_KEY: ближайшее чтение рейтинга сделает rebuild из SQL.
+    """
+    try:
+        record_progress(game_id, user_id, stars_delta, levels_delta)
+    except redis.RedisError as e:
+        print(f"leaderboard: record_progress failed for user {user_id}: {e!r}", flush=True)
+        try:
+            cache.get_client().delete(READY_KEY)
+        except redis.RedisError:
+            # Redis недоступен целиком — и запись, и READY_KEY пропали вместе с
+            # ним; после восстановления нужен ручной rebuild.
+            pass
+
+
+def remove_user(user_id: int, today: Optional[date] = None) -> None:
+    """
+    Убирает удалённого пользователя из всех ZSET'ов: all-time (сводного и
+    по играм), дневных бакетов за BUCKET_TTL_SECONDS и закешированных на
+    сегодня слияний прошедших дней окна. Иначе он оставался бы в рейтинге
+    строкой «—» до следующего rebuild.
+    """
+    today = today or datetime.utcnow().date()
+    client = cache.get_client()
+    member = _member(user_id)
+    scopes = [None, *client.smembers(GAMES_KEY)]
+    pipe = client.pipeline(transaction=False)
+    for game_id in scopes:
+        pipe.zrem(_zset_key(game_id), member)
+        for days_ago in range(BUCKET_TTL_SECONDS // (24 * 3600) + 1):
+            pipe.zrem(_day_bucket_key(today - timedelta(days=days_ago), game_id), member)
+        for period in PERIODS[1:]:
+            pipe.delete(f"{ZSET_PREFIX}:past:{period}:{today.isoformat()}:{_scope(game_id)}")
+    pipe.execute()
+
+
+def remove_user_or_invalidate(user_id: int) -> None:
+    """remove_user для роута после commit — как record_progress_or_invalidate."""
+    try:
+        remove_user(user_id)
+    except redis.RedisError as e:
+        print(f"leaderboard: remove_user failed for user {user_id}: {e!r}", flush=True)
+        try:
+            cache.get_client().delete(READY_KEY)
+        except redis.RedisError:
+            pass
+
+
+def rebuild(db: Session) -> None:
+    """
+    Строит все ZSET'ы заново из user_game_progress одним GROUP BY: сначала
+    во временные ключи, затем RENAME — читатели не видят полупустой рейтинг.
+    Апсерт, закоммиченный между чтением SQL и RENAME, потеряет свой
+    инкремент (check_consistency это покажет, повторный rebuild починит) —
+    поэтому rebuild запускается редко: при первом чтении и вручную.
+    Дневные бакеты периодных рейтингов не трогает (см. docstring модуля).
+    """
+    rows = (
+        db.query(
+            UserGameProgress.game_id,
+            UserGameProgress.user_id,
+            func.sum(UserGameProgress.best_stars),
+            func.count(UserGameProgress.id),
+        )
+        .group_by(UserGameProgress.game_id, UserGameProgress.user_id)
+        .all()
+    )
+
+    per_game: dict[str, dict[str, int]] = defaultdict(dict)
+    totals: dict[int, list] = defaultdict(lambda: [0, 0])
+    for game_id, user_id, stars, levels in rows:
+        per_game[game_id][_member(user_id)] = _score(int(stars or 0), levels)
+        totals[user_id][0] += int(stars or 0)
+        totals[user_id][1] += levels
+    global_scores = {_member(uid): _score(stars, levels) for uid, (stars, levels) in totals.items()}
+
+    client = cache.get_client()
+    stale_games = set(client.smembers(GAMES_KEY)) - set(per_game)
+
+    pipe = client.pipeline(transaction=True)
+    for game_id, scores in per_game.items():
+        tmp_key = f"{_zset_key(game_id)}:rebuild"
+        pipe.delete(tmp_key)
+        pipe.zadd(tmp_key, scores)
+        pipe.rename(tmp_key, _zset_key(game_id))
+    for game_id in stale_games:
+        pipe.delete(_zset_key(game_id))
+    if global_scores:
+        pipe.delete(f"{GLOBAL_KEY}:rebuild")
+        pipe.zadd(f"{GLOBAL_KEY}:rebuild", global_scores)
+        pipe.rename(f"{GLOBAL_KEY}:rebuild", GLOBAL_KEY)
+    else:
+        pipe.delete(GLOBAL_KEY)
+    pipe.delete(GAMES_KEY)
+    if per_game:
+        pipe.sadd(GAMES_KEY, *per_game)
+    pipe.set(READY_KEY, "1")
+    pipe.execute()
+
+
+def _entry(rank: int, member: str, score: float, usernames: dict) -> dict:
+    stars, levels = divmod(int(score), LEVELS_FACTOR)
+    user_id = _member_user_id(member)
+    return {
+        "rank": rank,
+        "user_id": user_id,
+        "username": usernames.get(user_id, "—"),
+        "stars": stars,
+        "levels_completed": levels,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Рейтинги за период (неделя / месяц / сезон). Календарные, по UTC: неделя —
+# с понедельника, месяц — с 1-го числа, сезон — календарный квартал. Рейтинг
+# периода = звёзды и новые уровни, НАБРАННЫЕ за период (приросты из
+# record_progress), а не итог на конец периода.
+#
+# Источник — дневные бакеты (ZSET на день и игру + сводный), которые
+# record_progress пишет рядом с all-time ZSET'ами; бакет сам истекает по TTL,
+# когда выходит за самый длинный период. Окно считается слиянием бакетов
+# (ZUNIONSTORE), без чтения истории из SQL: прошедшие дни окна уже не
+# меняются, поэтому их объединение кэшируется до конца дня, и на запрос
+# остаётся слить его с одним сегодняшним бакетом.
+# ---------------------------------------------------------------------------
+
+PERIODS = ("all", "week", "month", "season")
+
+# Самый длинный период — квартал (до 92 дней) + запас на границу суток.
+BUCKET_TTL_SECONDS = 93 * 24 * 3600
+# Сколько живёт ключ-результат слияния окна — только на время запроса.
+WINDOW_RESULT_TTL = 60
+
+
+def _window_start(period: str, today: date) -> date:
+    if period == "week":
+        return today - timedelta(days=today.weekday())
+    if period == "month":
+        return today.replace(day=1)
+    # season — календарный квартал
+    return date(today.year, 3 * ((today.month - 1) // 3) + 1, 1)
+
+
+def _window_sources(period: str, game_id: Optional[str], today: date) -> tuple[str, list[str]]:
+    """
+    Ключ-результат окна и бакеты, из которых его сливать. Прошедшие дни
+    окна сливаются здесь же (и кэшируются до конца дня); сегодняшний бакет
+    сливает с ними вызывающий — в одной MULTI с чтением результата.
+    """
+    client = cache.get_client()
+    scope = _scope(game_id)
+    start = _window_start(period, today)
+
+    sources = [_day_bucket_key(today, game_id)]
+    past_days = [start + timedelta(days=i) for i in range((today - start).days)]
+    if past_days:
+        past_key = f"{ZSET_PREFIX}:past:{period}:{today.isoformat()}:{scope}"
+        # Пустое слияние Redis не хранит (ключа нет) — без маркера тихий
+        # период пересливался бы на каждый запрос.
+        empty_marker = f"{past_key}:empty"
+        if not client.exists(past_key, empty_marker):
+            merged = client.zunionstore(past_key, [_day_bucket_key(d, game_id) for d in past_days])
+            seconds_to_midnight = (
+                datetime.combine(today + timedelta(days=1), datetime.min.time()) - datetime.utcnow()
+            ).total_seconds()
+            ttl = max(60, int(seconds_to_midnight) + 60)
+            if merged:
+                client.expire(past_key, ttl)
+            else:
+                client.set(empty_marker, "1", ex=ttl)
+        sources.append(past_key)
+
+    # День в ключе: около полуночи запросы «вчера» и «сегодня» пишут разные
+    # ключи, а не перетирают один общий.
+    return f"{ZSET_PREFIX}:window:{period}:{today.isoformat()}:{scope}", sources
+
+
+def get_leaderboard(
+        db: Session,
+        game_id: Optional[str] = None,
+        limit: int = 20,
+        current_user_id: Optional[int] = None,
+        period: str = "all",
+        today: Optional[date] = None,
+) -> dict:
+    """
+    То же, что compute_leaderboard, но из ZSET'ов: ZREVRANGE топа + ZREVRANK
+    игрока. period != "all" — рейтинг за неделю/месяц/сезон из дневных бакетов.
+    """
+    client = cache.get_client()
+    # Слияние окна и все чтения — одной MULTI: параллельный запрос того же
+    # окна не перетрёт результат между ZREVRANGE и ZREVRANK.
+    pipe = client.pipeline(transaction=True)
+    if period == "all":
+        if not client.exists(READY_KEY):
+            rebuild(db)
+        key = _zset_key(game_id)
+    else:
+        key, sources = _window_sources(period, game_id, today or datetime.utcnow().date())
+        pipe.zunionstore(key, sources)
+        pipe.expire(key, WINDOW_RESULT_TTL)
+    pipe.zrevrange(key, 0, limit - 1, withscores=True)
+    if current_user_id is not None:
+        pipe.zrevrank(key, _member(current_user_id))
+        pipe.zscore(key, _member(current_user_id))
+    results = pipe.execute()
+
+    me_rank = me_score = None
+    if current_user_id is not None:
+        top, me_rank, me_score = results[-3:]
+    else:
+        top = results[-1]
+
+    user_ids = {_member_user_id(member) for member, _ in top}
+    if me_rank is not None:
+        user_ids.add(current_user_id)
+    usernames = {}
+    if user_ids:
+        usernames = {
+            u.id: u.username
+            for u in db.query(User.id, User.username).filter(User.id.in_(user_ids))
+        }
+
+    entries = [_entry(i + 1, member, score, usernames) for i, (member, score) in enumerate(top)]
+    me = None
+    if me_rank is not None:
+        me = _entry(me_rank + 1, _member(current_user_id), me_score, usernames)
+
+    return {"game_id": game_id, "period": period, "entries": entries, "me": me}
+
+
+def check_consistency(db: Session, game_id: Optional[str] = None) -> list[dict]:
+    """
+    Сверяет ZSET с эталонным compute_leaderboard по всем игрокам. Возвращает
+    расхождения ([] — рейтинги совпадают позиция в позицию).
+    """
+    expected = compute_leaderboard(db, game_id=game_id, limit=MEMBER_ID_BASE)["entries"]
+    actual = [
+        _entry(i + 1, member, score, {})
+        for i, (member, score) in enumerate(
+            cache.get_client().zrevrange(_zset_key(game_id), 0, -1, withscores=True)
+        )
+    ]
+
+    fields = ("rank", "user_id", "stars", "levels_completed")
+    mismatches = []
+    for position in range(max(len(expected), len(actual))):
+        exp = {f: expected[position][f] for f in fields} if position < len(expected) else None
+        act = {f: actual[position][f] for f in fields} if position < len(actual) else None
+        if exp != act:
+            mismatches.append({"position": position + 1, "expected": exp, "actual": act})
+    return mismatches
+
+
+if __name__ == "__main__":
+    # python -m app.services.leaderboard rebuild   — пересобрать ZSET'ы из SQL
+    # python -m app.services.leaderboard check     — сверить с эталоном
+    import sys
+
+    from app.database import SessionLocal
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    session = SessionLocal()
+    try:
+        if command == "rebuild":
+            rebuild(session)
+            print("leaderboard: rebuilt", flush=True)
+        elif command == "check":
+            game_ids = [None] + sorted(cache.get_client().smembers(GAMES_KEY))
+            failed = False
+            for gid in game_ids:
+                mismatches = check_consistency(session, gid)
+                print(f"leaderboard[{gid or 'global'}]: {len(mismatches)} mismatches", flush=True)
+                for m in mismatches[:10]:
+                    print(f"  {m}", flush=True)
+                failed = failed or bool(mismatches)
+            sys.exit(1 if failed else 0)
+        else:
+            sys.exit(f"unknown command: {command}")
+    finally:
+        session.close()
@@ -53,12 +53,75 @@ def _determine_level(accuracy: float, avg_time_ratio: Optional[float], hints_rat
     return "standard"
 
 
-def recompute(db: Session, user_id: int, skill_id: int) -> Optional[MasteryState]:
+def _time_ratio(time_spent_ms: Optional[int], estimated_time_seconds: Optional[int]) -> Optional[float]:
+    if time_spent_ms is None or not estimated_time_seconds:
+        return None
+    return (time_spent_ms / 1000) / estimated_time_seconds
+
+
+def _window_entry(attempt: Attempt, estimated_time_seconds: Optional[int]) -> list:
     """
-    Пересчитывает и сохраняет mastery_state для (user_id, skill_id) по
-    последним WINDOW_SIZE попыткам. Возвращает None, если попыток вообще
-    нет — нечего считать, старое состояние (если было) не трогаем.
+    Одна позиция кольцевого буфера MasteryState.window_buffer — ровно те
+    сигналы попытки, из которых считаются factors, без повторного похода в
+    attempts/tasks: [attempt_id, created_at, correct, hinted, time_ratio].
+    attempt_id и created_at нужны только для порядка внутри окна (тот же
+    ключ сортировки, что у полного пересчёта) и window_from/window_to.
     """
+    return [
+        attempt.id,
+        attempt.created_at.isoformat(),
+        1 if attempt.is_correct else 0,
+        1 if attempt.hints_used > 0 else 0,
+        _time_ratio(attempt.time_spent_ms, estimated_time_seconds),
+    ]
+
+
+def _entry_sort_key(entry: list):
+    return datetime.fromisoformat(entry[1]), entry[0]
+
+
+def _apply_window(state: MasteryState, window: list) -> None:
+    """
+    Пересчитывает поля state по буферу (отсортирован от новой попытки к
+    старой, длина <= WINDOW_SIZE). Порядок суммирования time_ratio тот же,
+    что был у запроса по attempts — результат бит-в-бит совпадает с полным
+    пересчётом (это и проверяют golden-тесты через recompute()).
+    """
+    sample_size = len(window)
+    accuracy = sum(entry[2] for entry in window) / sample_size
+    hints_rate = sum(entry[3] for entry in window) / sample_size
+
+    time_ratios = [entry[4] for entry in window if entry[4] is not None]
+    avg_time_ratio = sum(time_ratios) / len(time_ratios) if time_ratios else None
+
+    state.level = _determine_level(accuracy, avg_time_ratio, hints_rate)
+    state.confidence = round(min(1.0, sample_size / FULL_CONFIDENCE_SAMPLES) * 100)
+    state.sample_size = sample_size
+    state.factors = {
+        "accuracy": round(accuracy, 3),
+        "avg_time_ratio": round(avg_time_ratio, 3) if avg_time_ratio is not None else None,
+        "hints_rate": round(hints_rate, 3),
+    }
+    # Новый список, а не мутация на месте — иначе SQLAlchemy не заметит
+    # изменения JSON-колонки.
+    state.window_buffer = list(window)
+    # window отсортирован desc: [0] — самая новая попытка в окне, [-1] — самая старая
+    state.window_to = datetime.fromisoformat(window[0][1])
+    state.window_from = datetime.fromisoformat(window[-1][1])
+    state.updated_at = datetime.utcnow()
+
+
+def _get_state_for_update(db: Session, user_id: int, skill_id: int) -> Optional[MasteryState]:
+    return (
+        db.query(MasteryState)
+        .filter(MasteryState.user_id == user_id, MasteryState.skill_id == skill_id)
+        .with_for_update()
+        .first()
+    )
+
+
+def _rebuild(db: Session, user_id: int, skill_id: int) -> Optional[MasteryState]:
+    """Полный пересчёт по attempts без commit — общий для recompute() и apply_attempt()."""
     attempts = (
         db.query(Attempt)
         .filter(Attempt.user_id == user_id, Attempt.skill_id == skill_id)
@@ -69,49 +132,98 @@ def recompute(db: Session, user_id: int, skill_id: int) -> Optional[MasteryState
     if not attempts:
         return None
 
-    sample_size = len(attempts)
-    accuracy = sum(1 for a in attempts if a.is_correct) / sample_size
-    hints_rate = sum(1 for a in attempts if a.hints_used > 0) / sample_size
-
-    time_ratios = []
-    for a in attempts:
-        if a.time_spent_ms is None:
-            continue
-        task = db.query(Task).filter(Task.id == a.content_id).first()
-        if task and task.estimated_time_seconds:
-            time_ratios.append((a.time_spent_ms / 1000) / task.estimated_time_seconds)
-    avg_time_ratio = sum(time_ratios) / len(time_ratios) if time_ratios else None
+    # estimated_time_seconds — одним запросом на всё окно, а не по запросу
+    # на попытку. Только для content_type="task": у игровых/диагностических
+    # попыток content_id смотрит на другие таблицы, и совпадение с id
+    # какого-то Task было бы случайным.
+    task_ids = {
+        a.content_id for a in attempts
+        if a.content_type == "task" and a.time_spent_ms is not None
+    }
+    estimated_by_task_id = dict(
+        db.query(Task.id, Task.estimated_time_seconds).filter(Task.id.in_(task_ids)).all()
+    ) if task_ids else {}
 
-    level = _determine_level(accuracy, avg_time_ratio, hints_rate)
-    confidence = round(min(1.0, sample_size / FULL_CONFIDENCE_SAMPLES) * 100)
+    window = [
+        _window_entry(a, estimated_by_task_id.get(a.content_id) if a.content_type == "task" else None)
+        for a in attempts
+    ]
 
-    state = (
-        db.query(MasteryState)
-        .filter(MasteryState.user_id == user_id, MasteryState.skill_id == skill_id)
-        .first()
-    )
+    state = _get_state_for_update(db, user_id, skill_id)
     if not state:
         state = MasteryState(user_id=user_id, skill_id=skill_id)
         db.add(state)
+    _apply_window(state, window)
+    return state
 
-    state.level = level
-    state.confidence = confidence
-    state.sample_size = sample_size
-    state.factors = {
-        "accuracy": round(accuracy, 3),
-        "avg_time_ratio": round(avg_time_ratio, 3) if avg_time_ratio is not None else None,
-        "hints_rate": round(hints_rate, 3),
-    }
-    # attempts отсортированы desc: [0] — самая новая попытка в окне, [-1] — самая старая
-    state.window_to = attempts[0].created_at
-    state.window_from = attempts[-1].created_at
-    state.updated_at = datetime.utcnow()
+
+def recompute(db: Session, user_id: int, skill_id: int) -> Optional[MasteryState]:
+    """
+    Полный пересчёт mastery_state для (user_id, skill_id) по последним
+    WINDOW_SIZE попыткам из attempts — эталон, с которым обязан совпадать
+    инкрементальный apply_attempt(). Нужен там, где попыток сразу много
+    (диагностика) или буфера ещё нет. Возвращает None, если попыток вообще
+    нет — нечего считать, старое состояние (если было) не трогаем.
+    """
+    state = _rebuild(db, user_id, skill_id)
+    if state is None:
+        return None
 
     db.commit()
     db.refresh(state)
     return state
 
 
+def apply_attempt(
+        db: Session,
+        attempt: Attempt,
+        estimated_time_seconds: Optional[int] = None,
+) -> Optional[MasteryState]:
+    """
+    Инкрементальное обновление mastery_state одной новой попыткой: один
+    read-modify-write строки состояния (SELECT ... FOR UPDATE) вместо
+    перечитывания окна из attempts и запроса Task на каждую попытку.
+    attempt должен быть уже flush'нут (нужны id и created_at);
+    estimated_time_seconds передаёт вызывающий — задание у него уже
+    загружено. Не коммитит: попытка, очки и mastery уходят одной
+    транзакцией вызывающего.
+
+    Если буфера ещё нет (строки нет или она записана до появления
+    window_buffer) — падаем в полный пересчёт, дальше работает буфер.
+    """
+    return apply_attempts(db, [(attempt, estimated_time_seconds)])
+
+
+def apply_attempts(
+        db: Session,
+        attempts: list[tuple[Attempt, Optional[int]]],
+) -> Optional[MasteryState]:
+    """
+    То же, что apply_attempt(), но для пачки попыток ОДНОГО (user, skill) —
+    [(attempt, estimated_time_seconds), ...]: все они сливаются в буфер за
+    один read-modify-write (батч-сабмит группы заданий, воркер очереди
+    попыток), а не пересчитывают состояние по разу на попытку.
+    """
+    if not attempts or attempts[0][0].skill_id is None:
+        return None
+    user_id, skill_id = attempts[0][0].user_id, attempts[0][0].skill_id
+
+    state = _get_state_for_update(db, user_id, skill_id)
+    if state is None or state.window_buffer is None:
+        return _rebuild(db, user_id, skill_id)
+
+    entries = [
+        _window_entry(a, estimated if a.content_type == "task" else None)
+        for a, estimated in attempts
+    ]
+    # Обычно новые попытки — самые свежие и встают в начало; сортировка по
+    # тому же ключу, что ORDER BY в _rebuild, покрывает и попытки с
+    # created_at "из прошлого" (они либо встают внутрь окна, либо отсекаются).
+    window = sorted(state.window_buffer + entries, key=_entry_sort_key, reverse=True)
+    _apply_window(state, window[:WINDOW_SIZE])
+    return state
+
+
 def is_adjacent_level(a: str, b: str) -> bool:
     """basic<->standard и standard<->advanced — соседние; basic<->advanced — нет."""
     return abs(LEVELS_ORDER.index(a) - LEVELS_ORDER.index(b)) == 1
@@ -0,0 +1,152 @@
+"""
+Кеш токен -> принципал для get_current_user/get_admin_current_user
+(app/auth.py). Раньше каждый авторизованный запрос после проверки JWT шёл в
+БД за User по email, а admin-зависимость — до трёх запросов (Admin, User,
+снова Admin). Теперь по sha256 токена в кеше лежат id, email, is_active (и
+role у админа), и зависимость собирает из них ORM-объект без SELECT:
+остальные поля догрузятся из БД, только если роут к ним обратится.
+
+Гарантия «деактивация действует сразу» держится на поколении
+пространства имён по email (cache.bump_namespace): запись валидна, только
+пока её поколение совпадает с текущим, а текущее читается прямо из Redis
+(strict), мимо локального уровня. Поколение читается ДО похода в БД —
+иначе деактивация между чтением строки и записью в кеш потерялась бы.
+Деактивацию/удаление в app/routes/admin.py сопровождает invalidate(email).
+
+invalidate зовётся после commit, поэтому не бросает: изменение уже в БД, и
+500 на него было бы враньём. Если Redis не принял бамп и после повторов,
+email остаётся в _pending: пока бамп не подтверждён, этот процесс кешем не
+пользуется вовсе (каждый resolve сначала досылает _pending), а фоновый
+таймер повторяет бамп раз в PENDING_RETRY_SECONDS — иначе после
+возвращения Redis другие воркеры до AUTH_PRINCIPAL_CACHE_TTL_SECONDS
+пускали бы деактивированного по старой записи.
+"""
+import hashlib
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+
+import redis
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app import config
+from app.models import Admin, User
+from app.services import cache
+
+PRINCIPAL_PREFIX = "auth_principal"
+
+# Что кешируется — то, что auth-зависимости и RBAC проверяют сами.
+_CACHED_COLUMNS = {
+    User: ("id", "email", "is_active"),
+    Admin: ("id", "email", "role", "is_active"),
+}
+
+M = TypeVar("M", User, Admin)
+
+INVALIDATE_ATTEMPTS = 3
+INVALIDATE_RETRY_SECONDS = 0.05
+PENDING_RETRY_SECONDS = 1.0
+
+# email -> неподтверждённый бамп поколения (см. docstring модуля).
+_pending: set[str] = set()
+_pending_lock = threading.Lock()
+_retry_timer: Optional[threading.Timer] = None
+
+
+def _token_key(model, token: str) -> str:
+    return f"{PRINCIPAL_PREFIX}:{model.__tablename__}:{hashlib.sha256(token.encode()).hexdigest()}"
+
+
+def _namespace(email: str) -> str:
+    return f"{PRINCIPAL_PREFIX}:{email}"
+
+
+def _cached(db: Session, model: type[M], token: str, email: str) -> Optional[M]:
+    entry = cache.get_json(_token_key(model, token))
+    if entry is None or entry["generation"] != cache.namespace_generation(_namespace(email), strict=True):
+        return None
+    principal = model(**entry["fields"])
+    make_transient_to_detached(principal)
+    # load=False — в сессию без SELECT; незагруженные поля — ленивые.
+    return db.merge(principal, load=False)
+
+
+def resolve(db: Session, model: type[M], token: str, email: str, load: Callable[[], M]) -> M:
+    """
+    Принципал по уже проверенному токену: из кеша или load() (запрос в БД;
+    может бросить HTTPException — такой исход не кешируется). Redis
+    недоступен — работаем как без кеша.
+    """
+    if not config.AUTH_PRINCIPAL_CACHE_ENABLED:
+        return load()
+    if _pending and not _flush_pending():
+        return load()
+    try:
+        principal = _cached(db, model, token, email)
+        if principal is not None:
+            return principal
+        generation = cache.namespace_generation(_namespace(email), strict=True)
+    except redis.RedisError:
+        return load()
+
+    principal = load()
+    entry = {
+        "fields": {column: getattr(principal, column) for column in _CACHED_COLUMNS[model]},
+        "generation": generation,
+    }
+    try:
+        cache.set_json(_token_key(model, token), entry, ttl=config.AUTH_PRINCIPAL_CACHE_TTL_SECONDS)
+    except redis.RedisError:
+        pass
+    return principal
+
+
+def invalidate(email: str) -> None:
+    """
+    Все закешированные токены этого email (user и admin) перестают
+    действовать. Не бросает: неудавшийся бамп уходит в _pending.
+    """
+    for attempt in range(INVALIDATE_ATTEMPTS):
+        try:
+            cache.bump_namespace(_namespace(email))
+            return
+        except redis.RedisError as e:
+            error = e
+        if attempt + 1 < INVALIDATE_ATTEMPTS:
+            time.sleep(INVALIDATE_RETRY_SECONDS)
+    print(f"principal_cache: invalidate({email}) failed, retrying in background: {error!r}", flush=True)
+    with _pending_lock:
+        _pending.add(email)
+    _schedule_retry()
+
+
+def _flush_pending() -> bool:
+    """Досылает неподтверждённые бампы. True — _pending пуст."""
+    with _pending_lock:
+        emails = list(_pending)
+    for email in emails:
+        try:
+            cache.bump_namespace(_namespace(email))
+        except redis.RedisError:
+            return False
+        with _pending_lock:
+            _pending.discard(email)
+    return True
+
+
+def _retry_pending() -> None:
+    global _retry_timer
+    with _pending_lock:
+        _retry_timer = None
+    if not _flush_pending():
+        _schedule_retry()
+
+
+def _schedule_retry() -> None:
+    global _retry_timer
+    with _pending_lock:
+        if _retry_timer is not None:
+            return
+        _retry_timer = threading.Timer(PENDING_RETRY_SECONDS, _retry_pending)
+        _retry_timer.daemon = True
+        _retry_timer.start()
@@ -0,0 +1,67 @@
+"""
+Начисление очков в user_progress — общее для submit_answer
+(app/routes/gamification_tasks.py), игровых попыток
+(app/services/game_attempts.py) и воркера очереди попыток
+(app/services/attempt_ingest.py), чтобы ленивая инициализация строки не
+расходилась между ними.
+
+Раньше здесь был read-modify-write (progress.total_points += points):
+параллельные ответы одного ученика (несколько вкладок, игра + задание)
+читали одно и то же значение, и одно из начислений терялось. Теперь
+начисление — строка в points_ledger плюс атомарный UPDATE
+total_points = total_points + n: строку сводки не читают, база сама
+сериализует инкременты.
+"""
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import PointsLedgerEntry, UserProgress
+
+
+def _increment(db: Session, user_id: int, points: int) -> bool:
+    result = db.execute(
+        update(UserProgress)
+        .where(UserProgress.user_id == user_id)
+        .values(total_points=func.coalesce(UserProgress.total_points, 0) + points)
+        # Вызывающие строку сводки в сессии не держат — не синхронизируем.
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+
+def add_points(db: Session, user_id: int, points: int) -> None:
+    """
+    Прибавляет points к total_points ученика. Не коммитит — очки уходят
+    одной транзакцией с попыткой у вызывающего.
+    """
+    db.add(PointsLedgerEntry(user_id=user_id, points=points))
+    if _increment(db, user_id, points):
+        return
+
+    # UserProgress до этого создавался лениво только в get_map_data —
+    # если ученик решает задание, ни разу не открыв карту (например,
+    # прямой deep-link), строки могло не быть, и очки терялись молча.
+    # Вставка — в savepoint: параллельный первый ответ того же ученика
+    # мог успеть создать строку (uq_user_progress_user_id), тогда
+    # прибавляем к ней.
+    try:
+        with db.begin_nested():
+            db.add(UserProgress(user_id=user_id, current_level=1, total_points=points))
+    except IntegrityError:
+        _increment(db, user_id, points)
+
+
+def get_or_create(db: Session, user_id: int) -> UserProgress:
+    """Строка прогресса ученика; создаётся при первом обращении (не коммитит)."""
+    progress = db.query(UserProgress).filter(UserProgress.user_id == user_id).first()
+    if progress:
+        return progress
+    try:
+        with db.begin_nested():
+            progress = UserProgress(user_id=user_id, current_level=1, total_points=0)
+            db.add(progress)
+    except IntegrityError:
+        # Создал параллельный запрос (первое начисление или другая вкладка).
+        progress = db.query(UserProgress).filter(UserProgress.user_id == user_id).one()
+    return progress
@@ -0,0 +1,134 @@
+"""
+Кеш готовых HTTP-ответов: в Redis (и локальном уровне, см. cache.py) лежит
+уже сериализованное и сжатое тело вместе с ETag, а попадание отдаёт эти
+байты как есть с нужным Content-Encoding.
+
+Раньше закешированные роуты доставали JSON из Redis, разбирали его в
+Python-объекты, FastAPI сериализовал их обратно, а GZipMiddleware сжимал
+заново — на каждый запрос. Теперь сериализация и сжатие происходят один
+раз, при пересчёте значения; GZipMiddleware ответы с Content-Encoding
+пропускает.
+
+Тело хранится в вариантах identity / gzip / br (brotli — если пакет
+установлен; без него только gzip). response_model у роутов остаётся — для
+OpenAPI; сам ответ уже собран, FastAPI его не валидирует.
+"""
+import gzip
+import hashlib
+import json
+from typing import Any, Callable, Optional
+
+from fastapi import Request, Response
+
+from app.services import cache
+
+try:
+    import brotli
+except ImportError:  # необязательная зависимость
+    brotli = None
+
+# Меньше этого тела не сжимаем — как minimum_size у GZipMiddleware (main.py).
+MIN_COMPRESS_SIZE = 1000
+
+ETAG_FIELD = "etag"
+IDENTITY = "identity"
+# Порядок предпочтения, если клиент принимает несколько.
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Пометка «посчитано, но не кешировать» (cache_if) — в хранилище не попадает.
+_UNCACHEABLE_FIELD = "uncacheable"
+
+_static: dict[str, dict[str, bytes]] = {}
+
+
+def encode_payload(payload: Any) -> dict[str, bytes]:
+    """
+    JSON-совместимый payload -> поля для cache.set_fields: тело в каждом
+    поддерживаемом кодировании и ETag. Сериализация — как у JSONResponse
+    FastAPI, чтобы кешированный ответ не отличался от обычного.
+    """
+    body = json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    # Слабый ETag: варианты с разным Content-Encoding — одно и то же
+    # содержимое, но не побайтно.
+    fields = {IDENTITY: body, ETAG_FIELD: f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'.encode()}
+    if len(body) >= MIN_COMPRESS_SIZE:
+        fields["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            fields["br"] = brotli.compress(body, quality=11)
+    return fields
+
+
+def _qualities(accept_encoding: str) -> dict[str, float]:
+    qualities = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding] = quality
+    return qualities
+
+
+def negotiate(accept_encoding: str, fields: dict[str, bytes]) -> str:
+    """Лучшее из сохранённых кодирований, которое принимает клиент."""
+    qualities = _qualities(accept_encoding)
+    for coding in ENCODINGS:
+        if coding in fields and qualities.get(coding, qualities.get("*", 0.0)) > 0:
+            return coding
+    return IDENTITY
+
+
+def build_response(request: Request, fields: dict[str, bytes]) -> Response:
+    coding = negotiate(request.headers.get("accept-encoding", ""), fields)
+    # ETag версии содержимого (app/routes/_conditional.py), если роут его
+    # выставил, иначе — слабый ETag по хешу тела.
+    etag = getattr(request.state, "etag", None) or fields[ETAG_FIELD].decode()
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    if coding != IDENTITY:
+        headers["Content-Encoding"] = coding
+    return Response(content=fields[coding], media_type="application/json", headers=headers)
+
+
+def cached_response(
+        request: Request,
+        key: str,
+        compute: Callable[[], Any],
+        soft_ttl: int,
+        hard_ttl: int,
+        cache_if: Optional[Callable[[Any], bool]] = None,
+) -> Response:
+    """
+    Ответ по ключу с мягким/жёстким TTL (cache.get_or_refresh_fields).
+    compute() возвращает JSON-совместимый payload и, как в get_or_refresh,
+    не должен трогать сессию БД запроса. cache_if(payload) -> False —
+    ответ отдаётся, но не кешируется.
+    """
+    def compute_fields():
+        payload = compute()
+        fields = encode_payload(payload)
+        if cache_if is not None and not cache_if(payload):
+            fields[_UNCACHEABLE_FIELD] = b"1"
+        return fields
+
+    fields = cache.get_or_refresh_fields(
+        key, compute_fields, soft_ttl=soft_ttl, hard_ttl=hard_ttl,
+        cache_if=lambda f: _UNCACHEABLE_FIELD not in f,
+    )
+    return build_response(request, fields)
+
+
+def static_response(request: Request, name: str, compute: Callable[[], Any]) -> Response:
+    """
+    Для payload, неизменного за жизнь процесса (каталог игр): кодируется
+    один раз при первом запросе и держится в памяти без Redis и TTL.
+    """
+    fields = _static.get(name)
+    if fields is None:
+        fields = _static[name] = encode_payload(compute())
+    return build_response(request, fields)
@@ -0,0 +1,83 @@
+"""
+Бенчмарк auth-зависимостей (app/auth.py) с кешем принципалов и без него
+(AUTH_PRINCIPAL_CACHE_ENABLED): задержка одного вызова get_current_user и
+get_admin_current_user (admin-токен по пути user -> admin, три запроса без
+кеша).
+
+    python benchmarks/bench_auth_principal.py [--calls 2000] [--fake]
+
+По умолчанию — SQLite в памяти; DATABASE_URL на Postgres покажет реальную
+цену сетевых запросов (таблицы создаются через create_all — берите пустую
+базу). Redis — из REDIS_URL, --fake — fakeredis в памяти процесса.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-with-at-least-thirty-two-chars")
+
+from starlette.requests import Request  # noqa: E402
+
+from app import config  # noqa: E402
+from app.auth import create_access_token, get_admin_current_user, get_current_user  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import Admin, User  # noqa: E402
+from app.services import cache  # noqa: E402
+
+
+def _request(token: str) -> Request:
+    return Request({
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(b"authorization", f"Bearer {token}".encode())],
+    })
+
+
+def _run(label, dependency, token, calls):
+    request = _request(token)
+    timings = []
+    for _ in range(calls):
+        # Как в запросе: своя сессия на каждый вызов.
+        db = SessionLocal()
+        started = time.perf_counter()
+        dependency(request, db)
+        timings.append(time.perf_counter() - started)
+        db.close()
+    timings.sort()
+    p50 = statistics.median(timings) * 1e6
+    p99 = timings[int(len(timings) * 0.99) - 1] * 1e6
+    print(f"{label:<34} p50 {p50:8.1f} us   p99 {p99:8.1f} us", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--fake", action="store_true", help="fakeredis вместо REDIS_URL")
+    args = parser.parse_args()
+
+    if args.fake:
+        import fakeredis
+        cache._client = fakeredis.FakeRedis(decode_responses=True)
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(User(username="bench", email="bench@example.com", hashed_password="x"))
+    db.add(Admin(username="bench-admin", email="bench@example.com", hashed_password="x", role="superadmin"))
+    db.commit()
+    db.close()
+    # Пользовательский токен у админа — самый дорогой путь admin-зависимости.
+    token = create_access_token({"sub": "bench@example.com"})
+
+    print(f"dialect={engine.dialect.name} calls={args.calls}", flush=True)
+    for enabled in (False, True):
+        config.AUTH_PRINCIPAL_CACHE_ENABLED = enabled
+        suffix = "cache on" if enabled else "cache off"
+        _run(f"get_current_user, {suffix}", get_current_user, token, args.calls)
+        _run(f"get_admin_current_user, {suffix}", get_admin_current_user, token, args.calls)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Бенчмарк инвалидации группы ключей кеша при большом keyspace Redis: старый
+delete_prefix (SCAN по всем ключам + DELETE найденных) против
+cache.bump_namespace (один INCR поколения).
+
+    python benchmarks/bench_cache_invalidation.py [--keys 1000000] [--fake]
+
+Берёт Redis из REDIS_URL (как app/services/cache.py). --fake — fakeredis в
+памяти процесса, если настоящего Redis под рукой нет; его SCAN с MATCH
+квадратичен по числу ключей, поэтому с --fake берите --keys 20000 и меньше
+(на 20k ключей: SCAN + DELETE ~17 с, INCR ~0.15 мс).
+Перед замером заливает --keys посторонних ключей и 50 ключей группы;
+базу после себя не чистит — берите пустую (например, REDIS_URL=.../15).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import cache  # noqa: E402
+
+NAMESPACE = "bench_skills_list"
+GROUP_SIZE = 50
+
+
+def _fill(client, unrelated: int) -> None:
+    pipe = client.pipeline(transaction=False)
+    for i in range(unrelated):
+        pipe.set(f"bench_unrelated:{i}", "x")
+        if i % 10_000 == 9_999:
+            pipe.execute()
+    pipe.execute()
+
+
+def _scan_delete(client, prefix: str) -> int:
+    # Так работал cache.delete_prefix до пространств имён.
+    keys = list(client.scan_iter(f"{prefix}*"))
+    if keys:
+        client.delete(*keys)
+    return len(keys)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=1_000_000, help="посторонних ключей в Redis")
+    parser.add_argument("--fake", action="store_true", help="fakeredis вместо REDIS_URL")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.fake:
+        import fakeredis
+        cache._client = fakeredis.FakeRedis(decode_responses=True)
+    client = cache.get_client()
+
+    started = time.perf_counter()
+    _fill(client, args.keys)
+    print(f"filled {args.keys} unrelated keys in {time.perf_counter() - started:.1f}s", flush=True)
+
+    scan_times, incr_times = [], []
+    for _ in range(args.rounds):
+        for i in range(GROUP_SIZE):
+            client.set(f"{NAMESPACE}:old:{i}", "cached", ex=600)
+        started = time.perf_counter()
+        deleted = _scan_delete(client, f"{NAMESPACE}:old:")
+        scan_times.append(time.perf_counter() - started)
+        assert deleted == GROUP_SIZE
+
+        for i in range(GROUP_SIZE):
+            cache.set_json(cache.namespaced_key(NAMESPACE, i), "cached", ttl=600)
+        started = time.perf_counter()
+        cache.bump_namespace(NAMESPACE)
+        incr_times.append(time.perf_counter() - started)
+        assert cache.get_json(cache.namespaced_key(NAMESPACE, 0)) is None
+
+    def report(label, times):
+        best, avg = min(times), sum(times) / len(times)
+        print(f"{label:<22} best {best * 1000:10.3f} ms   avg {avg * 1000:10.3f} ms", flush=True)
+
+    report("SCAN + DELETE (old)", scan_times)
+    report("INCR generation", incr_times)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Бенчмарк подбора следующего задания тренажёра (exam_trainer.next_task):
+прежний вариант (весь срез банка + множества виденных/решённых id в Python)
+против очереди повторений exam_review_items (поиск по (user_id, due_at) и
+анти-джойн к очереди с LIMIT 1).
+
+    python benchmarks/bench_exam_next.py [--tasks 100000] [--history 20000] [--calls 50]
+
+Банк — --tasks заданий ОГЭ, у ученика --history попыток по первым заданиям
+(в порядке подбора), каждая третья неверная. Три сценария: новый ученик,
+ученик с историей (есть невиденные) и ученик, видевший весь банк (вторая
+ступень — работа над ошибками). Очередь строится exam_review.rebuild из
+тех же попыток. Порядок выдачи у вариантов разный (очередь учитывает
+сроки повторения), поэтому сравнивается только время. По умолчанию — SQLite в памяти;
+DATABASE_URL на Postgres покажет реальную картину (таблицы создаются
+через create_all — берите пустую базу).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-with-at-least-thirty-two-chars")
+
+from sqlalchemy import insert, text  # noqa: E402
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import Attempt, ExamTask, User  # noqa: E402
+from app.services import exam_review, exam_trainer  # noqa: E402
+
+
+def old_next_task(db, user, exam=None):
+    # Копия next_task до очереди повторений и анти-джойнов (без фильтров, кроме exam).
+    query = db.query(ExamTask)
+    if exam is not None:
+        query = query.filter(ExamTask.exam == exam)
+    candidates = query.order_by(ExamTask.difficulty, ExamTask.id).all()
+    if not candidates:
+        return None
+    seen = {r[0] for r in db.query(Attempt.content_id).filter(
+        Attempt.user_id == user.id, Attempt.content_type == "exam").distinct()}
+    solved = {r[0] for r in db.query(Attempt.content_id).filter(
+        Attempt.user_id == user.id, Attempt.content_type == "exam", Attempt.is_correct.is_(True)).distinct()}
+    for task in candidates:
+        if task.id not in seen:
+            return task
+    for task in candidates:
+        if task.id not in solved:
+            return task
+    return candidates[0]
+
+
+def _seed(tasks: int, history: int):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    users = [User(username=f"bench{i}", email=f"bench{i}@example.com", hashed_password="x") for i in range(3)]
+    db.add_all(users)
+    db.commit()
+    fresh, partial, full = users
+
+    db.execute(insert(ExamTask), [
+        {"exam": "oge", "task_number": i % 25 + 1, "topic": "t", "difficulty": i % 3 + 1,
+         "statement": "?", "answer_type": "single_answer", "answer": "1", "source": "manual"}
+        for i in range(tasks)
+    ])
+    ordered_ids = [task_id for (task_id,) in db.query(ExamTask.id).order_by(ExamTask.difficulty, ExamTask.id)]
+
+    def attempts(user, task_ids):
+        return [
+            {"user_id": user.id, "content_type": "exam", "content_id": task_id,
+             "is_correct": n % 3 != 0, "hints_used": 0, "source": "manual"}
+            for n, task_id in enumerate(task_ids)
+        ]
+
+    db.execute(insert(Attempt), attempts(partial, ordered_ids[:history]))
+    db.execute(insert(Attempt), attempts(full, ordered_ids))
+    db.commit()
+    exam_review.rebuild(db)
+    # Статистика планировщика — как у живой базы (на Postgres её собирает
+    # autovacuum); без неё SQLite выбирает индекс по exam и сортирует срез.
+    db.execute(text("ANALYZE"))
+    return db, {"fresh": fresh, "history": partial, "seen all": full}
+
+
+def _run(label, fn, db, user, calls):
+    timings = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        fn(db, user, exam="oge")
+        timings.append(time.perf_counter() - started)
+        db.expire_all()
+    print(f"{label:<28} p50 {statistics.median(timings) * 1000:9.2f} ms   max {max(timings) * 1000:9.2f} ms", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--history", type=int, default=20_000)
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args()
+
+    db, users = _seed(args.tasks, args.history)
+    print(f"dialect={engine.dialect.name} tasks={args.tasks} history={args.history}", flush=True)
+    for name, user in users.items():
+        _run(f"old, {name}", old_next_task, db, user, max(1, args.calls // 10))
+        _run(f"review queue, {name}", exam_trainer.next_task, db, user, args.calls)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Бенчмарк записи телеметрии мини-игр: старый путь POST /api/games/events
+(db.add(GameEvent(...)) на каждое событие) против game_telemetry.insert_events
+(executemany на SQLite, COPY на Postgres).
+
+    python benchmarks/bench_game_events.py [--events 200] [--batches 20]
+
+По умолчанию — SQLite в памяти. Чтобы замерить COPY, передайте DATABASE_URL
+на Postgres (таблицы создаются через create_all — берите пустую базу).
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-with-at-least-thirty-two-chars")
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import GameEvent, GameSession, User  # noqa: E402
+from app.schemas import MAX_EVENTS_PER_BATCH, GameEventIn  # noqa: E402
+from app.services import game_telemetry  # noqa: E402
+
+
+def _per_event_add(db, session_id, events):
+    for ev in events:
+        db.add(GameEvent(session_id=session_id, event_type=ev.event_type, payload=ev.payload, client_ts=ev.client_ts))
+    return len(events)
+
+
+def _bulk(db, session_id, events):
+    return game_telemetry.insert_events(db, session_id, events)
+
+
+def _run(label, write, session_id, events, batches):
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        for _ in range(batches):
+            write(db, session_id, events)
+            db.commit()
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+    total = len(events) * batches
+    print(f"{label:<16} {total:>8} events  {elapsed:8.3f}s  {total / elapsed:>10.0f} events/s", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=MAX_EVENTS_PER_BATCH, help="событий в батче")
+    parser.add_argument("--batches", type=int, default=20)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = User(username="bench", email="bench@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    session = GameSession(user_id=user.id, game_id="gauss_jordan", started_at=datetime.utcnow())
+    db.add(session)
+    db.commit()
+    session_id = session.id
+    db.close()
+
+    events = [
+        GameEventIn(event_type="move_made", payload={"op": "combine", "row": i % 4}, client_ts=datetime.utcnow())
+        for i in range(args.events)
+    ]
+    print(f"dialect={engine.dialect.name} batch={args.events} batches={args.batches}", flush=True)
+    _run("per-event add", _per_event_add, session_id, events, args.batches)
+    _run("insert_events", _bulk, session_id, events, args.batches)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Бенчмарк пропускной способности стека мидлварей main.py на тривиальном
+роуте: прежние csrf_protection/audit_logging на @app.middleware("http")
+(BaseHTTPMiddleware) против чистых ASGI CSRFProtectionMiddleware /
+AuditLogMiddleware.
+
+    python benchmarks/bench_middleware.py [--requests 5000]
+
+Запросы идут через httpx.ASGITransport, без сети и сервера — меряется
+только сам стек. Роуты не трогают БД и Redis: GET проходит CSRF как
+безопасный метод, POST — как запрос без auth-cookie, аудит их не пишет.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-with-at-least-thirty-two-chars")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+
+from main import (  # noqa: E402
+    AUDIT_METHODS, AUDITED_NON_ADMIN_PATHS, CSRF_EXEMPT_PATHS, LOGIN_LIKE_PATHS,
+    AuditLogMiddleware, CSRFProtectionMiddleware,
+)
+
+
+def _trivial_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/ping")
+    def ping():
+        return {"ok": True}
+
+    @app.post("/api/ping")
+    def ping_post():
+        return {"ok": True}
+
+    return app
+
+
+def _old_stack() -> FastAPI:
+    # Проверки из прежних @app.middleware("http") в той части, что проходят
+    # запросы бенчмарка (выдача/проверка токена и запись аудита не
+    # достигаются ни там, ни там).
+    app = _trivial_app()
+
+    @app.middleware("http")
+    async def csrf_protection(request: Request, call_next):
+        is_admin_path = request.url.path.startswith("/admin")
+        if is_admin_path or request.url.path in CSRF_EXEMPT_PATHS or request.method in ["GET", "HEAD", "OPTIONS"]:
+            return await call_next(request)
+        if request.method in ["POST", "PUT", "DELETE", "PATCH"]:
+            if not request.cookies.get("token"):
+                return await call_next(request)
+        return await call_next(request)
+
+    @app.middleware("http")
+    async def audit_logging(request: Request, call_next):
+        if request.url.path in LOGIN_LIKE_PATHS and request.method in AUDIT_METHODS:
+            await request.json()
+        response = await call_next(request)
+        is_audited_path = request.url.path.startswith("/admin") or request.url.path in AUDITED_NON_ADMIN_PATHS
+        if request.method in AUDIT_METHODS and is_audited_path:
+            raise AssertionError("бенчмарк не должен доходить до записи аудита")
+        return response
+
+    return app
+
+
+def _new_stack() -> FastAPI:
+    app = _trivial_app()
+    app.add_middleware(CSRFProtectionMiddleware)
+    app.add_middleware(AuditLogMiddleware)
+    return app
+
+
+async def _run(label: str, app: FastAPI, requests: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(100):  # прогрев
+            await client.get("/api/ping")
+        for method in ("GET", "POST"):
+            started = time.perf_counter()
+            for _ in range(requests):
+                response = await client.request(method, "/api/ping")
+                assert response.status_code == 200
+            elapsed = time.perf_counter() - started
+            print(f"{label:<22} {method:<5} {requests / elapsed:>10.0f} req/s", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    asyncio.run(_run("BaseHTTPMiddleware", _old_stack(), args.requests))
+    asyncio.run(_run("pure ASGI", _new_stack(), args.requests))
+
+
+if __name__ == "__main__":
+    main()
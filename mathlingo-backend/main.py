@@ -1,17 +1,20 @@
 
+import json
 import os
 import secrets
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
+from starlette.datastructures import MutableHeaders
 
+from app import config
 from app.config import IS_LOCAL
 from app.database import get_db
-from app.models import AuditLog
-from app.auth import get_admin_current_user_optional
-from app.services import cache
+from app.auth import create_csrf_token, verify_csrf_token
+from app.services import audit_writer, cache
 from app.routes import (
     users, tasks, admin, admin_tasks, admin_ai, admin_content_quality,
     gamification_maps, gamification_tasks, gamification_mastery,
@@ -21,7 +24,15 @@ from app.routes import (
 )
 from app.routes.admin_gamification import router as admin_gamification_router
 
-app = FastAPI(title="MathLingo API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # AUDIT_LOG_MODE=buffered: недописанный буфер audit_log — в БД до выхода.
+    audit_writer.shutdown()
+
+
+app = FastAPI(title="MathLingo API", lifespan=lifespan)
 
 CSRF_TOKEN_EXPIRY = 3600
 
@@ -30,67 +41,100 @@ def _csrf_key(auth_token: str) -> str:
     return f"csrf:{auth_token}"
 
 
-@app.middleware("http")
-async def csrf_protection(request: Request, call_next):
-    # Пути, которые не требуют CSRF-защиты. Password-reset сюда попадает
-    # явно (не только "нет auth-cookie" по умолчанию) — сценарий нарочно
-    # рассчитан на анонимного пользователя, но стейл-cookie от истёкшей
-    # сессии не должна ломать этот флоу требованием CSRF-токена.
-    exempt_paths = [
-        "/api/login/", "/api/register/", "/api/logout/",
-        "/api/password-reset/request", "/api/password-reset/confirm",
-    ]
-
-    # Админка использует Bearer-токен в заголовке Authorization, а не cookie-сессию,
-    # поэтому она не подвержена CSRF (браузер не может подставить этот заголовок сам)
-    # и должна быть исключена из проверки независимо от посторонней cookie "token".
-    is_admin_path = request.url.path.startswith("/admin")
-
-    # Пропускаем проверку CSRF для исключенных путей, админки или для безопасных методов
-    if is_admin_path or request.url.path in exempt_paths or request.method in ["GET", "HEAD", "OPTIONS"]:
-        response = await call_next(request)
-
-        # Для запросов, которые возвращают информацию о пользователе, устанавливаем новый CSRF-токен
-        if request.url.path == "/api/me" and request.method == "GET":
+def _issue_csrf_token(auth_token: str) -> str:
+    if config.CSRF_MODE == "hmac":
+        return create_csrf_token(auth_token, CSRF_TOKEN_EXPIRY)
+    csrf_token = secrets.token_hex(16)
+    # SETEX сам обрабатывает истечение — раньше это был dict в
+    # памяти процесса uvicorn: токен, выданный одним worker'ом,
+    # не проходил проверку в другом, а рестарт ронял все сессии
+    # разом. Redis убирает оба случая (R4).
+    cache.get_client().setex(_csrf_key(auth_token), CSRF_TOKEN_EXPIRY, csrf_token)
+    return csrf_token
+
+
+def _csrf_token_valid(auth_token: str, csrf_token: str) -> bool:
+    if config.CSRF_MODE == "hmac":
+        return verify_csrf_token(auth_token, csrf_token)
+    # Отсутствие в Redis = не найден или уже истёк — TTL уже отработал,
+    # отдельная проверка не нужна.
+    stored_token = cache.get_client().get(_csrf_key(auth_token))
+    return bool(stored_token) and stored_token == csrf_token
+
+
+# Пути, которые не требуют CSRF-защиты. Password-reset сюда попадает
+# явно (не только "нет auth-cookie" по умолчанию) — сценарий нарочно
+# рассчитан на анонимного пользователя, но стейл-cookie от истёкшей
+# сессии не должна ломать этот флоу требованием CSRF-токена.
+CSRF_EXEMPT_PATHS = {
+    "/api/login/", "/api/register/", "/api/logout/",
+    "/api/password-reset/request", "/api/password-reset/confirm",
+}
+CSRF_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+CSRF_CHECKED_METHODS = {"POST", "PUT", "DELETE", "PATCH"}
+
+
+class CSRFProtectionMiddleware:
+    """
+    CSRF для cookie-сессий. Чистый ASGI, а не @app.middleware("http"):
+    BaseHTTPMiddleware оборачивает каждый запрос в отдельную задачу и
+    потоки тела — здесь же нужны только путь, метод, cookie и один
+    заголовок ответа.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path, method = scope["path"], scope["method"]
+        # Админка использует Bearer-токен в заголовке Authorization, а не cookie-сессию,
+        # поэтому она не подвержена CSRF (браузер не может подставить этот заголовок сам)
+        # и должна быть исключена из проверки независимо от посторонней cookie "token".
+        is_admin_path = path.startswith("/admin")
+
+        # Пропускаем проверку CSRF для исключенных путей, админки или для безопасных методов
+        if is_admin_path or path in CSRF_EXEMPT_PATHS or method in CSRF_SAFE_METHODS:
+            # Для запросов, которые возвращают информацию о пользователе, устанавливаем новый CSRF-токен
+            if path == "/api/me" and method == "GET":
+                auth_token = Request(scope).cookies.get("token")
+                if auth_token:
+                    send = self._with_csrf_header(send, auth_token)
+            await self.app(scope, receive, send)
+            return
+
+        # Для методов, изменяющих данные, проверяем CSRF-токен
+        if method in CSRF_CHECKED_METHODS:
+            request = Request(scope)
             auth_token = request.cookies.get("token")
+
+            # Если пользователь не аутентифицирован, пропускаем проверку CSRF
             if auth_token:
-                csrf_token = secrets.token_hex(16)
-                # SETEX сам обрабатывает истечение — раньше это был dict в
-                # памяти процесса uvicorn: токен, выданный одним worker'ом,
-                # не проходил проверку в другом, а рестарт ронял все сессии
-                # разом. Redis убирает оба случая (R4).
-                cache.get_client().setex(_csrf_key(auth_token), CSRF_TOKEN_EXPIRY, csrf_token)
-                response.headers["X-CSRF-Token"] = csrf_token
-
-        return response
-
-    # Для методов, изменяющих данные, проверяем CSRF-токен
-    if request.method in ["POST", "PUT", "DELETE", "PATCH"]:
-        auth_token = request.cookies.get("token")
-
-        # Если пользователь не аутентифицирован, пропускаем проверку CSRF
-        if not auth_token:
-            return await call_next(request)
-
-        # Получаем CSRF-токен из заголовка
-        csrf_token = request.headers.get("X-CSRF-Token")
-
-        # Проверяем наличие CSRF-токена
-        if not csrf_token:
-            return JSONResponse(
-                content={"detail": "CSRF-токен отсутствует"},
-                status_code=403
-            )
-
-        # Проверяем валидность CSRF-токена (отсутствие в Redis = не найден
-        # или уже истёк — TTL уже отработал, отдельная проверка не нужна).
-        stored_token = cache.get_client().get(_csrf_key(auth_token))
-        if not stored_token or stored_token != csrf_token:
-            return JSONResponse(
-                content={"detail": "Недействительный CSRF-токен"},
-                status_code=403
-            )
-    return await call_next(request)
+                # Получаем CSRF-токен из заголовка
+                csrf_token = request.headers.get("X-CSRF-Token")
+
+                # Проверяем наличие CSRF-токена
+                if not csrf_token:
+                    await JSONResponse(content={"detail": "CSRF-токен отсутствует"}, status_code=403)(scope, receive, send)
+                    return
+
+                # Проверяем валидность CSRF-токена (Redis или подпись — см. CSRF_MODE)
+                if not _csrf_token_valid(auth_token, csrf_token):
+                    await JSONResponse(content={"detail": "Недействительный CSRF-токен"}, status_code=403)(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _with_csrf_header(send, auth_token: str):
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-CSRF-Token"] = _issue_csrf_token(auth_token)
+            await send(message)
+        return send_with_header
 
 
 AUDIT_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
@@ -133,61 +177,97 @@ def _parse_admin_audit_path(path: str):
     return entity_type, entity_id, action
 
 
-@app.middleware("http")
-async def audit_logging(request: Request, call_next):
+async def _read_body(receive) -> tuple[bytes, list]:
+    """Вычитывает тело запроса; возвращает его и сами сообщения для повтора."""
+    messages, chunks = [], []
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks), messages
+
+
+def _replay(messages, receive):
+    pending = list(messages)
+
+    async def replay_receive():
+        if pending:
+            return pending.pop(0)
+        return await receive()
+    return replay_receive
+
+
+class AuditLogMiddleware:
     """
     Пишет audit_log для КАЖДОГО мутирующего запроса под /admin — успешного
     или нет (включая 401/403 — попытка тоже сигнал). Реализовано мидлварью,
     а не точечными вызовами в эндпоинтах, чтобы покрытие не зависело от
     того, вспомнил ли автор нового роута про логирование (см.
     docs/roadmap/product-technical-plan.md, R1 §1.3 и DoD).
+
+    Чистый ASGI: статус ответа перехватывается из http.response.start, тело
+    запроса вычитывается (и реплеится вниз по цепочке) только для
+    LOGIN_LIKE_PATHS — остальные запросы проходят без буферизации.
     """
-    # Тело запроса нужно прочитать ДО call_next: BaseHTTPMiddleware кэширует
-    # поток запроса только в этом порядке (читаешь -> он реплеится вниз по
-    # цепочке), а не наоборот — прочитать после call_next уже нечего, поток
-    # к этому моменту вычитан обработчиком ниже.
-    login_email = None
-    if request.url.path in LOGIN_LIKE_PATHS and request.method in AUDIT_METHODS:
-        try:
-            body = await request.json()
-            login_email = body.get("email")
-        except Exception:
-            pass
-
-    response = await call_next(request)
-
-    is_audited_path = request.url.path.startswith("/admin") or request.url.path in AUDITED_NON_ADMIN_PATHS
-    if request.method in AUDIT_METHODS and is_audited_path:
-        # Уважаем app.dependency_overrides[get_db], чтобы в тестах мидлварь
-        # писала в ту же (тестовую) БД, что и остальное приложение, а не в
-        # отдельную "боевую" — мидлварь не проходит через DI и иначе взяла
-        # бы реальный get_db в обход подмены.
-        db_dependency = app.dependency_overrides.get(get_db, get_db)
-        db_gen = db_dependency()
-        db = next(db_gen)
-        try:
-            current_admin = get_admin_current_user_optional(request, db)
-            entity_type, entity_id, action = _parse_admin_audit_path(request.url.path)
-            if login_email:
-                entity_id = login_email
-            db.add(AuditLog(
-                actor_admin_id=current_admin.id if current_admin else None,
-                actor_role=current_admin.role if current_admin else None,
-                method=request.method,
-                path=request.url.path,
-                entity_type=entity_type,
-                entity_id=entity_id,
-                action=action,
-                status_code=response.status_code,
-            ))
-            db.commit()
-        finally:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in AUDIT_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        login_email = None
+        if path in LOGIN_LIKE_PATHS:
+            body, messages = await _read_body(receive)
+            receive = _replay(messages, receive)
             try:
-                next(db_gen)
-            except StopIteration:
+                login_email = json.loads(body).get("email")
+            except Exception:
                 pass
 
-    return response
+        status_code = None
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        await self.app(scope, receive, send_with_status)
+
+        is_audited_path = path.startswith("/admin") or path in AUDITED_NON_ADMIN_PATHS
+        if is_audited_path and status_code is not None:
+            self._write(scope, login_email, status_code)
+
+    @staticmethod
+    def _write(scope, login_email, status_code: int) -> None:
+        path = scope["path"]
+        entity_type, entity_id, action = _parse_admin_audit_path(path)
+        if login_email:
+            entity_id = login_email
+        audit_writer.submit(audit_writer.AuditEvent(
+            method=scope["method"],
+            path=path,
+            status_code=status_code,
+            entity_type=entity_type,
+            entity_id=entity_id,
+            action=action,
+            headers=list(scope["headers"]),
+            db_dependency=scope["app"].dependency_overrides.get(get_db, get_db),
+        ))
+
+
+# Порядок как был у @app.middleware("http"): последняя добавленная —
+# внешняя, аудит видит и отказы CSRF.
+app.add_middleware(CSRFProtectionMiddleware)
+app.add_middleware(AuditLogMiddleware)
 
 #CORS configuration
 origins = [
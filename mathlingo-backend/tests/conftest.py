@@ -62,6 +62,23 @@ def client():
     cache._client = None
 
 
+@pytest.fixture
+def file_sessions(tmp_path):
+    """
+    Фабрика сессий на файловой SQLite — для тестов гонок: общий StaticPool
+    выше — одно соединение на все потоки, конкуренцию транзакций на нём не
+    воспроизвести. Здесь у каждого потока своё соединение.
+    """
+    file_engine = create_engine(
+        f"sqlite:///{tmp_path / 'race.db'}",
+        connect_args={"timeout": 30, "check_same_thread": False},
+        pool_size=100, max_overflow=0,
+    )
+    Base.metadata.create_all(bind=file_engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=file_engine)
+    file_engine.dispose()
+
+
 @pytest.fixture
 def db():
     session = TestingSessionLocal()
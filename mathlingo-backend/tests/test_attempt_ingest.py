@@ -0,0 +1,212 @@
+"""
+Write-behind очередь попыток (ATTEMPT_INGEST_MODE=stream,
+app/services/attempt_ingest.py): запрос отвечает сразу и только кладёт
+попытку в Redis stream, в БД её пачкой пишет воркер — с теми же очками и
+mastery, что синхронный путь, и без дублей при повторной обработке.
+"""
+import pytest
+
+from app import config
+from app.models import Attempt, GameScenario, MasteryState, Skill, Task, UserProgress
+from app.services import attempt_ingest, cache
+
+
+@pytest.fixture
+def stream_mode(monkeypatch):
+    monkeypatch.setattr(config, "ATTEMPT_INGEST_MODE", "stream")
+
+
+def _student_header(user):
+    from app.auth import create_access_token
+
+    token = create_access_token({"sub": user.email})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _make_skill(db, subject):
+    skill = Skill(subject_id=subject.id, name="Skill", code="ingest-skill")
+    db.add(skill)
+    db.commit()
+    db.refresh(skill)
+    return skill
+
+
+def _make_task(db, subject, skill):
+    task = Task(
+        title="t", subject=subject.code, subject_id=subject.id, skill_id=skill.id,
+        status="published", answer_type="single_answer", correct_answer="2x",
+        reward_points=10, estimated_time_seconds=60,
+    )
+    db.add(task)
+    db.commit()
+    db.refresh(task)
+    return task
+
+
+def test_submit_answer_enqueues_without_writing_attempt(client, db, user, subject, stream_mode):
+    task = _make_task(db, subject, _make_skill(db, subject))
+
+    response = client.post(
+        "/gamification/submit-answer",
+        headers=_student_header(user),
+        json={"task_id": task.id, "answer": "2x"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["isCorrect"] is True
+    assert response.json()["points"] == 10
+    assert db.query(Attempt).count() == 0
+    assert cache.get_client().xlen(attempt_ingest.STREAM_KEY) == 1
+
+
+def test_worker_drain_writes_attempts_points_and_mastery(client, db, user, subject, stream_mode):
+    skill = _make_skill(db, subject)
+    task = _make_task(db, subject, skill)
+    for answer in ("2x", "2x", "wrong"):
+        client.post(
+            "/gamification/submit-answer",
+            headers=_student_header(user),
+            json={"task_id": task.id, "answer": answer, "time_spent_ms": 30_000},
+        )
+
+    assert attempt_ingest.drain_once(db, "test-worker") == 3
+
+    assert db.query(Attempt).filter(Attempt.user_id == user.id).count() == 3
+    progress = db.query(UserProgress).filter(UserProgress.user_id == user.id).one()
+    assert progress.total_points == 20
+    state = db.query(MasteryState).filter(
+        MasteryState.user_id == user.id, MasteryState.skill_id == skill.id
+    ).one()
+    assert state.sample_size == 3
+    assert state.factors["avg_time_ratio"] == 0.5
+    # Подтверждённые записи удалены — повторный drain ничего не находит.
+    assert attempt_ingest.drain_once(db, "test-worker") == 0
+
+
+def test_game_submit_attempt_enqueues(client, db, user, subject, stream_mode):
+    skill = _make_skill(db, subject)
+    scenario = GameScenario(
+        template_key="derivfall",
+        config={"template_key": "derivfall", "difficulty": 3, "time_limit": 60, "problems": []},
+        status="published",
+        skill_id=skill.id,
+    )
+    db.add(scenario)
+    db.commit()
+
+    response = client.post(
+        f"/gamification/game-scenarios/{scenario.id}/submit-attempt",
+        headers=_student_header(user),
+        json={"score": 20, "max_score": 20},
+    )
+    assert response.json() == {"is_correct": True}
+    assert db.query(Attempt).count() == 0
+
+    attempt_ingest.drain_once(db, "test-worker")
+
+    attempt = db.query(Attempt).one()
+    assert attempt.content_type == "game"
+    assert attempt.source == "game"
+    assert db.query(UserProgress).filter(UserProgress.user_id == user.id).one().total_points == 20
+
+
+def test_reprocessed_entries_are_not_double_counted(client, db, user, subject):
+    skill = _make_skill(db, subject)
+    task = _make_task(db, subject, skill)
+    payload = {
+        "user_id": user.id, "content_type": "task", "content_id": task.id,
+        "skill_id": skill.id, "is_correct": True, "time_spent_ms": None,
+        "hints_used": 0, "source": "manual", "points": 10,
+        "estimated_time_seconds": 60, "created_at": "2026-01-01T12:00:00",
+    }
+
+    # Воркер упал между commit и XACK — та же пачка приходит второй раз.
+    assert attempt_ingest.ingest_batch(db, [("1-0", payload)]) == 1
+    assert attempt_ingest.ingest_batch(db, [("1-0", payload), ("2-0", payload)]) == 1
+
+    assert db.query(Attempt).count() == 2
+    assert db.query(UserProgress).filter(UserProgress.user_id == user.id).one().total_points == 20
+
+
+def test_sync_mode_is_default(client, db, user, subject):
+    task = _make_task(db, subject, _make_skill(db, subject))
+
+    client.post(
+        "/gamification/submit-answer",
+        headers=_student_header(user),
+        json={"task_id": task.id, "answer": "2x"},
+    )
+
+    assert db.query(Attempt).count() == 1
+
+
+def _raw_payload(user_id, task, skill):
+    return {
+        "user_id": user_id, "content_type": "task", "content_id": task.id,
+        "skill_id": skill.id, "is_correct": True, "time_spent_ms": None,
+        "hints_used": 0, "source": "manual", "points": 10,
+        "estimated_time_seconds": 60, "created_at": "2026-01-01T12:00:00",
+    }
+
+
+def test_poison_entry_does_not_block_stream_and_is_dead_lettered(client, db, user, subject):
+    import json
+
+    skill = _make_skill(db, subject)
+    task = _make_task(db, subject, skill)
+    redis_client = cache.get_client()
+    redis_client.xadd(attempt_ingest.STREAM_KEY, {"data": json.dumps(_raw_payload(user.id, task, skill))})
+    # NOT NULL user_id — INSERT падает при любом числе повторов.
+    poison_id = redis_client.xadd(
+        attempt_ingest.STREAM_KEY, {"data": json.dumps(_raw_payload(None, task, skill))},
+    )
+    redis_client.xadd(attempt_ingest.STREAM_KEY, {"data": "{not json"})
+
+    assert attempt_ingest.drain_once(db, "test-worker") == 3
+    # Хорошая запись записана, битый JSON сразу в dead-letter, ядовитая — ждёт повтора.
+    assert db.query(Attempt).count() == 1
+    assert redis_client.xlen(attempt_ingest.DEAD_LETTER_KEY) == 1
+    assert redis_client.xlen(attempt_ingest.STREAM_KEY) == 1
+
+    for _ in range(attempt_ingest.MAX_DELIVERIES - 1):
+        attempt_ingest.drain_once(db, "test-worker")
+
+    assert redis_client.xlen(attempt_ingest.STREAM_KEY) == 0
+    dead = redis_client.xrange(attempt_ingest.DEAD_LETTER_KEY)
+    assert [fields["entry_id"] for _, fields in dead][1] == poison_id
+    assert attempt_ingest.drain_once(db, "test-worker") == 0
+    assert db.query(Attempt).count() == 1
+    assert db.query(UserProgress).filter(UserProgress.user_id == user.id).one().total_points == 10
+
+
+def test_worker_loop_survives_drain_errors(monkeypatch):
+    class Stop(BaseException):
+        pass
+
+    calls = []
+
+    def drain(db, consumer, block_ms=None):
+        calls.append(consumer)
+        if len(calls) == 1:
+            raise RuntimeError("redis down")
+        raise Stop
+
+    monkeypatch.setattr(attempt_ingest, "drain_once", drain)
+    monkeypatch.setattr(attempt_ingest.time, "sleep", lambda _seconds: None)
+
+    with pytest.raises(Stop):
+        attempt_ingest.run_worker("test-worker")
+    assert len(calls) == 2
+
+
+def test_deleted_pending_entries_are_acked(client, db):
+    redis_client = cache.get_client()
+    entry_id = redis_client.xadd(attempt_ingest.STREAM_KEY, {"data": "{}"})
+    attempt_ingest._ensure_group(redis_client)
+    # Прочитана воркером, упавшим до XACK, и затем удалена из stream.
+    redis_client.xreadgroup(attempt_ingest.GROUP, "test-worker", {attempt_ingest.STREAM_KEY: ">"})
+    redis_client.xdel(attempt_ingest.STREAM_KEY, entry_id)
+    assert redis_client.xpending(attempt_ingest.STREAM_KEY, attempt_ingest.GROUP)["pending"] == 1
+
+    assert attempt_ingest.drain_once(db, "test-worker") == 0
+    assert redis_client.xpending(attempt_ingest.STREAM_KEY, attempt_ingest.GROUP)["pending"] == 0
@@ -1,6 +1,19 @@
+import pytest
+
+from app import config
+from app.services import audit_writer
 from tests.conftest import authorization_header
 
 
+@pytest.fixture
+def buffered_mode(monkeypatch):
+    monkeypatch.setattr(config, "AUDIT_LOG_MODE", "buffered")
+    # Фоновый поток не просыпается сам — пишут только явные flush()/shutdown().
+    monkeypatch.setattr(config, "AUDIT_FLUSH_INTERVAL_SECONDS", 3600)
+    yield
+    audit_writer.shutdown()
+
+
 def test_login_attempt_is_audited_with_target_email(client, admin, db):
     from app.models import AuditLog
 
@@ -131,3 +144,58 @@ def test_non_admin_mutations_are_not_audited(client, user, db):
     )
 
     assert db.query(AuditLog).filter(AuditLog.path == "/api/me/update").count() == 0
+
+
+def _create_skill(client, admin, subject, code):
+    return client.post(
+        "/admin/skills/",
+        headers=authorization_header(admin),
+        json={"name": code, "code": code, "subject_id": subject.id},
+    )
+
+
+def test_buffered_mode_writes_batch_on_flush(client, content_manager_admin, subject, db, buffered_mode):
+    from app.models import AuditLog
+
+    for code in ("first", "second"):
+        assert _create_skill(client, content_manager_admin, subject, code).status_code == 200
+
+    assert db.query(AuditLog).filter(AuditLog.path == "/admin/skills/").count() == 0
+    assert audit_writer.pending_count() == 2
+
+    assert audit_writer.flush() == 2
+    entries = db.query(AuditLog).filter(AuditLog.path == "/admin/skills/").order_by(AuditLog.id).all()
+    assert [e.actor_admin_id for e in entries] == [content_manager_admin.id] * 2
+    assert entries[0].created_at <= entries[1].created_at
+
+
+def test_buffered_mode_full_queue_falls_back_to_sync_write(
+        client, content_manager_admin, subject, db, buffered_mode, monkeypatch):
+    from app.models import AuditLog
+
+    monkeypatch.setattr(config, "AUDIT_QUEUE_MAX_SIZE", 1)
+    _create_skill(client, content_manager_admin, subject, "queued")
+    _create_skill(client, content_manager_admin, subject, "overflow")
+
+    # Второе событие в буфер не влезло и записано прямо в запросе.
+    assert audit_writer.pending_count() == 1
+    assert db.query(AuditLog).filter(AuditLog.path == "/admin/skills/").count() == 1
+
+
+def test_buffered_mode_failed_flush_keeps_events(client, content_manager_admin, subject, db, buffered_mode, monkeypatch):
+    from app.models import AuditLog
+
+    _create_skill(client, content_manager_admin, subject, "kept")
+
+    def broken_write(events):
+        raise RuntimeError("db is down")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(audit_writer, "write_events", broken_write)
+        with pytest.raises(RuntimeError):
+            audit_writer.flush()
+    assert audit_writer.pending_count() == 1
+
+    audit_writer.shutdown()
+    assert audit_writer.pending_count() == 0
+    assert db.query(AuditLog).filter(AuditLog.path == "/admin/skills/").count() == 1
@@ -6,8 +6,17 @@ R4: покрывает главный риск кеширования — не "
 2. dashboard/overview не путает кеш между ролями (teacher не должен
    получить закешированный ответ superadmin с admin_actions);
 3. инвалидация списков subjects/skills при мутациях.
+Плюс сам примитив cache.get_or_refresh (stale-while-revalidate +
+single-flight) и кеш готовых сжатых ответов (response_cache).
 """
-from app.services import cache
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app import config
+from app.models import GameScenario
+from app.routes.game_scenarios import _active_scenario_cache_key
+from app.services import cache, response_cache
 from tests.conftest import authorization_header
 from tests.test_game_scenarios_api import CHECKLIST_ITEMS, _create_scenario, _pass_checklist_and_preview
 
@@ -27,7 +36,7 @@ def test_active_game_scenario_is_served_from_cache_on_second_request(client, con
     student_headers = _student_header(user)
     first = client.get("/gamification/game-scenarios/active/derivfall", headers=student_headers)
     assert first.status_code == 200
-    assert cache.get_json("game_scenario_active:derivfall:_") is not None
+    assert cache.get_json(_active_scenario_cache_key("derivfall", None)) is not None
 
     second = client.get("/gamification/game-scenarios/active/derivfall", headers=student_headers)
     assert second.status_code == 200
@@ -68,6 +77,33 @@ def test_active_game_scenario_cache_invalidated_on_republish(client, content_man
     assert second.json()["id"] == scenario_b
 
 
+def test_active_game_scenario_evicted_when_refresh_finds_none(client, db, content_manager_admin, user):
+    """
+    Окно availability_to закрылось без правки сценария — namespace не
+    бампался. Фоновый пересчёт получает 404 и обязан убрать прежний
+    сценарий из кеша, а не оставить его до жёсткого TTL.
+    """
+    scenario_id = _create_scenario(client, content_manager_admin).json()["id"]
+    _pass_checklist_and_preview(client, content_manager_admin, scenario_id)
+    client.post(f"/admin/game-scenarios/{scenario_id}/publish", headers=authorization_header(content_manager_admin))
+
+    student_headers = _student_header(user)
+    assert client.get("/gamification/game-scenarios/active/derivfall", headers=student_headers).status_code == 200
+
+    db.get(GameScenario, scenario_id).availability_to = datetime.utcnow() - timedelta(minutes=1)
+    db.commit()
+    key = _active_scenario_cache_key("derivfall", None)
+    cache.set_json(key, {**cache.get_json(key), "fresh_until": 0}, ttl=60)
+
+    # Мягкий TTL истёк: этот ответ ещё прежний, пересчёт — в фоне.
+    stale = client.get("/gamification/game-scenarios/active/derivfall", headers=student_headers)
+    assert stale.json()["id"] == scenario_id
+    assert _wait_for(lambda: cache.get_json(key) is None)
+
+    response = client.get("/gamification/game-scenarios/active/derivfall", headers=student_headers)
+    assert response.status_code == 404
+
+
 def test_dashboard_overview_cache_does_not_leak_admin_actions_to_teacher(client, admin, teacher_admin):
     """
     Ключ кеша обязан учитывать include_admin_actions — иначе ответ,
@@ -86,7 +122,7 @@ def test_dashboard_overview_cache_does_not_leak_admin_actions_to_teacher(client,
 def test_dashboard_overview_is_cached(client, admin):
     first = client.get("/admin/dashboard/overview", headers=authorization_header(admin))
     assert first.status_code == 200
-    assert cache.get_json("dashboard_overview:full") is not None
+    assert cache.get_fields("dashboard_overview:full") is not None
 
     second = client.get("/admin/dashboard/overview", headers=authorization_header(admin))
     assert second.json() == first.json()
@@ -132,3 +168,191 @@ def test_skills_list_cache_invalidated_on_update(client, content_manager_admin,
     listed_again = client.get("/admin/skills/", headers=authorization_header(content_manager_admin))
     renamed = next(s for s in listed_again.json() if s["id"] == skill_id)
     assert renamed["name"] == "Renamed"
+
+
+# --- cache.get_or_refresh ---
+
+class _Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {"n": self.calls}
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_get_or_refresh_serves_fresh_value_without_recompute(client):
+    compute = _Counter()
+    assert cache.get_or_refresh("swr:fresh", compute, soft_ttl=60, hard_ttl=120) == {"n": 1}
+    assert cache.get_or_refresh("swr:fresh", compute, soft_ttl=60, hard_ttl=120) == {"n": 1}
+    assert compute.calls == 1
+    assert 60 < cache.get_client().ttl("swr:fresh") <= 120
+
+
+def test_get_or_refresh_serves_stale_and_refreshes_in_background(client):
+    compute = _Counter()
+    cache.get_or_refresh("swr:stale", compute, soft_ttl=0, hard_ttl=120)
+
+    # Мягкий TTL истёк: ответ — прежнее значение, пересчёт — в фоне.
+    assert cache.get_or_refresh("swr:stale", compute, soft_ttl=0, hard_ttl=120) == {"n": 1}
+    assert _wait_for(lambda: cache.get_json("swr:stale")["value"] == {"n": 2})
+    assert _wait_for(lambda: not cache.get_client().exists("lock:swr:stale"))
+
+
+def test_get_or_refresh_single_refresher_for_stale_key(client):
+    compute = _Counter()
+    cache.get_or_refresh("swr:busy", compute, soft_ttl=0, hard_ttl=120)
+    # Лок уже держит другой процесс — этот не пересчитывает.
+    cache.get_client().set("lock:swr:busy", "someone-else", ex=30)
+
+    for _ in range(5):
+        assert cache.get_or_refresh("swr:busy", compute, soft_ttl=0, hard_ttl=120) == {"n": 1}
+    time.sleep(0.1)
+    assert compute.calls == 1
+
+
+def test_get_or_refresh_miss_waits_for_lock_holder(client):
+    cache.get_client().set("lock:swr:miss", "holder", ex=30)
+
+    def holder_finishes():
+        time.sleep(0.2)
+        cache.set_json("swr:miss", {"value": "from-holder", "fresh_until": time.time() + 60}, ttl=120)
+        cache.get_client().delete("lock:swr:miss")
+
+    threading.Thread(target=holder_finishes).start()
+    compute = _Counter()
+    assert cache.get_or_refresh("swr:miss", compute, soft_ttl=60, hard_ttl=120) == "from-holder"
+    assert compute.calls == 0
+
+
+def test_get_or_refresh_cache_if_false_is_not_stored(client):
+    value = cache.get_or_refresh(
+        "swr:skip", lambda: {"degraded": ["activity"]}, soft_ttl=60, hard_ttl=120,
+        cache_if=lambda v: not v["degraded"],
+    )
+    assert value == {"degraded": ["activity"]}
+    assert cache.get_json("swr:skip") is None
+    assert not cache.get_client().exists("lock:swr:skip")
+
+
+# --- пространства имён с поколениями ---
+
+def test_bump_namespace_moves_keys_to_new_generation(client):
+    old_key = cache.namespaced_key("skills_list", 1, 0, 100)
+    cache.set_json(old_key, ["cached"], ttl=60)
+    other_key = cache.namespaced_key("subjects_list", 0, 100)
+    cache.set_json(other_key, ["other"], ttl=60)
+
+    cache.bump_namespace("skills_list")
+
+    new_key = cache.namespaced_key("skills_list", 1, 0, 100)
+    assert new_key != old_key
+    assert cache.get_json(new_key) is None
+    # Старый ключ не удаляется — просто больше не читается и доживает TTL.
+    assert cache.get_client().ttl(old_key) > 0
+    # Соседнее пространство имён не задето.
+    assert cache.namespaced_key("subjects_list", 0, 100) == other_key
+    assert cache.get_json(other_key) == ["other"]
+
+
+# --- локальный уровень перед Redis ---
+
+def test_local_tier_serves_hits_without_redis(client):
+    cache.set_json("tier:subjects", [{"id": 1}], ttl=60)
+    # Удаляем в обход модуля (без инвалидации) — видно, что ответ из памяти.
+    cache.get_client().delete("tier:subjects")
+
+    assert cache.get_json("tier:subjects") == [{"id": 1}]
+    stats = cache.stats()
+    assert stats["local_hits"] == 1
+    assert stats["redis_hits"] == 0
+
+
+def test_local_tier_miss_falls_through_to_redis_and_is_kept(client):
+    cache.get_client().set("tier:skills", '["x"]')
+
+    assert cache.get_json("tier:skills") == ["x"]
+    assert cache.get_json("tier:skills") == ["x"]
+    stats = cache.stats()
+    assert (stats["redis_hits"], stats["local_hits"]) == (1, 1)
+
+
+def test_local_tier_invalidated_by_other_worker_publish(client):
+    cache.set_json("tier:scenario", {"id": 1}, ttl=60)
+    cache.get_client().set("tier:scenario", '{"id": 2}')
+    assert cache.get_json("tier:scenario") == {"id": 1}
+
+    # Так выглядит set_json в другом воркере.
+    cache.get_client().publish(cache.INVALIDATION_CHANNEL, "other-worker tier:scenario")
+
+    assert _wait_for(lambda: cache.get_json("tier:scenario") == {"id": 2})
+
+
+def test_local_tier_respects_byte_cap(client, monkeypatch):
+    monkeypatch.setattr(config, "LOCAL_CACHE_MAX_BYTES", 100)
+    for i in range(5):
+        cache.set_json(f"tier:big:{i}", "x" * 30, ttl=60)
+
+    stats = cache.stats()
+    assert stats["local_bytes"] <= 100
+    assert stats["local_entries"] == 3
+    # Вытеснены самые старые.
+    cache.get_client().delete("tier:big:0", "tier:big:4")
+    assert cache.get_json("tier:big:0") is None
+    assert cache.get_json("tier:big:4") == "x" * 30
+
+
+# --- response_cache ---
+
+def test_cached_response_hit_serves_stored_gzip_bytes(client, content_manager_admin, subject):
+    headers = {**authorization_header(content_manager_admin), "Accept-Encoding": "gzip"}
+    for i in range(20):
+        client.post("/admin/skills/", headers=authorization_header(content_manager_admin),
+                    json={"subject_id": subject.id, "name": f"Тема {i}", "code": f"gz-skill-{i}"})
+
+    first = client.get("/admin/skills/", headers=headers)
+    key = cache.namespaced_key("skills_list", None, 0, 100)
+    stored = cache.get_fields(key)
+    assert first.headers["content-encoding"] == "gzip"
+    # ETag версии содержимого (_conditional), а не хеш тела из кеша.
+    assert first.headers["etag"].startswith('"skills_list.g')
+    assert "Accept-Encoding" in first.headers["vary"]
+
+    # Попадание отдаёт ровно сохранённые байты, а не пересжатое тело.
+    second = client.get("/admin/skills/", headers=headers)
+    assert second.headers["content-encoding"] == "gzip"
+    assert int(second.headers["content-length"]) == len(stored["gzip"])
+    assert second.json() == first.json()
+    assert len(second.json()) == 20
+
+
+def test_cached_response_identity_when_encoding_not_accepted(client):
+    response = client.get("/api/subjects/", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"].startswith('"subjects_list.g')
+
+
+def test_negotiate_respects_quality_and_available_encodings():
+    fields = response_cache.encode_payload([{"name": "x" * 2000}])
+    assert response_cache.negotiate("gzip, deflate", fields) == "gzip"
+    assert response_cache.negotiate("gzip;q=0, *", fields) == ("br" if "br" in fields else "identity")
+    assert response_cache.negotiate("deflate", fields) == "identity"
+    # Маленькие тела не сжимаются вовсе.
+    assert response_cache.negotiate("gzip", response_cache.encode_payload([])) == "identity"
+
+
+def test_game_catalog_is_served_precompressed(client, user):
+    response = client.get("/api/games/catalog", headers={**_student_header(user), "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["entries"]
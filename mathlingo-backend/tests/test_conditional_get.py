@@ -0,0 +1,97 @@
+"""
+Условные GET (app/routes/_conditional.py): ETag из версии содержимого,
+304 на совпавший If-None-Match — после auth-зависимости роута, но без
+запросов к БД (принципал из кеша), — и новая версия после правки контента.
+"""
+from sqlalchemy import event
+
+from tests.conftest import authorization_header
+from tests.test_task_submission import _make_published_task, _make_task_group
+
+
+def _student_header(user):
+    from app.auth import create_access_token
+
+    token = create_access_token({"sub": user.email})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_catalog_not_modified_skips_db(client, db, user):
+    headers = _student_header(user)
+    first = client.get("/api/games/catalog", headers=headers)
+    etag = first.headers["etag"]
+    assert etag.startswith('"catalog.')
+
+    statements = []
+    engine = db.get_bind()
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        second = client.get("/api/games/catalog", headers={**headers, "If-None-Match": etag})
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+    assert statements == []
+
+
+def test_not_modified_requires_valid_token(client, user):
+    etag = client.get("/api/games/catalog", headers=_student_header(user)).headers["etag"]
+
+    response = client.get("/api/games/catalog", headers={"If-None-Match": etag})
+    assert response.status_code == 401
+
+
+def test_not_modified_only_after_route_auth(client, user, admin):
+    etag = client.get("/admin/skills/", headers=authorization_header(admin)).headers["etag"]
+    assert client.get("/admin/skills/", headers={**authorization_header(admin), "If-None-Match": etag}).status_code == 304
+
+    # Подпись токена ученика верна, но админ-зависимость его не пускает —
+    # 304 (и тем самым «не менялось») он не получает.
+    response = client.get("/admin/skills/", headers={**_student_header(user), "If-None-Match": etag})
+    assert response.status_code in (401, 403)
+
+    headers = _student_header(user)
+    etag = client.get("/api/games/catalog", headers=headers).headers["etag"]
+    client.put(f"/admin/users/{user.id}/status", headers=authorization_header(admin), json={"is_active": False})
+    assert client.get("/api/games/catalog", headers={**headers, "If-None-Match": etag}).status_code == 403
+
+
+def test_subjects_etag_changes_after_edit(client, content_manager_admin):
+    etag = client.get("/api/subjects/").headers["etag"]
+    assert client.get("/api/subjects/", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post(
+        "/admin/subjects",
+        headers=authorization_header(content_manager_admin),
+        json={"name": "ETag Subject", "code": "etag-subject"},
+    )
+
+    response = client.get("/api/subjects/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert "ETag Subject" in {s["name"] for s in response.json()}
+
+
+def test_task_group_data_etag_bumped_by_task_edit(client, db, user, subject):
+    group = _make_task_group(db, subject)
+    task = _make_published_task(db, subject, task_group_id=group.id)
+    headers = _student_header(user)
+    url = f"/gamification/task-groups/{group.id}/data"
+
+    first = client.get(url, headers=headers)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert client.get(url, headers={**headers, "If-None-Match": etag}).status_code == 304
+    # POST (как шлёт фронт сейчас) — всегда полный ответ.
+    assert client.post(url, headers={**headers, "If-None-Match": etag}).status_code == 200
+
+    task.reward_points = 25
+    db.commit()
+
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["totalPoints"] == 25
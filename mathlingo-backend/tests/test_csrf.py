@@ -58,3 +58,46 @@ def test_csrf_token_survives_across_independent_client_instances():
 
     assert worker_b.get("csrf:some-auth-token") == "issued-csrf-value"
 
+
+
+# --- CSRF_MODE=hmac ---
+
+def test_hmac_mode_round_trip_without_redis(client, user, monkeypatch):
+    from app import config
+
+    monkeypatch.setattr(config, "CSRF_MODE", "hmac")
+    token = create_access_token({"sub": user.email})
+    client.cookies.set("token", token)
+    csrf_token = client.get("/api/me").headers["x-csrf-token"]
+    assert cache.get_client().get(f"csrf:{token}") is None
+
+    response = client.put(
+        "/api/me/update",
+        headers={"X-CSRF-Token": csrf_token},
+        json={"username": "updated"},
+    )
+    assert response.status_code == 200
+
+
+def test_hmac_mode_rejects_token_of_other_session_and_forged(client, user, monkeypatch):
+    from app import config
+    from app.auth import create_csrf_token
+
+    monkeypatch.setattr(config, "CSRF_MODE", "hmac")
+    token = create_access_token({"sub": user.email})
+    client.cookies.set("token", token)
+
+    other_session = create_csrf_token("another-auth-token", 3600)
+    forged = f"{other_session.split('.')[0]}.{'0' * 64}"
+    for csrf_token in (other_session, forged, "garbage"):
+        response = client.put("/api/me/update", headers={"X-CSRF-Token": csrf_token}, json={"username": "x"})
+        assert response.status_code == 403
+
+
+def test_hmac_token_expires():
+    from app.auth import create_csrf_token, verify_csrf_token
+
+    assert verify_csrf_token("auth", create_csrf_token("auth", 60))
+    assert not verify_csrf_token("auth", create_csrf_token("auth", -1))
+    expires = create_csrf_token("auth", 60).split(".")[0]
+    assert not verify_csrf_token("auth", f"{expires}.ёж")
@@ -4,8 +4,13 @@
 GET /admin/dashboard/overview (teacher видит dashboard частично — без этого
 раздела, см. docs/roadmap/product-technical-plan.md R3 §5).
 """
+import time
 from datetime import datetime, timedelta
 
+import pytest
+
+from app import config
+
 from app.models import (
     AIGenerationItem, AIGenerationOrder, Attempt, ContentFlag,
     GameScenario, MasteryState, PromptTemplate, Skill, Task,
@@ -174,6 +179,64 @@ def test_admin_activity_summary_returns_recent_entries(client, db, content_manag
     assert entries[0]["method"] == "POST"
 
 
+# --- get_overview: параллельные разделы и таймауты ---
+
+def _stub_sections(monkeypatch, delays):
+    # Заглушки разделов без запросов к БД: SQLite в тестах — одно
+    # соединение на процесс, настоящие разделы параллельно на нём не гоняем.
+    for name in dashboard.SECTIONS:
+        def section(_db, name=name):
+            time.sleep(delays.get(name, 0))
+            return f"{name}-result"
+        monkeypatch.setitem(dashboard.SECTIONS, name, section)
+
+
+def test_overview_runs_sections_in_parallel(client, db, monkeypatch):
+    _stub_sections(monkeypatch, {name: 0.2 for name in dashboard.SECTIONS})
+
+    started = time.perf_counter()
+    overview = dashboard.get_overview(db, include_admin_actions=True, parallel=True)
+    elapsed = time.perf_counter() - started
+
+    # Последовательно было бы 7 × 0.2 с.
+    assert elapsed < 0.8
+    assert overview["degraded"] == []
+    assert overview["activity"] == "activity-result"
+    assert set(overview["section_timings_ms"]) == set(dashboard.SECTIONS)
+    assert all(ms >= 150 for ms in overview["section_timings_ms"].values())
+
+
+def test_overview_slow_section_degrades_to_none(client, db, monkeypatch):
+    monkeypatch.setattr(config, "DASHBOARD_SECTION_TIMEOUT_SECONDS", 0.3)
+    _stub_sections(monkeypatch, {"review_queue": 1.5})
+
+    started = time.perf_counter()
+    overview = dashboard.get_overview(db, include_admin_actions=False, parallel=True)
+
+    assert time.perf_counter() - started < 1.0
+    assert overview["review_queue"] is None
+    assert overview["degraded"] == ["review_queue"]
+    assert overview["ai_quality"] == "ai_quality-result"
+    assert overview["admin_actions"] is None
+    assert "admin_actions" not in overview["section_timings_ms"]
+
+
+@pytest.mark.parametrize("parallel", [True, False])
+def test_overview_failing_section_degrades_to_none(client, db, monkeypatch, parallel):
+    _stub_sections(monkeypatch, {})
+
+    def broken(_db):
+        raise RuntimeError("canceling statement due to statement timeout")
+    monkeypatch.setitem(dashboard.SECTIONS, "skill_progress", broken)
+
+    overview = dashboard.get_overview(db, include_admin_actions=True, parallel=parallel)
+
+    assert overview["skill_progress"] is None
+    assert overview["degraded"] == ["skill_progress"]
+    assert overview["activity"] == "activity-result"
+    assert "skill_progress" in overview["section_timings_ms"]
+
+
 # --- HTTP: роль teacher не видит admin_actions ---
 
 def test_dashboard_endpoint_requires_auth(client):
@@ -201,3 +264,5 @@ def test_dashboard_endpoint_shape(client, content_manager_admin):
     body = response.json()
     for key in ("activity", "skill_progress", "game_completion", "ai_quality", "review_queue", "publish_errors"):
         assert key in body
+        assert body[key] is not None
+    assert body["degraded"] == []
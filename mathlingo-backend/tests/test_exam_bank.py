@@ -116,6 +116,16 @@ def test_topics_facets(client, user, db):
     assert by_topic["Уравнения"] == 1
 
 
+def test_topics_facets_cache_invalidated_on_import(client, user, admin):
+    assert client.get("/api/exam/topics", headers=_student_header(user)).json() == []
+
+    client.post("/admin/exam/import", headers=authorization_header(admin),
+                files={"file": ("pack.ndjson", SAMPLE_PACK, "application/x-ndjson")})
+
+    facets = client.get("/api/exam/topics", headers=_student_header(user)).json()
+    assert {f["topic"] for f in facets} == {"Арифметика", "Производная"}
+
+
 def test_get_task_404_and_auth(client, user):
     assert client.get("/api/exam/tasks/999999", headers=_student_header(user)).status_code == 404
     assert client.get("/api/exam/tasks").status_code == 401
@@ -0,0 +1,116 @@
+"""
+Очередь интервального повторения тренажёра (app/services/exam_review.py):
+шаг SM-2, подбор созревших повторений в /api/exam/next и пересборка
+очереди из attempts.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.auth import create_access_token
+from app.models import Attempt, ExamReviewItem, ExamTask
+from app.services import exam_review
+
+NOW = datetime(2026, 8, 12, 9, 0)
+
+
+def _hdr(user):
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.email})}"}
+
+
+def _seed(db, statement, answer="1", difficulty=1):
+    task = ExamTask(exam="oge", task_number=1, topic="Арифметика", difficulty=difficulty,
+                    statement=statement, answer_type="single_answer", answer=answer, source="manual")
+    db.add(task)
+    db.commit()
+    return task
+
+
+def _fresh_item():
+    return exam_review._new_item(user_id=1, task_id=1, now=NOW)
+
+
+def test_correct_answers_grow_interval_sm2():
+    item = _fresh_item()
+    intervals = []
+    for day in range(4):
+        exam_review.schedule(item, True, NOW + timedelta(days=day))
+        intervals.append(item.interval_days)
+    assert intervals == [1, 6, 15, 38]
+    assert item.repetitions == 4 and item.ease_factor == pytest.approx(2.5)
+    assert item.due_at == NOW + timedelta(days=3 + 38)
+
+
+def test_wrong_answer_resets_repetitions_and_returns_soon():
+    item = _fresh_item()
+    exam_review.schedule(item, True, NOW)
+    exam_review.schedule(item, True, NOW)
+    exam_review.schedule(item, False, NOW)
+
+    assert item.repetitions == 0 and item.interval_days == 0 and item.lapses == 1
+    assert item.due_at == NOW + exam_review.RETRY_DELAY
+    assert item.ease_factor == pytest.approx(2.5 - 0.54)
+
+    # Ease не опускается ниже MIN_EASE, сколько ни ошибайся.
+    for _ in range(5):
+        exam_review.schedule(item, False, NOW)
+    assert item.ease_factor == exam_review.MIN_EASE
+
+
+def test_due_review_comes_before_unseen(client, user, db):
+    a = _seed(db, "A")
+    b = _seed(db, "B")
+    client.post("/api/exam/attempt", headers=_hdr(user), json={"task_id": a.id, "answer": "1"})
+
+    item = db.query(ExamReviewItem).filter(ExamReviewItem.exam_task_id == a.id).one()
+    assert item.user_id == user.id and item.interval_days == 1
+    # Завтра ещё не наступило — новое задание важнее.
+    assert client.get("/api/exam/next", headers=_hdr(user)).json()["id"] == b.id
+
+    item.due_at = datetime.utcnow() - timedelta(minutes=1)
+    db.commit()
+    assert client.get("/api/exam/next", headers=_hdr(user)).json()["id"] == a.id
+
+
+def test_failed_task_returns_after_retry_delay(client, user, db):
+    a = _seed(db, "A")
+    b = _seed(db, "B", difficulty=2)
+    client.post("/api/exam/attempt", headers=_hdr(user), json={"task_id": a.id, "answer": "нет"})
+    assert client.get("/api/exam/next", headers=_hdr(user)).json()["id"] == b.id
+
+    item = db.query(ExamReviewItem).filter(ExamReviewItem.exam_task_id == a.id).one()
+    item.due_at -= exam_review.RETRY_DELAY
+    db.commit()
+    assert client.get("/api/exam/next", headers=_hdr(user)).json()["id"] == a.id
+
+
+def _snapshot(db):
+    return sorted(
+        (i.user_id, i.exam_task_id, i.repetitions, i.interval_days,
+         round(i.ease_factor, 6), i.lapses, i.due_at, i.last_reviewed_at)
+        for i in db.query(ExamReviewItem)
+    )
+
+
+def test_rebuild_replays_attempts_into_same_state(client, user, db):
+    a = _seed(db, "A")
+    b = _seed(db, "B")
+    history = [(a, False), (a, True), (b, True), (a, True), (b, False)]
+    for step, (task, correct) in enumerate(history):
+        at = NOW + timedelta(hours=step)
+        db.add(Attempt(user_id=user.id, content_type="exam", content_id=task.id,
+                       is_correct=correct, source="manual", created_at=at))
+        exam_review.record_review(db, user.id, task.id, correct, now=at)
+    # Попытка адвенчера с тем же id в очередь не попадает.
+    db.add(Attempt(user_id=user.id, content_type="task", content_id=b.id, is_correct=True))
+    db.commit()
+    incremental = _snapshot(db)
+
+    db.query(ExamReviewItem).delete()
+    db.commit()
+    assert exam_review.rebuild(db) == 2
+    assert _snapshot(db) == incremental
+
+    # Повторный прогон не дублирует строки.
+    assert exam_review.rebuild(db, user.id) == 2
+    assert _snapshot(db) == incremental
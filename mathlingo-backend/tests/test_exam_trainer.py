@@ -103,6 +103,19 @@ def test_next_prefers_unseen_then_unsolved(client, user, db):
     assert client.get("/api/exam/next", headers=_hdr(user)).json()["id"] in (a.id, b.id)
 
 
+def test_next_orders_by_difficulty_and_ignores_other_content_types(client, user, db):
+    hard = _seed(db, statement="hard", difficulty=3)
+    easy = _seed(db, statement="easy", difficulty=1)
+    # Попытка обычного задания с тем же id — не попытка экзаменационного.
+    db.add(Attempt(user_id=user.id, content_type="task", content_id=easy.id, is_correct=True))
+    db.commit()
+
+    assert client.get("/api/exam/next", headers=_hdr(user)).json()["id"] == easy.id
+
+    client.post("/api/exam/attempt", headers=_hdr(user), json={"task_id": easy.id, "answer": "4"})
+    assert client.get("/api/exam/next", headers=_hdr(user)).json()["id"] == hard.id
+
+
 def test_next_respects_filters_and_404s_when_empty(client, user, db):
     _seed(db, exam="oge", task_number=1)
     _seed(db, exam="ege", track="profile", task_number=7, topic="Производная")
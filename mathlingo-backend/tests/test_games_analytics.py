@@ -8,6 +8,8 @@ from datetime import datetime, timedelta
 
 from app.auth import create_access_token
 from app.models import GameEvent, GameSession, UserGameProgress
+from app.services import game_rollups, game_telemetry
+from app.services.game_analytics import compute_game_engagement, compute_game_engagement_from_events
 from tests.conftest import authorization_header
 
 
@@ -22,6 +24,23 @@ def _post_events(client, user, game_id, events, end_session=True, session_id=Non
     return client.post("/api/games/events", headers=_student_header(user), json=body).json()
 
 
+def _other_student(db):
+    from app.auth import hash_password
+    from app.models import User
+
+    other = User(username="other", email="other@example.com", hashed_password=hash_password("password123"))
+    db.add(other)
+    db.commit()
+    db.refresh(other)
+    return other
+
+
+def _add_event(db, session, event_type, payload):
+    # Прямая запись в обход приёма — типизированные колонки заполняем сами.
+    db.add(GameEvent(session_id=session.id, event_type=event_type, payload=payload,
+                     **game_telemetry.extract_fields(payload)))
+
+
 def _stats(payload, game_id):
     return next(g for g in payload["games"] if g["game_id"] == game_id)
 
@@ -123,10 +142,11 @@ def test_analytics_days_window_excludes_old_sessions(client, user, admin, db):
     db.add(old)
     db.commit()
     db.refresh(old)
-    db.add(GameEvent(session_id=old.id, event_type="level_start", payload={"level_id": "gj-5"}))
-    db.add(GameEvent(session_id=old.id, event_type="level_complete",
-                     payload={"level_id": "gj-5", "moves": 9, "stars": 1}))
+    _add_event(db, old, "level_start", {"level_id": "gj-5"})
+    _add_event(db, old, "level_complete", {"level_id": "gj-5", "moves": 9, "stars": 1})
     db.commit()
+    # Записано в обход приёма батчей — роллапы догоняет компактор.
+    game_rollups.rebuild(db)
 
     all_time = _stats(client.get("/admin/games/analytics",
                                  headers=authorization_header(admin)).json(), "gauss_jordan")
@@ -155,6 +175,82 @@ def test_analytics_unknown_game_404(client, admin):
     assert resp.status_code == 404
 
 
+# --- Роллапы против эталона ---
+
+def test_rollups_match_event_based_summary(client, user, db):
+    other = _other_student(db)
+    # Исход сессии меняется между батчами: сначала abandon, потом complete.
+    sid = _post_events(client, user, "gauss_jordan", [
+        {"event_type": "level_start", "payload": {"level_id": "gj-1"}},
+        {"event_type": "level_abandon", "payload": {"level_id": "gj-1"}},
+    ], end_session=False)["session_id"]
+    _post_events(client, user, "gauss_jordan", [
+        {"event_type": "level_start", "payload": {"level_id": "gj-1"}},
+        {"event_type": "level_complete", "payload": {"level_id": "gj-1", "moves": 5, "stars": 2}},
+    ], session_id=sid)
+    _post_events(client, other, "gauss_jordan", [
+        {"event_type": "level_start", "payload": {"level_id": "gj-2"}},
+        {"event_type": "level_complete", "payload": {"level_id": "gj-2", "moves": 3, "stars": 3}},
+        {"event_type": "level_start", "payload": {}},
+        {"event_type": "level_abandon", "payload": {}},
+    ])
+    _post_events(client, other, "gauss_jordan", [
+        {"event_type": "level_start", "payload": {"level_id": "gj-2"}},
+    ], end_session=False)
+    client.post("/api/games/progress", headers=_student_header(other),
+                json={"game_id": "gauss_jordan", "level_id": "gj-2", "stars": 3, "metric": 3})
+
+    for game_id in GameSession.GAME_IDS:
+        assert compute_game_engagement(db, game_id) == compute_game_engagement_from_events(db, game_id)
+        assert game_rollups.check_consistency(db, game_id) == []
+
+    # Полный пересчёт даёт те же роллапы, что инкрементальный путь.
+    incremental = compute_game_engagement(db, "gauss_jordan")
+    game_rollups.rebuild(db)
+    assert compute_game_engagement(db, "gauss_jordan") == incremental
+
+
+def test_rollups_days_window_matches_events(client, user, admin, db):
+    other = _other_student(db)
+    since = datetime(2026, 7, 20, 12, 30)
+    # Сессии по обе стороны since в один день и в следующий полный день;
+    # user играет и в неполный день, и в полный — игрок один.
+    for owner, started_at, level_id in (
+        (user, since - timedelta(hours=4), "ea-1"),
+        (user, since + timedelta(hours=2), "ea-1"),
+        (other, since + timedelta(hours=3), "ea-2"),
+        (user, since + timedelta(days=1), "ea-2"),
+    ):
+        session = GameSession(user_id=owner.id, game_id="eigen_arrow", started_at=started_at,
+                              ended_at=started_at + timedelta(minutes=5))
+        db.add(session)
+        db.flush()
+        _add_event(db, session, "level_start", {"level_id": level_id})
+        _add_event(db, session, "level_complete", {"level_id": level_id, "ticks": 7, "stars": 3})
+    db.commit()
+    game_rollups.rebuild(db)
+
+    summary = compute_game_engagement(db, "eigen_arrow", since)
+    assert summary == compute_game_engagement_from_events(db, "eigen_arrow", since)
+    assert summary["sessions_total"] == 3 and summary["players"] == 2
+    assert compute_game_engagement(db, "eigen_arrow", since.replace(hour=0, minute=0)) == \
+        compute_game_engagement_from_events(db, "eigen_arrow", since.replace(hour=0, minute=0))
+
+
+def test_analytics_days_window_is_exact(client, user, admin, db):
+    _post_events(client, user, "eigen_arrow", [
+        {"event_type": "level_start", "payload": {"level_id": "ea-1"}},
+        {"event_type": "level_complete", "payload": {"level_id": "ea-1", "ticks": 7, "stars": 3}},
+    ])
+    requested_at = datetime.utcnow()
+    payload = client.get("/admin/games/analytics", params={"days": 1, "game_id": "eigen_arrow"},
+                         headers=authorization_header(admin)).json()
+    since = datetime.fromisoformat(payload["since"])
+    # Окно — ровно сутки назад, а не полночь.
+    assert abs((requested_at - timedelta(days=1) - since).total_seconds()) < 60
+    assert payload["games"][0] == compute_game_engagement_from_events(db, "eigen_arrow", since)
+
+
 # --- Авторизация ---
 
 def test_analytics_requires_admin(client, user):
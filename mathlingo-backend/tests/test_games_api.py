@@ -4,8 +4,17 @@
 (как и остальные студенческие эндпоинты); CSRF в тестах не участвует, т.к.
 нет cookie `token` (см. csrf_protection в main.py).
 """
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
 from app.auth import create_access_token
 from app.models import GameEvent, GameSession, User, UserGameProgress
+from app.schemas import MAX_EVENTS_PER_BATCH
+from app.services import game_telemetry
 
 
 def _student_header(user):
@@ -46,6 +55,21 @@ def test_post_events_creates_session(client, user, db):
     assert db.query(GameEvent).filter(GameEvent.session_id == session_id).count() == 2
 
 
+def test_post_events_extracts_typed_columns(client, user, db):
+    client.post("/api/games/events", headers=_student_header(user), json={
+        "game_id": "eigen_arrow",
+        "events": [
+            {"event_type": "level_complete", "payload": {"level_id": "ea-2", "ticks": 7, "stars": 3}},
+            {"event_type": "move_made", "payload": {"op": "tick", "stars": True}},
+        ],
+    })
+    complete, move = db.query(GameEvent).order_by(GameEvent.id).all()
+    assert (complete.level_id, complete.stars, complete.metric) == ("ea-2", 3, 7.0)
+    # Нераспознанное (нет level_id, bool вместо числа звёзд) — NULL.
+    assert (move.level_id, move.stars, move.metric) == (None, None, None)
+    assert move.payload == {"op": "tick", "stars": True}
+
+
 def test_post_events_continues_existing_session(client, user, db):
     first = client.post("/api/games/events", headers=_student_header(user), json={
         "game_id": "gauss_jordan",
@@ -119,6 +143,129 @@ def test_events_unknown_game_rejected_422(client, user):
     assert resp.status_code == 422
 
 
+def _ndjson(header, events):
+    return "\n".join(json.dumps(line) for line in [header, *events]).encode()
+
+
+def test_post_events_ndjson_body(client, user, db):
+    body = _ndjson({"game_id": "gauss_jordan"}, [
+        {"event_type": "level_start", "payload": {"level_id": "gj-1"}},
+        {"event_type": "move_made", "payload": {"op": "swap"}, "client_ts": "2026-01-01T10:00:00"},
+    ])
+    resp = client.post(
+        "/api/games/events", content=body,
+        headers={**_student_header(user), "Content-Type": "application/x-ndjson"},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["accepted"] == 2
+    events = db.query(GameEvent).order_by(GameEvent.id).all()
+    assert [e.event_type for e in events] == ["level_start", "move_made"]
+    assert events[1].payload == {"op": "swap"}
+
+
+def test_post_events_gzip_body(client, user, db):
+    body = gzip.compress(json.dumps({
+        "game_id": "gauss_jordan",
+        "events": [{"event_type": "move_made", "payload": {"i": i}} for i in range(150)],
+    }).encode())
+    resp = client.post(
+        "/api/games/events", content=body,
+        headers={**_student_header(user), "Content-Type": "application/json", "Content-Encoding": "gzip"},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["accepted"] == 150
+    assert db.query(GameEvent).count() == 150
+
+
+def test_post_events_broken_gzip_400(client, user):
+    resp = client.post(
+        "/api/games/events", content=b"not gzip",
+        headers={**_student_header(user), "Content-Type": "application/json", "Content-Encoding": "gzip"},
+    )
+    assert resp.status_code == 400
+
+
+def test_post_events_retry_with_same_batch_id_is_idempotent(client, user, db):
+    payload = {
+        "game_id": "gauss_jordan",
+        "batch_id": "b-1",
+        "events": [{"event_type": "level_start", "payload": {}}, {"event_type": "move_made", "payload": {}}],
+    }
+    first = client.post("/api/games/events", headers=_student_header(user), json=payload)
+    retry = client.post("/api/games/events", headers=_student_header(user), json=payload)
+
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    assert db.query(GameSession).count() == 1
+    assert db.query(GameEvent).count() == 2
+
+
+def test_post_events_over_batch_limit_rejected_422(client, user):
+    resp = client.post("/api/games/events", headers=_student_header(user), json={
+        "game_id": "gauss_jordan",
+        "events": [{"event_type": "move_made"}] * (MAX_EVENTS_PER_BATCH + 1),
+    })
+    assert resp.status_code == 422
+
+
+def test_post_events_tz_aware_client_ts_stored_as_utc(client, user, db):
+    resp = client.post("/api/games/events", headers=_student_header(user), json={
+        "game_id": "gauss_jordan",
+        "events": [{"event_type": "move_made", "client_ts": "2026-01-01T13:00:00+03:00"}],
+    })
+    assert resp.status_code == 200
+    assert db.query(GameEvent).one().client_ts == datetime(2026, 1, 1, 10, 0)
+
+
+class _CopyCursor:
+    def __init__(self):
+        self.sql = None
+        self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def copy_expert(self, sql, file):
+        self.sql = sql
+        self.data = file.read()
+
+
+def test_copy_rows_csv_quoting_and_nulls():
+    # Путь Postgres (COPY ... FORMAT csv) без Postgres: проверяем, что
+    # уходит в copy_expert.
+    cursor = _CopyCursor()
+    db = SimpleNamespace(connection=lambda: SimpleNamespace(connection=SimpleNamespace(cursor=lambda: cursor)))
+    created_at = datetime(2026, 1, 1, 12, 0)
+    rows = [
+        {
+            "session_id": 7, "event_type": "move_made",
+            "payload": {"note": 'запятая, "кавычки"\nи перенос'},
+            "client_ts": game_telemetry._naive_utc(datetime(2026, 1, 1, 13, 0, tzinfo=timezone(timedelta(hours=3)))),
+            "created_at": created_at, "level_id": "gj-1", "stars": 3, "metric": 1.5,
+        },
+        {
+            "session_id": 7, "event_type": "level_start", "payload": None, "client_ts": None,
+            "created_at": created_at, "level_id": None, "stars": None, "metric": None,
+        },
+    ]
+    game_telemetry._copy_rows(db, rows)
+
+    assert cursor.sql == (
+        "COPY game_events (session_id, event_type, payload, client_ts, created_at, level_id, stars, metric)"
+        " FROM STDIN WITH (FORMAT csv)"
+    )
+    first, second = list(csv.reader(io.StringIO(cursor.data)))
+    assert json.loads(first[2]) == rows[0]["payload"]
+    assert first[3] == "2026-01-01T10:00:00"
+    assert first[5:] == ["gj-1", "3", "1.5"]
+    # NULL в CSV-формате COPY — пустое некавыченное поле (а "" — пустая строка).
+    assert cursor.data.splitlines()[-1] == "7,level_start,,,2026-01-01T12:00:00,,,"
+    assert second[1] == "level_start"
+
+
 # --- Прогресс ---
 
 def test_progress_upsert_keeps_best_result(client, user, db):
@@ -150,6 +297,90 @@ def test_progress_upsert_keeps_best_result(client, user, db):
     assert row.best_metric == 12
 
 
+def test_progress_upsert_reports_leaderboard_deltas(client, user, monkeypatch):
+    from app.services import leaderboard
+
+    calls = []
+    monkeypatch.setattr(leaderboard, "record_progress", lambda *args: calls.append(args))
+    hdr = _student_header(user)
+    payload = {"game_id": "gauss_jordan", "level_id": "gj-1"}
+
+    client.post("/api/games/progress", headers=hdr, json={**payload, "stars": 2, "metric": 10})
+    resp = client.post("/api/games/progress", headers=hdr, json={**payload, "stars": 1, "metric": 3})
+    client.post("/api/games/progress", headers=hdr, json={**payload, "stars": 3, "metric": 20})
+
+    # Непобитый рекорд отвечает текущей строкой.
+    assert resp.json()["best_stars"] == 2 and resp.json()["best_metric"] == 10
+    assert calls == [
+        ("gauss_jordan", user.id, 2, 1),
+        ("gauss_jordan", user.id, 0, 0),
+        ("gauss_jordan", user.id, 1, 0),
+    ]
+
+
+def test_progress_batch_upsert(client, user, monkeypatch):
+    from app.services import leaderboard
+
+    calls = []
+    monkeypatch.setattr(leaderboard, "record_progress", lambda *args: calls.append(args))
+    hdr = _student_header(user)
+    client.post("/api/games/progress", headers=hdr,
+                json={"game_id": "gauss_jordan", "level_id": "gj-1", "stars": 3, "metric": 5})
+    calls.clear()
+
+    resp = client.post("/api/games/progress/batch", headers=hdr, json={"items": [
+        {"game_id": "gauss_jordan", "level_id": "gj-1", "stars": 2, "metric": 1},   # хуже рекорда
+        {"game_id": "gauss_jordan", "level_id": "gj-2", "stars": 1, "metric": 9},
+        {"game_id": "gauss_jordan", "level_id": "gj-2", "stars": 2, "metric": 9},   # повтор — лучший
+        {"game_id": "eigen_arrow", "level_id": "ea-1", "stars": 3, "metric": 4},
+    ]})
+    assert resp.status_code == 200
+    assert [(r["level_id"], r["best_stars"], r["best_metric"]) for r in resp.json()] == [
+        ("gj-1", 3, 5), ("gj-2", 2, 9), ("ea-1", 3, 4),
+    ]
+    assert sorted(calls) == [("eigen_arrow", user.id, 3, 1), ("gauss_jordan", user.id, 2, 1)]
+
+
+def test_concurrent_level_completions_do_not_conflict(file_sessions):
+    import threading
+
+    from app.services import game_progress
+
+    with file_sessions() as db:
+        racer = User(username="racer", email="racer@example.com", hashed_password="x")
+        db.add(racer)
+        db.commit()
+        user_id = racer.id
+
+    barrier = threading.Barrier(20)
+    outcomes, errors = [], []
+
+    def complete(stars):
+        with file_sessions() as db:
+            try:
+                barrier.wait()
+                result = game_progress.LevelResult(game_id="gauss_jordan", level_id="gj-1", stars=stars, metric=10)
+                (outcome,) = game_progress.upsert_best(db, user_id, [result])
+                outcomes.append((outcome.stars_delta, outcome.levels_delta))
+                db.commit()
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=complete, args=(i % 4,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with file_sessions() as db:
+        (row,) = db.query(UserGameProgress).filter(UserGameProgress.user_id == user_id).all()
+    assert row.best_stars == 3
+    # Сумма приростов лидерборда сходится с итоговой строкой.
+    assert sum(s for s, _ in outcomes) == 3
+    assert sum(n for _, n in outcomes) == 1
+
+
 def test_get_progress_filters_by_game(client, user):
     hdr = _student_header(user)
     client.post("/api/games/progress", headers=hdr,
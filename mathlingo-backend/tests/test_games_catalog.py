@@ -105,6 +105,151 @@ def test_leaderboard_me_is_none_without_progress(client, user):
     assert body["me"] is None
 
 
+def test_leaderboard_ties_broken_by_levels_then_id(client, db):
+    carol = _mk_user(db, "carol")
+    dave = _mk_user(db, "dave")
+    erin = _mk_user(db, "erin")
+    # Все по 3 звезды; erin — на двух уровнях, carol и dave — на одном.
+    _progress(client, dave, "gauss_jordan", "gj-1", 3, 2)
+    _progress(client, carol, "gauss_jordan", "gj-1", 3, 2)
+    _progress(client, erin, "gauss_jordan", "gj-1", 2, 2)
+    _progress(client, erin, "gauss_jordan", "gj-2", 1, 2)
+
+    body = client.get("/api/games/leaderboard", headers=_student_header(dave)).json()
+    assert [e["username"] for e in body["entries"]] == ["erin", "carol", "dave"]
+    assert body["me"]["rank"] == 3
+
+
+def test_leaderboard_zset_matches_reference_after_incremental_updates(client, db):
+    from app.services import leaderboard
+
+    alice = _mk_user(db, "alice3")
+    bob = _mk_user(db, "bob3")
+    # Первое чтение строит ZSET'ы из SQL, дальше — только инкременты.
+    client.get("/api/games/leaderboard", headers=_student_header(alice))
+    _progress(client, alice, "gauss_jordan", "gj-1", 1, 9)
+    _progress(client, alice, "gauss_jordan", "gj-1", 3, 4)   # улучшение звёзд
+    _progress(client, alice, "gauss_jordan", "gj-1", 2, 1)   # хуже — не считается
+    _progress(client, bob, "eigen_arrow", "ea-1", 0, 7)      # уровень без звёзд
+    _progress(client, bob, "gauss_jordan", "gj-1", 3, 3)
+
+    for game_id in (None, "gauss_jordan", "eigen_arrow"):
+        assert leaderboard.check_consistency(db, game_id) == []
+
+    # Поровну звёзд (3), у bob больше уровней.
+    top = leaderboard.get_leaderboard(db, limit=1, current_user_id=alice.id)
+    assert [e["username"] for e in top["entries"]] == ["bob3"]
+    assert top["me"] == {"rank": 2, "user_id": alice.id, "username": "alice3", "stars": 3, "levels_completed": 1}
+
+
+def test_leaderboard_rebuilds_after_redis_loss(client, db):
+    from app.services import cache, leaderboard
+
+    alice = _mk_user(db, "alice4")
+    _progress(client, alice, "gauss_jordan", "gj-1", 3, 2)
+    client.get("/api/games/leaderboard", headers=_student_header(alice))
+
+    cache.get_client().flushall()
+    assert leaderboard.check_consistency(db) != []
+
+    body = client.get("/api/games/leaderboard", headers=_student_header(alice)).json()
+    assert body["me"]["stars"] == 3
+    assert leaderboard.check_consistency(db) == []
+
+
+def test_deleted_user_removed_from_leaderboards(client, db, admin):
+    from app.services import leaderboard
+
+    alice = _mk_user(db, "alice6")
+    bob = _mk_user(db, "bob6")
+    client.get("/api/games/leaderboard", headers=_student_header(alice))
+    _progress(client, alice, "gauss_jordan", "gj-1", 2, 5)
+    _progress(client, bob, "gauss_jordan", "gj-1", 3, 4)
+    # Слияние прошедших дней окна закешировано до того, как bob удалён.
+    leaderboard.get_leaderboard(db, period="week")
+    bob_id = bob.id
+
+    resp = client.delete(f"/admin/users/{bob_id}", headers=authorization_header(admin))
+    assert resp.status_code == 200
+
+    for game_id in (None, "gauss_jordan"):
+        assert leaderboard.check_consistency(db, game_id) == []
+        for period in leaderboard.PERIODS:
+            body = leaderboard.get_leaderboard(db, game_id=game_id, period=period)
+            assert [e["user_id"] for e in body["entries"]] == [alice.id]
+
+
+def test_progress_saved_when_leaderboard_write_fails(client, db, monkeypatch):
+    import redis
+
+    from app.services import cache, leaderboard
+
+    alice = _mk_user(db, "alice7")
+    client.get("/api/games/leaderboard", headers=_student_header(alice))
+    assert cache.get_client().exists(leaderboard.READY_KEY)
+
+    def broken(*args, **kwargs):
+        raise redis.ConnectionError("redis down")
+    monkeypatch.setattr(leaderboard, "record_progress", broken)
+
+    resp = client.post("/api/games/progress", headers=_student_header(alice),
+                       json={"game_id": "gauss_jordan", "level_id": "gj-1", "stars": 3, "metric": 2})
+    assert resp.status_code == 200
+    # Прирост не записан — рейтинг помечен как несобранный и пересоберётся.
+    assert not cache.get_client().exists(leaderboard.READY_KEY)
+
+    monkeypatch.undo()
+    body = client.get("/api/games/leaderboard", headers=_student_header(alice)).json()
+    assert body["me"]["stars"] == 3
+
+
+def test_leaderboard_period_counts_only_gains_within_period(client, db):
+    from datetime import date
+
+    from app.services import leaderboard
+
+    alice = _mk_user(db, "alice5")
+    bob = _mk_user(db, "bob5")
+    # Среда 2026-10-14; неделя начинается 12-го, месяц — 1-го, квартал — 1 октября.
+    today = date(2026, 10, 14)
+    leaderboard.record_progress("gauss_jordan", alice.id, 3, 1, today=date(2026, 9, 20))  # прошлый квартал
+    leaderboard.record_progress("gauss_jordan", bob.id, 2, 1, today=date(2026, 10, 2))    # этот месяц
+    leaderboard.record_progress("gauss_jordan", alice.id, 1, 1, today=date(2026, 10, 13))  # эта неделя
+    leaderboard.record_progress("eigen_arrow", bob.id, 1, 1, today=today)
+
+    def standings(period, game_id=None):
+        body = leaderboard.get_leaderboard(db, game_id=game_id, period=period, today=today)
+        return [(e["username"], e["stars"], e["levels_completed"]) for e in body["entries"]]
+
+    assert standings("week") == [("alice5", 1, 1), ("bob5", 1, 1)]
+    assert standings("month") == [("bob5", 3, 2), ("alice5", 1, 1)]
+    assert standings("season") == [("bob5", 3, 2), ("alice5", 1, 1)]
+    assert standings("week", game_id="gauss_jordan") == [("alice5", 1, 1)]
+
+
+def test_leaderboard_day_buckets_expire(client, db, user):
+    from app.services import cache, leaderboard
+
+    _progress(client, user, "gauss_jordan", "gj-1", 3, 2)
+
+    bucket_keys = list(cache.get_client().scan_iter(f"{leaderboard.ZSET_PREFIX}:day:*"))
+    assert len(bucket_keys) == 2  # игра + сводный
+    for key in bucket_keys:
+        assert 0 < cache.get_client().ttl(key) <= leaderboard.BUCKET_TTL_SECONDS
+
+
+def test_leaderboard_period_param(client, db):
+    alice = _mk_user(db, "alice6")
+    _progress(client, alice, "gauss_jordan", "gj-1", 3, 2)
+
+    body = client.get("/api/games/leaderboard", params={"period": "week"},
+                      headers=_student_header(alice)).json()
+    assert body["period"] == "week"
+    assert body["me"]["stars"] == 3
+
+    bad = client.get("/api/games/leaderboard", params={"period": "decade"}, headers=_student_header(alice))
+    assert bad.status_code == 422
+
 # --- Учебный уровень: студент сам ---
 
 def test_me_reports_level_and_self_set(client, user):
@@ -159,3 +304,43 @@ def test_admin_override_requires_admin(client, user):
     resp = client.put(f"/admin/users/{user.id}/level",
                       headers=_student_header(user), json={"level": "student"})
     assert resp.status_code in (401, 403)
+
+
+def test_leaderboard_empty_past_window_merged_once(client, db, monkeypatch):
+    from datetime import date
+
+    from app.services import cache, leaderboard
+
+    redis_client = cache.get_client()
+    merges = []
+    zunionstore = redis_client.zunionstore
+
+    def counting_zunionstore(dest, keys, *args, **kwargs):
+        merges.append(dest)
+        return zunionstore(dest, keys, *args, **kwargs)
+    monkeypatch.setattr(redis_client, "zunionstore", counting_zunionstore)
+
+    # Тихий месяц: прошедших дней много, приростов нет.
+    for _ in range(3):
+        body = leaderboard.get_leaderboard(db, period="month", today=date(2026, 10, 20))
+        assert body["entries"] == []
+    assert merges == [f"{leaderboard.ZSET_PREFIX}:past:month:2026-10-20:global"]
+
+
+def test_leaderboard_window_result_key_is_per_day(client, db):
+    from datetime import date
+
+    from app.services import cache, leaderboard
+
+    alice = _mk_user(db, "alice8")
+    leaderboard.record_progress("gauss_jordan", alice.id, 2, 1, today=date(2026, 10, 14))
+
+    for day in (date(2026, 10, 14), date(2026, 10, 15)):
+        body = leaderboard.get_leaderboard(db, period="week", today=day, current_user_id=alice.id)
+        assert body["me"]["stars"] == 2
+
+    window_keys = sorted(cache.get_client().scan_iter(f"{leaderboard.ZSET_PREFIX}:window:*"))
+    assert window_keys == [
+        f"{leaderboard.ZSET_PREFIX}:window:week:2026-10-14:global",
+        f"{leaderboard.ZSET_PREFIX}:window:week:2026-10-15:global",
+    ]
@@ -0,0 +1,49 @@
+"""
+Ленивая сессия запроса (app/database.py: LazySession): попадание в кеш не
+создаёт сессию и не берёт соединение из пула; метрики пула считают выдачи.
+"""
+from sqlalchemy.orm import sessionmaker
+
+from app.database import LazySession, get_db, pool_metrics
+from app.models import Subject
+from main import app
+from tests.conftest import authorization_header
+
+
+def _lazy_get_db(bind):
+    # Как get_db, только на тестовой SQLite.
+    def dependency():
+        lazy = LazySession(sessionmaker(bind=bind))
+        try:
+            yield lazy
+        finally:
+            lazy.close()
+    return dependency
+
+
+def test_lazy_session_is_created_on_first_use(client, db):
+    lazy = LazySession(sessionmaker(bind=db.get_bind()))
+    assert lazy.get_bind() is db.get_bind()
+    assert not lazy.materialized
+
+    lazy.query(Subject).count()
+    assert lazy.materialized
+    lazy.close()
+
+
+def test_subjects_cache_hit_does_not_check_out_connection(client, db):
+    app.dependency_overrides[get_db] = _lazy_get_db(db.get_bind())
+    client.get("/api/subjects/")  # промах — считает и кладёт в кеш
+
+    before = pool_metrics.checkouts
+    response = client.get("/api/subjects/")
+    assert response.status_code == 200
+    assert pool_metrics.checkouts == before
+
+
+def test_runtime_stats_superadmin_only(client, admin, teacher_admin):
+    response = client.get("/admin/dashboard/runtime", headers=authorization_header(admin))
+    assert response.status_code == 200
+    assert response.json()["db_pool"]["checkouts"] >= 1
+
+    assert client.get("/admin/dashboard/runtime", headers=authorization_header(teacher_admin)).status_code == 403
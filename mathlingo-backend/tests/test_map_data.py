@@ -0,0 +1,107 @@
+"""
+GET /gamification/maps/{id}/data: скелет карты собирается фиксированным
+числом запросов, кешируется на карту и сбрасывается правкой контента;
+прогресс ученика накладывается поверх в каждом запросе.
+"""
+from sqlalchemy import event
+
+from app.auth import create_access_token
+from app.models import Achievement, MapLocation, TaskGroup, UserAchievement, UserCompletedLocation
+from app.routes import gamification_maps
+from tests.conftest import authorization_header
+from tests.test_task_submission import _make_published_task, _make_task_group
+
+
+def _build_map(db, subject):
+    first_group = _make_task_group(db, subject)
+    first = db.get(MapLocation, first_group.location_id)
+    second = MapLocation(
+        name="Loc 2", position_x=1, position_y=1,
+        adventure_map_id=first.adventure_map_id, unlocked_by_location_id=first.id,
+    )
+    db.add(second)
+    db.commit()
+    second_group = TaskGroup(name="Group 2", location_id=second.id)
+    db.add(second_group)
+    db.commit()
+    tasks = [
+        _make_published_task(db, subject, task_group_id=first_group.id),
+        _make_published_task(db, subject, task_group_id=second_group.id),
+        _make_published_task(db, subject, task_group_id=second_group.id),
+    ]
+    return first.adventure_map_id, first, second, second_group, tasks
+
+
+def _get(client, user, map_id):
+    client.cookies.set("token", create_access_token({"sub": user.email}))
+    return client.get(f"/gamification/maps/{map_id}/data")
+
+
+def test_skeleton_is_loaded_in_constant_number_of_queries(client, db, subject):
+    map_id, *_ = _build_map(db, subject)
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    bind = db.get_bind()
+    event.listen(bind, "before_cursor_execute", count)
+    try:
+        skeleton = gamification_maps._load_map_skeleton(db, map_id)
+    finally:
+        event.remove(bind, "before_cursor_execute", count)
+
+    # Карта, локации, группы, задания — независимо от их числа.
+    assert len(statements) == 4
+    assert [len(location["taskGroups"]) for location in skeleton["map"]["locations"]] == [1, 1]
+
+
+def test_map_data_layers_user_progress_on_skeleton(client, db, user, subject):
+    map_id, first, second, second_group, tasks = _build_map(db, subject)
+
+    data = _get(client, user, map_id).json()
+    locations = data["map"]["locations"]
+    assert [loc["id"] for loc in locations] == [first.id, second.id]
+    assert locations[1]["taskGroups"][0]["tasks"] == [tasks[1].id, tasks[2].id]
+    assert data["userProgress"]["unlockedLocations"] == [first.id]
+    assert data["userProgress"]["completedLocations"] == []
+
+    achievement = Achievement(name="First", description="d", icon_url="i", unlock_condition="{}")
+    db.add(achievement)
+    db.commit()
+    db.add(UserCompletedLocation(user_id=user.id, location_id=first.id))
+    db.add(UserAchievement(user_id=user.id, achievement_id=achievement.id))
+    db.commit()
+
+    progress = _get(client, user, map_id).json()["userProgress"]
+    assert progress["completedLocations"] == [first.id]
+    assert progress["unlockedLocations"] == [first.id, second.id]
+    assert progress["unlockedAchievements"] == [achievement.id]
+
+
+def test_skeleton_cached_until_admin_edit(client, db, user, subject, content_manager_admin, monkeypatch):
+    map_id, first, second, second_group, tasks = _build_map(db, subject)
+    assert _get(client, user, map_id).status_code == 200
+
+    def no_db(db, map_id):
+        raise AssertionError("скелет должен браться из кеша")
+
+    load = gamification_maps._load_map_skeleton
+    monkeypatch.setattr(gamification_maps, "_load_map_skeleton", no_db)
+    assert _get(client, user, map_id).status_code == 200
+
+    monkeypatch.setattr(gamification_maps, "_load_map_skeleton", load)
+    response = client.put(
+        f"/admin/gamification/task-groups/{second_group.id}",
+        headers=authorization_header(content_manager_admin),
+        json={"name": "Renamed", "location_id": second.id, "difficulty": 2, "reward_points": 10},
+    )
+    assert response.status_code == 200
+
+    groups = _get(client, user, map_id).json()["map"]["locations"][1]["taskGroups"]
+    assert groups[0]["name"] == "Renamed"
+    assert groups[0]["tasks"] == [tasks[1].id, tasks[2].id]
+
+
+def test_missing_map_is_404(client, user):
+    assert _get(client, user, 999).status_code == 404
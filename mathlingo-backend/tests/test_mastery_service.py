@@ -184,6 +184,74 @@ def test_recompute_upserts_single_row_per_user_skill(client, db, user, subject):
     assert rows[0].sample_size == 2
 
 
+# --- инкрементальный пересчёт по буферу окна (apply_attempt) ---
+# Эталон — recompute() (полный пересчёт по attempts, golden-тесты выше):
+# после любой последовательности попыток буфер обязан давать ровно то же.
+
+def _snapshot(state):
+    return (
+        state.level, state.confidence, state.sample_size, state.factors,
+        state.window_from, state.window_to, state.window_buffer,
+    )
+
+
+def _apply(db, user, skill, task, is_correct, time_spent_ms=None, hints_used=0, when=None):
+    a = _add_attempt(db, user, skill, task, is_correct, time_spent_ms, hints_used, when)
+    state = mastery.apply_attempt(db, a, task.estimated_time_seconds)
+    db.commit()
+    return state
+
+
+def test_apply_attempt_matches_full_recompute(client, db, user, subject):
+    skill = _make_skill(db, subject)
+    task = _make_task(db, subject, estimated_time_seconds=90)
+    base = datetime(2026, 1, 1, 12, 0, 0)
+
+    for i in range(25):
+        state = _apply(
+            db, user, skill, task,
+            is_correct=(i % 3 != 0),
+            time_spent_ms=None if i % 4 == 0 else 30_000 + i * 7_000,
+            hints_used=1 if i % 5 == 0 else 0,
+            when=base + timedelta(minutes=i),
+        )
+        incremental = _snapshot(state)
+        assert incremental == _snapshot(mastery.recompute(db, user.id, skill["id"]))
+
+
+def test_apply_attempt_handles_out_of_order_created_at(client, db, user, subject):
+    skill = _make_skill(db, subject)
+    task = _make_task(db, subject)
+    base = datetime(2026, 1, 1, 12, 0, 0)
+
+    for i in range(10):
+        _apply(db, user, skill, task, is_correct=True, when=base + timedelta(hours=1, minutes=i))
+    # Попытка "из прошлого" (офлайн-досылка) старше всего окна — не влияет;
+    # попытка внутри окна вытесняет самую старую.
+    _apply(db, user, skill, task, is_correct=False, when=base)
+    state = _apply(db, user, skill, task, is_correct=False, when=base + timedelta(hours=1, minutes=5, seconds=30))
+
+    assert state.factors["accuracy"] == 0.9
+    assert _snapshot(state) == _snapshot(mastery.recompute(db, user.id, skill["id"]))
+
+
+def test_apply_attempt_fills_missing_buffer_from_attempts(client, db, user, subject):
+    from app.models import MasteryState
+
+    skill = _make_skill(db, subject)
+    task = _make_task(db, subject)
+    for _ in range(3):
+        _add_attempt(db, user, skill, task, is_correct=False)
+    mastery.recompute(db, user.id, skill["id"])
+    # Строка, записанная до появления буфера
+    db.query(MasteryState).update({MasteryState.window_buffer: None})
+    db.commit()
+
+    state = _apply(db, user, skill, task, is_correct=True)
+    assert state.sample_size == 4
+    assert len(state.window_buffer) == 4
+
+
 # --- level_override (R2 task 4) ---
 
 def test_is_adjacent_level_basic_standard():
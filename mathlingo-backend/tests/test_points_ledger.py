@@ -0,0 +1,79 @@
+"""
+Начисление очков (app/services/progress.py): журнал points_ledger и
+атомарный инкремент user_progress.total_points — параллельные начисления
+одному ученику не теряются, в том числе когда строки прогресса ещё нет.
+"""
+import threading
+
+import pytest
+from sqlalchemy import func
+
+from app.models import PointsLedgerEntry, User, UserProgress
+from app.services import progress
+
+PARALLEL_SUBMISSIONS = 100
+
+
+def _make_user(make_session) -> int:
+    with make_session() as db:
+        user = User(username="racer", email="racer@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+        return user.id
+
+
+def _submit_in_parallel(make_session, user_id: int) -> list:
+    barrier = threading.Barrier(PARALLEL_SUBMISSIONS)
+    errors = []
+
+    def submit():
+        with make_session() as db:
+            try:
+                barrier.wait()
+                progress.add_points(db, user_id, 1)
+                db.commit()
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=submit) for _ in range(PARALLEL_SUBMISSIONS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+@pytest.mark.parametrize("existing_row", [True, False])
+def test_parallel_submissions_lose_no_points(file_sessions, existing_row):
+    user_id = _make_user(file_sessions)
+    if existing_row:
+        with file_sessions() as db:
+            db.add(UserProgress(user_id=user_id, current_level=1, total_points=0))
+            db.commit()
+
+    assert _submit_in_parallel(file_sessions, user_id) == []
+
+    with file_sessions() as db:
+        rows = db.query(UserProgress).filter(UserProgress.user_id == user_id).all()
+        assert [row.total_points for row in rows] == [PARALLEL_SUBMISSIONS]
+        ledger_total = (
+            db.query(func.sum(PointsLedgerEntry.points))
+            .filter(PointsLedgerEntry.user_id == user_id)
+            .scalar()
+        )
+        assert ledger_total == PARALLEL_SUBMISSIONS
+
+
+def test_add_points_is_part_of_callers_transaction(client, db, user):
+    progress.add_points(db, user.id, 5)
+    db.rollback()
+
+    assert db.query(UserProgress).filter(UserProgress.user_id == user.id).count() == 0
+    assert db.query(PointsLedgerEntry).count() == 0
+
+    progress.add_points(db, user.id, 5)
+    progress.add_points(db, user.id, 7)
+    db.commit()
+
+    assert db.query(UserProgress).filter(UserProgress.user_id == user.id).one().total_points == 12
+    assert [e.points for e in db.query(PointsLedgerEntry).order_by(PointsLedgerEntry.id)] == [5, 7]
@@ -0,0 +1,117 @@
+"""
+Кеш токен -> принципал (app/services/principal_cache.py): повторный запрос
+с тем же токеном не ходит в БД за пользователем/админом, а деактивация и
+удаление в admin.py действуют сразу, несмотря на кеш.
+"""
+from contextlib import contextmanager
+
+import redis
+from sqlalchemy import event
+
+from app import config
+from app.services import cache, principal_cache
+from tests.conftest import authorization_header
+
+
+def _student_header(user):
+    from app.auth import create_access_token
+
+    token = create_access_token({"sub": user.email})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@contextmanager
+def _statements(db):
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        seen.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield seen
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def test_repeated_request_skips_user_lookup(client, db, user):
+    headers = _student_header(user)
+    client.get("/api/games/catalog", headers=headers)
+
+    with _statements(db) as seen:
+        assert client.get("/api/games/catalog", headers=headers).status_code == 200
+    assert not any("FROM users" in s for s in seen)
+
+
+def test_admin_principal_cached(client, db, admin):
+    headers = authorization_header(admin)
+    client.get("/admin/dashboard/runtime", headers=headers)
+
+    with _statements(db) as seen:
+        assert client.get("/admin/dashboard/runtime", headers=headers).status_code == 200
+    assert not any("FROM admins" in s or "FROM users" in s for s in seen)
+
+
+def test_cache_disabled_queries_every_time(client, db, user, monkeypatch):
+    monkeypatch.setattr(config, "AUTH_PRINCIPAL_CACHE_ENABLED", False)
+    headers = _student_header(user)
+    client.get("/api/games/catalog", headers=headers)
+
+    with _statements(db) as seen:
+        client.get("/api/games/catalog", headers=headers)
+    assert any("FROM users" in s for s in seen)
+
+
+def test_deactivation_takes_effect_despite_cache(client, user, admin):
+    headers = _student_header(user)
+    assert client.get("/api/games/catalog", headers=headers).status_code == 200
+
+    client.put(f"/admin/users/{user.id}/status", headers=authorization_header(admin), json={"is_active": False})
+
+    assert client.get("/api/games/catalog", headers=headers).status_code == 403
+
+
+def test_bulk_deactivation_takes_effect_despite_cache(client, user, admin):
+    headers = _student_header(user)
+    assert client.get("/api/games/catalog", headers=headers).status_code == 200
+
+    client.post("/admin/users/bulk-status", headers=authorization_header(admin),
+                json={"ids": [user.id], "is_active": False})
+
+    assert client.get("/api/games/catalog", headers=headers).status_code == 403
+
+
+def test_deleted_user_token_rejected_despite_cache(client, user, admin):
+    headers = _student_header(user)
+    assert client.get("/api/games/catalog", headers=headers).status_code == 200
+
+    client.delete(f"/admin/users/{user.id}", headers=authorization_header(admin))
+
+    assert client.get("/api/games/catalog", headers=headers).status_code == 401
+
+
+def test_deactivation_fails_safe_when_invalidation_fails(client, user, admin, monkeypatch):
+    headers = _student_header(user)
+    assert client.get("/api/games/catalog", headers=headers).status_code == 200
+
+    bump_namespace = cache.bump_namespace
+
+    def redis_down(namespace):
+        raise redis.ConnectionError("redis down")
+    monkeypatch.setattr(cache, "bump_namespace", redis_down)
+    monkeypatch.setattr(principal_cache, "INVALIDATE_RETRY_SECONDS", 0)
+
+    # Изменение уже закоммичено — не 500.
+    response = client.put(f"/admin/users/{user.id}/status", headers=authorization_header(admin),
+                          json={"is_active": False})
+    assert response.status_code == 200
+    assert principal_cache._pending == {user.email}
+    # Бамп не подтверждён — запись кеша не используется, пользователь из БД.
+    assert client.get("/api/games/catalog", headers=headers).status_code == 403
+
+    # Redis вернулся: бамп досылается, старая запись больше не действует.
+    monkeypatch.setattr(cache, "bump_namespace", bump_namespace)
+    assert client.get("/api/games/catalog", headers=headers).status_code == 403
+    assert not principal_cache._pending
+    assert cache.namespace_generation(principal_cache._namespace(user.email), strict=True) == 1
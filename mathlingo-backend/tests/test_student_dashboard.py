@@ -50,7 +50,7 @@ def test_dashboard_reflects_real_attempts_and_points(client, db, user, subject):
 
     db.add(Attempt(user_id=user.id, content_type="task", content_id=task.id, skill_id=skill.id, is_correct=True, time_spent_ms=30000))
     db.add(Attempt(user_id=user.id, content_type="task", content_id=task.id, skill_id=skill.id, is_correct=False, time_spent_ms=60000))
-    db.add(UserProgress(user_id=user.id, total_points=15, completed_locations="[]", unlocked_achievements="[]"))
+    db.add(UserProgress(user_id=user.id, total_points=15))
     db.commit()
 
     response = client.get("/gamification/dashboard", headers=_student_header(user))
@@ -267,6 +267,98 @@ def test_submit_answer_requires_authentication(client, db, subject):
     assert response.status_code == 401
 
 
+# --- Батч-сабмит всей группы (POST /task-groups/{id}/submit-batch) ---
+
+def test_submit_batch_records_all_answers_in_one_call(client, user, db, subject):
+    from app.models import Attempt, MasteryState, UserProgress
+    from app.auth import create_access_token
+
+    skill = _make_skill_row(db, subject)
+    group = _make_task_group(db, subject)
+    t1 = _make_published_task(db, subject, task_group_id=group.id, skill_id=skill.id)
+    t2 = _make_published_task(db, subject, task_group_id=group.id, skill_id=skill.id, reward_points=5)
+    t3 = _make_published_task(db, subject, task_group_id=group.id, skill_id=skill.id)
+
+    token = create_access_token({"sub": user.email})
+    response = client.post(
+        f"/gamification/task-groups/{group.id}/submit-batch",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"answers": [
+            {"task_id": t1.id, "answer": "2x"},
+            {"task_id": t2.id, "answer": " 2X "},
+            {"task_id": t3.id, "answer": "wrong"},
+        ]},
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["correct_count"] == 2
+    assert data["total_points"] == 15
+    assert data["results"] == [
+        {"task_id": t1.id, "isCorrect": True, "points": 10, "feedback": None},
+        {"task_id": t2.id, "isCorrect": True, "points": 5, "feedback": None},
+        {"task_id": t3.id, "isCorrect": False, "points": 0, "feedback": "Попробуйте ещё раз"},
+    ]
+
+    assert db.query(Attempt).filter(Attempt.user_id == user.id).count() == 3
+    assert db.query(UserProgress).filter(UserProgress.user_id == user.id).one().total_points == 15
+    state = db.query(MasteryState).filter(
+        MasteryState.user_id == user.id, MasteryState.skill_id == skill.id
+    ).one()
+    assert state.sample_size == 3
+
+
+def test_submit_batch_rejects_task_from_other_group_without_writing(client, user, db, subject):
+    from app.models import Attempt
+    from app.auth import create_access_token
+
+    group = _make_task_group(db, subject)
+    inside = _make_published_task(db, subject, task_group_id=group.id)
+    outside = _make_published_task(db, subject)
+
+    token = create_access_token({"sub": user.email})
+    response = client.post(
+        f"/gamification/task-groups/{group.id}/submit-batch",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"answers": [
+            {"task_id": inside.id, "answer": "2x"},
+            {"task_id": outside.id, "answer": "2x"},
+        ]},
+    )
+
+    assert response.status_code == 400
+    assert db.query(Attempt).count() == 0
+
+
+def test_submit_batch_rejects_unpublished_task(client, user, db, subject):
+    from app.auth import create_access_token
+
+    group = _make_task_group(db, subject)
+    draft = _make_published_task(db, subject, task_group_id=group.id, status="draft")
+
+    token = create_access_token({"sub": user.email})
+    response = client.post(
+        f"/gamification/task-groups/{group.id}/submit-batch",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"answers": [{"task_id": draft.id, "answer": "2x"}]},
+    )
+
+    assert response.status_code == 409
+
+
+def test_submit_batch_unknown_group_404(client, user):
+    from app.auth import create_access_token
+
+    token = create_access_token({"sub": user.email})
+    response = client.post(
+        "/gamification/task-groups/999999/submit-batch",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"answers": [{"task_id": 1, "answer": "2x"}]},
+    )
+
+    assert response.status_code == 404
+
+
 # --- Интеграция с mastery (R2 task 2): submit-answer должен реально
 # триггерить mastery.recompute(), а не только сама функция сервиса вызываться
 # напрямую (это уже покрыто golden-тестами в test_mastery_service.py).
@@ -856,15 +856,23 @@ export interface DashboardAdminAction {
     created_at: string;
 }
 
+export type DashboardSection =
+    | 'activity' | 'skill_progress' | 'game_completion' | 'ai_quality'
+    | 'review_queue' | 'publish_errors' | 'admin_actions';
+
 export interface DashboardOverview {
-    activity: DashboardActivitySummary;
-    skill_progress: DashboardSkillProgress[];
-    game_completion: DashboardGameCompletion[];
-    ai_quality: DashboardAiQuality;
-    review_queue: DashboardReviewQueue;
-    publish_errors: Record<string, number>;
+    // Любой раздел — null, если не уложился в таймаут или упал; тогда его
+    // имя есть в degraded (см. app/services/dashboard.py: get_overview).
+    activity: DashboardActivitySummary | null;
+    skill_progress: DashboardSkillProgress[] | null;
+    game_completion: DashboardGameCompletion[] | null;
+    ai_quality: DashboardAiQuality | null;
+    review_queue: DashboardReviewQueue | null;
+    publish_errors: Record<string, number> | null;
     // null для teacher — см. R3 §5, "частично, без раздела действий администраторов".
     admin_actions: DashboardAdminAction[] | null;
+    degraded: DashboardSection[];
+    section_timings_ms: Partial<Record<DashboardSection, number>>;
 }
 
 export const fetchDashboardOverview = async (): Promise<DashboardOverview> => {
@@ -26,6 +26,12 @@ const Section = ({ title, children }: { title: string; children: React.ReactNode
     </section>
 );
 
+// Раздел, который бэкенд отдал как degraded (таймаут или ошибка запроса):
+// остальная сводка показывается как есть.
+const SectionUnavailable = () => (
+    <p className="text-sm text-amber-600 dark:text-amber-400">Раздел временно недоступен — попробуйте обновить позже</p>
+);
+
 // R3 task 7: финальный dashboard поверх данных, накопленных в R1 (audit_log)
 // и R2/R3 (attempts, mastery_state, ai_generation_items) — заменяет
 // облегчённую R1-сводку (см. docs/roadmap/product-technical-plan.md, R3 §3).
@@ -58,26 +64,30 @@ const AdminOverviewPanel = () => {
         </div>
     );
 
+    const { activity, skill_progress, game_completion, ai_quality, review_queue, publish_errors } = data;
+
     return (
         <div className="p-6 space-y-8">
             <h2 className="text-lg font-semibold text-gray-900 dark:text-white">Обзор</h2>
 
-            <Section title={`Активность за последние ${data.activity.window_days} дней`}>
-                <div className="grid grid-cols-2 sm:grid-cols-4 gap-4">
-                    <StatCard value={data.activity.total_attempts} label="Всего попыток" />
-                    <StatCard value={data.activity.active_users} label="Активных учеников" />
-                    {Object.entries(data.activity.by_content_type).map(([contentType, stats]) => (
-                        <StatCard key={contentType} value={stats.attempts} label={`Попыток: ${contentType}`} />
-                    ))}
-                </div>
+            <Section title={activity ? `Активность за последние ${activity.window_days} дней` : 'Активность'}>
+                {!activity ? <SectionUnavailable /> : (
+                    <div className="grid grid-cols-2 sm:grid-cols-4 gap-4">
+                        <StatCard value={activity.total_attempts} label="Всего попыток" />
+                        <StatCard value={activity.active_users} label="Активных учеников" />
+                        {Object.entries(activity.by_content_type).map(([contentType, stats]) => (
+                            <StatCard key={contentType} value={stats.attempts} label={`Попыток: ${contentType}`} />
+                        ))}
+                    </div>
+                )}
             </Section>
 
             <Section title="Прогресс по темам">
-                {data.skill_progress.length === 0 ? (
+                {!skill_progress ? <SectionUnavailable /> : skill_progress.length === 0 ? (
                     <p className="text-sm text-gray-400 dark:text-gray-500">Пока нет данных mastery_state</p>
                 ) : (
                     <div className="space-y-2">
-                        {data.skill_progress.map(sp => (
+                        {skill_progress.map(sp => (
                             <div key={sp.skill_id} className="flex items-center justify-between flex-wrap gap-2 px-4 py-3 border border-gray-200 dark:border-gray-700 rounded-xl">
                                 <span className="text-sm font-medium text-gray-900 dark:text-white">{sp.skill_name}</span>
                                 <div className="flex items-center gap-3 text-xs text-gray-500 dark:text-gray-400">
@@ -94,11 +104,11 @@ const AdminOverviewPanel = () => {
             </Section>
 
             <Section title="Завершаемость игр">
-                {data.game_completion.length === 0 ? (
+                {!game_completion ? <SectionUnavailable /> : game_completion.length === 0 ? (
                     <p className="text-sm text-gray-400 dark:text-gray-500">Пока нет сыгранных сессий</p>
                 ) : (
                     <div className="grid grid-cols-1 sm:grid-cols-3 gap-4">
-                        {data.game_completion.map(gc => (
+                        {game_completion.map(gc => (
                             <div key={gc.template_key} className="p-4 rounded-2xl border border-gray-200 dark:border-gray-700">
                                 <div className="text-sm font-medium text-gray-900 dark:text-white mb-1">{TEMPLATE_LABEL[gc.template_key] ?? gc.template_key}</div>
                                 <div className="text-xs text-gray-500 dark:text-gray-400">Сессий: {gc.sessions}</div>
@@ -116,20 +126,28 @@ const AdminOverviewPanel = () => {
 
             <Section title="Качество AI-контента и очередь проверок">
                 <div className="grid grid-cols-2 sm:grid-cols-5 gap-4">
-                    <StatCard value={data.ai_quality.published_ai_tasks} label="Опубликовано AI-заданий" />
-                    <StatCard value={data.ai_quality.open_anomaly_flags} label="Открытых аномалий" />
-                    <StatCard value={data.ai_quality.open_complaint_flags} label="Открытых жалоб" />
-                    <StatCard value={data.review_queue.tasks_in_review} label="Заданий на проверке" />
-                    <StatCard value={data.review_queue.ai_items_pending} label="AI-заданий в очереди" />
+                    {ai_quality ? (
+                        <>
+                            <StatCard value={ai_quality.published_ai_tasks} label="Опубликовано AI-заданий" />
+                            <StatCard value={ai_quality.open_anomaly_flags} label="Открытых аномалий" />
+                            <StatCard value={ai_quality.open_complaint_flags} label="Открытых жалоб" />
+                        </>
+                    ) : <SectionUnavailable />}
+                    {review_queue ? (
+                        <>
+                            <StatCard value={review_queue.tasks_in_review} label="Заданий на проверке" />
+                            <StatCard value={review_queue.ai_items_pending} label="AI-заданий в очереди" />
+                        </>
+                    ) : <SectionUnavailable />}
                 </div>
             </Section>
 
             <Section title="Ошибки публикаций (AI-конвейер)">
-                {Object.keys(data.publish_errors).length === 0 ? (
+                {!publish_errors ? <SectionUnavailable /> : Object.keys(publish_errors).length === 0 ? (
                     <p className="text-sm text-gray-400 dark:text-gray-500">Ошибок нет</p>
                 ) : (
                     <div className="flex flex-wrap gap-3">
-                        {Object.entries(data.publish_errors).map(([status, count]) => (
+                        {Object.entries(publish_errors).map(([status, count]) => (
                             <span key={status} className="text-xs px-3 py-1.5 rounded-full font-medium bg-red-50 dark:bg-red-500/10 text-red-600 dark:text-red-400">
                                 {status}: {count}
                             </span>
@@ -138,6 +156,11 @@ const AdminOverviewPanel = () => {
                 )}
             </Section>
 
+            {data.degraded.includes('admin_actions') && (
+                <Section title="Последние действия администраторов">
+                    <SectionUnavailable />
+                </Section>
+            )}
             {data.admin_actions && (
                 <Section title="Последние действия администраторов">
                     <div className="border border-gray-200 dark:border-gray-700 rounded-xl overflow-hidden">